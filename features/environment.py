@@ -13,6 +13,7 @@
 # limitations under the License.
 
 #  pylint: disable=C0111
+import json
 import socket
 import pprint
 import time
@@ -173,8 +174,14 @@ def update_jenkins(context, path, data):
             # thar be dragons
             old_data = eval(f.read())
 
+    new_data = merge.merge(old_data, data)
     with open(item, 'wb') as f:
-        f.write(repr(merge.merge(old_data, data)))
+        f.write(repr(new_data))
+
+    # Serve the JSON API too; the server ignores 'tree=' projections
+    if os.path.basename(item) == 'python':
+        with open(opj(item_parent, 'json'), 'wb') as f:
+            f.write(json.dumps(new_data))
 
 
 def teardown_jenkins_server(context):
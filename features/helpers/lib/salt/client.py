@@ -79,25 +79,34 @@ class SMinion(object):
 
     def return_full_data(self, *args, **kwargs):
         (host_re, command), (args,) = args[:2], args[2:]
-        hostname = host_re[:-2]   # Remove '.*' to get hostname
+
+        if kwargs.get('expr_form') == 'compound':
+            host_res = host_re.split(' or ')
+        else:
+            host_res = [host_re]
 
         input = self.read_input()
+        results = []
 
-        if hostname in input:
-            result = input[hostname]
-        elif command == 'tds.restart':
-            result = self.restart(hostname, *args)
-        elif command == 'tds.install':
-            result = self.install(hostname, *args)
-        else:
-            raise Exception('Unknown command:%r', command)
+        for host_re in host_res:
+            hostname = host_re[:-2]   # Remove '.*' to get hostname
+
+            if hostname in input:
+                result = input[hostname]
+            elif command == 'tds.restart':
+                result = self.restart(hostname, *args)
+            elif command == 'tds.install':
+                result = self.install(hostname, *args)
+            else:
+                raise Exception('Unknown command:%r', command)
+
+            results.append(result)
 
-        self.record_results([result])
+        self.record_results(results)
 
         return dict(
-            hostname=dict(
-                ret=result['result'],
-            ),
+            (result['hostname'], dict(ret=result['result']))
+            for result in results
         )
 
 
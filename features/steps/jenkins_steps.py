@@ -144,6 +144,12 @@ def create_jenkins_artifact(context, number, malformed=False):
         md5.update(fh.read())
     artifact_md5 = md5.hexdigest()
 
+    update_jenkins(
+        context,
+        path_fragment + '/api/python',
+        dict(fingerprint=[dict(fileName=artifact_filename, hash=artifact_md5)])
+    )
+
     # Currently not used, but keeping for future possibilities
     # Needed for when fingerprinting is turned on and used
     update_jenkins(
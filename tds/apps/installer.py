@@ -17,17 +17,23 @@ Daemon to do installs. It checks the database to see what deployments it needs
 to do, does them, and updates the database.
 """
 
+import collections
 import logging
+import math
 import os
+import Queue
+import select
 import sys
 
 import time
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
 
 import tagopsdb
 import tds.deploy_strategy
 import tds.exceptions
 import tds.model
+import tds.utils.wakeup
 
 if __package__ is None:
     # This unused import is necessary if the file is executed as a script,
@@ -39,6 +45,14 @@ from . import TDSProgramBase
 
 log = logging.getLogger('tds.apps.tds_installer')
 
+# Everything needed to deploy to one host, copied out of the host deployment
+# so that it stays usable after commits expire the database objects.
+HostDeploymentInfo = collections.namedtuple(
+    'HostDeploymentInfo',
+    ['id', 'deployment_id', 'host_id', 'host_name', 'package_name',
+     'version', 'status', 'delay'],
+)
+
 
 class Installer(TDSProgramBase):
     """
@@ -65,6 +79,9 @@ class Installer(TDSProgramBase):
             env=self.config.get('env', {'environment': 'dev'})['environment']
         )
 
+        self.parallel_config = self.config.get('parallel_deploy', None) or {}
+        self._cancel_channel = None
+
     def create_deploy_strategy(self, deploy_strat_name):
         """
         Create a deploy strategy and set it to self.deploy_strategy.
@@ -105,86 +122,448 @@ class Installer(TDSProgramBase):
 
     def find_deployment(self):
         """
-        Find host and tier deployments with status == 'queued'.
-        Returns the tuple that was appended to ongoing_deployments, False
-        otherwise.
-        """
-        deps = tds.model.Deployment.find(status='queued', order_by='declared')
-
-        while deps:
-            deployment = deps[0]
-            if any(
-                x.environment_id != self.environment.id for x in
-                deployment.app_deployments
-            ) or any(
-                x.host.environment_id != self.environment.id for x in
-                deployment.host_deployments
-            ):
-                deps.pop(0)
+        Find the oldest deployment with status == 'queued' for this
+        installer's environment.
+        Returns the deployment if found, None otherwise.
+        """
+        return tds.model.Deployment.next_queued_for_environment(
+            self.environment.id
+        )
+
+    def find_deployments(self, limit=None):
+        """
+        Find deployments with status == 'queued' for this installer's
+        environment, oldest first, returning at most limit of them.
+        """
+        return tds.model.Deployment.find_queued_for_environment(
+            self.environment.id, limit=limit
+        )
+
+    @staticmethod
+    def _load_host_deployments(deployment):
+        """
+        Load all host deployments of the given deployment, with their hosts
+        and packages, in one query.
+        Return a dict of HostDeploymentInfo tuples keyed by host ID.
+        """
+        return dict(
+            (host_dep.host_id, HostDeploymentInfo(
+                id=host_dep.id,
+                deployment_id=deployment.id,
+                host_id=host_dep.host_id,
+                host_name=host_dep.host.name,
+                package_name=host_dep.package.name,
+                version=host_dep.package.version,
+                status=host_dep.status,
+                delay=deployment.delay,
+            ))
+            for host_dep in tds.model.HostDeployment.find_for_deployment(
+                deployment.id
+            )
+        )
+
+    @staticmethod
+    def _is_canceled(deployment_id):
+        """
+        Return True if the deployment with ID deployment_id has been
+        canceled, reading just its status.
+        """
+        # End the current transaction so the read sees other sessions'
+        # changes.
+        tagopsdb.Session.commit()
+        return tds.model.Deployment.get_status(deployment_id) == 'canceled'
+
+    @property
+    def cancel_channel(self):
+        """
+        Return the channel on which deployment cancellations are published,
+        creating it on first use.  If it can not be set up, fall back to a
+        polling channel; cancellation is then only noticed between hosts.
+        """
+        if self._cancel_channel is None:
+            try:
+                self._cancel_channel = tds.utils.wakeup.get_channel(
+                    self.config, path=tds.utils.wakeup.CANCEL_PATH
+                )
+            except Exception as exc:
+                log.warning('Unable to watch for cancellations: %r', exc)
+                self._cancel_channel = tds.utils.wakeup.PollingChannel()
+
+        return self._cancel_channel
+
+    def _cancel_requested(self, deployment_id):
+        """
+        Return True if a cancellation was published since the last check
+        and the deployment with ID deployment_id is indeed canceled.
+        Does not block.
+        """
+        if self.cancel_channel.fileno() is None:
+            return False
+
+        return self.cancel_channel.clear() and \
+            self._is_canceled(deployment_id)
+
+    def _wait_or_cancel(self, timeout, deployment_id):
+        """
+        Sleep for timeout seconds, returning True as soon as the deployment
+        with ID deployment_id is canceled, False otherwise.
+        """
+        fd = self.cancel_channel.fileno()
+        end = time.time() + timeout
+
+        while True:
+            remaining = end - time.time()
+            if remaining <= 0:
+                return False
+
+            if fd is None:
+                time.sleep(remaining)
+                continue
+
+            try:
+                ready = select.select([fd], [], [], remaining)[0]
+            except select.error:
+                # Interrupted by a signal
                 continue
-            return deployment
 
-        return None
+            if ready and self._cancel_requested(deployment_id):
+                log.info('Deployment ID %s canceled while waiting',
+                         deployment_id)
+                return True
 
     def _do_host_deployment(self, host_deployment, first_dep=True):
         """
-        Perform host deployment for given host and update database
-        with results.
+        Perform host deployment for given host (a HostDeploymentInfo) and
+        update database with results.
         """
         now = datetime.now()
         # If host already has a valid deployment, nothing to do
         if host_deployment.status == 'ok':
             return 'ok'
 
-        if not first_dep:
-            time.sleep(host_deployment.deployment.delay)
+        if not first_dep and self._wait_or_cancel(
+            host_deployment.delay, host_deployment.deployment_id
+        ):
+            return 'canceled'
 
-        self._refresh(host_deployment.deployment)
-        if host_deployment.deployment.status == 'canceled':
+        if self._is_canceled(host_deployment.deployment_id):
             return 'canceled'
 
-        host_deployment.status = 'inprogress'
+        tds.model.HostDeployment.update_statuses(
+            [host_deployment.id], 'inprogress'
+        )
         tagopsdb.Session.commit()
 
         log.info(
             "Starting deployment of %s version %s to host %s..." % (
-                host_deployment.package.name,
-                host_deployment.package.version,
-                host_deployment.host.name,
+                host_deployment.package_name,
+                host_deployment.version,
+                host_deployment.host_name,
             )
         )
 
         success, host_result = self.deploy_strategy.deploy_to_host(
-            host_deployment.host.name,
-            host_deployment.package.name,
-            host_deployment.package.version,
+            host_deployment.host_name,
+            host_deployment.package_name,
+            host_deployment.version,
             retry=self.retry
         )
 
-        if success:
-            host_deployment.status = 'ok'
-        else:
-            host_deployment.status = 'failed'
-        self._set_duration(host_deployment, now)
-
-        host_deployment.deploy_result = host_result
+        status = 'ok' if success else 'failed'
+        tds.model.HostDeployment.update_result(
+            host_deployment.id, status,
+            (datetime.now() - now).total_seconds(), host_result
+        )
         tagopsdb.Session.commit()
 
         log.info(
             "Finished deployment of %s version %s to host %s, status: %s" % (
-                host_deployment.package.name,
-                host_deployment.package.version,
-                host_deployment.host.name,
-                host_deployment.status,
+                host_deployment.package_name,
+                host_deployment.version,
+                host_deployment.host_name,
+                status,
+            )
+        )
+
+        return status
+
+    def _deploy_wave_task(self, wave, app, version, results):
+        """
+        Deploy an application to the hosts of a wave (HostDeploymentInfo
+        tuples) with one call to the deploy strategy, and put the outcome
+        for each host on the results queue as it comes in.  This runs in a
+        worker thread of the parallel deployment pool, so it must not touch
+        the database.
+        """
+        start = datetime.now()
+        by_host = dict((dep.host_name, dep) for dep in wave)
+        remaining = set(by_host)
+
+        try:
+            for dep_host, success, host_result in \
+                    self.deploy_strategy.deploy_to_hosts(
+                        [dep.host_name for dep in wave], app, version,
+                        retry=self.retry
+                    ):
+                if dep_host not in remaining:
+                    continue
+
+                remaining.discard(dep_host)
+                results.put((by_host[dep_host].id, success, host_result,
+                             start, datetime.now()))
+        except Exception as exc:
+            log.error('Deployment to hosts %s raised: %r',
+                      ', '.join(sorted(remaining)), exc)
+            errors = dict(
+                (dep_host,
+                 'Deployment to host %s raised: %r' % (dep_host, exc))
+                for dep_host in remaining
+            )
+        else:
+            errors = dict(
+                (dep_host, 'No data returned from host %s' % dep_host)
+                for dep_host in remaining
+            )
+
+        for dep_host in sorted(remaining):
+            results.put((by_host[dep_host].id, False, errors[dep_host],
+                         start, datetime.now()))
+
+    def _do_parallel_host_deployments(self, host_deployments, max_in_flight,
+                                      first_dep=True):
+        """
+        Perform the given host deployments (HostDeploymentInfo tuples) with
+        up to max_in_flight of them running at once, and update the database
+        with the results.
+
+        Hosts are dispatched in waves: all free slots at once, or one host
+        at a time spaced by the deployment's delay if it has one.  Each
+        wave is marked in progress with one UPDATE, and all results that
+        came in together are committed at once.  Dispatching stops as soon
+        as the deployment is found to be canceled; host deployments already
+        in flight are allowed to finish.
+        Return (host states, whether canceled, first_dep).
+        """
+        pool = ThreadPool(max_in_flight)
+        results = Queue.Queue()
+        in_flight = dict()
+        pending = list(host_deployments)
+        states = []
+        canceled = False
+        next_dispatch = None
+
+        # With a cancel channel, look for cancellations often while waiting
+        # for results so no new hosts are dispatched once canceled.
+        poll_interval = 1
+        if self.cancel_channel.fileno() is not None:
+            poll_interval = 0.05
+
+        if not first_dep and pending:
+            next_dispatch = time.time() + pending[0].delay
+
+        try:
+            while pending or in_flight:
+                timeout = None
+
+                if pending and not canceled and \
+                        self._cancel_requested(pending[0].deployment_id):
+                    states.append('canceled')
+                    canceled = True
+
+                if pending and not canceled and \
+                        len(in_flight) < max_in_flight:
+                    now = time.time()
+                    if next_dispatch is not None and now < next_dispatch:
+                        timeout = next_dispatch - now
+                    else:
+                        self._dispatch_wave(
+                            pending, in_flight, max_in_flight, pool, results,
+                            states
+                        )
+                        first_dep = False
+
+                        if states and states[-1] == 'canceled':
+                            canceled = True
+                        elif in_flight:
+                            next_dispatch = now + pending[0].delay \
+                                if pending else None
+                        continue
+
+                if not in_flight:
+                    if timeout is not None:
+                        if self._wait_or_cancel(
+                            timeout, pending[0].deployment_id
+                        ):
+                            states.append('canceled')
+                            canceled = True
+                        continue
+                    break
+
+                # Always use a timeout here; an untimed Queue.get() can not
+                # be interrupted by signals on python 2.
+                try:
+                    done = [results.get(
+                        timeout=min(timeout or poll_interval, poll_interval)
+                    )]
+                except Queue.Empty:
+                    continue
+
+                # Record everything that finished meanwhile together.
+                while True:
+                    try:
+                        done.append(results.get_nowait())
+                    except Queue.Empty:
+                        break
+
+                for (host_dep_id, success, host_result, start, end) in done:
+                    host_deployment = in_flight.pop(host_dep_id)
+                    status = 'ok' if success else 'failed'
+                    tds.model.HostDeployment.update_result(
+                        host_dep_id, status, (end - start).total_seconds(),
+                        host_result
+                    )
+                    states.append(status)
+
+                    log.info(
+                        "Finished deployment of %s version %s to host %s, "
+                        "status: %s" % (
+                            host_deployment.package_name,
+                            host_deployment.version,
+                            host_deployment.host_name,
+                            status,
+                        )
+                    )
+
+                tagopsdb.Session.commit()
+        finally:
+            pool.close()
+            pool.join()
+
+        return states, canceled, first_dep
+
+    def _dispatch_wave(self, pending, in_flight, max_in_flight, pool,
+                       results, states):
+        """
+        Take the next wave of host deployments off pending and start them
+        on pool: as many as there are free slots, or a single one if the
+        deployment has a delay between hosts.  Hosts which are already 'ok'
+        are skipped.  If the deployment was canceled, nothing is started
+        and 'canceled' is appended to states.
+        """
+        wave = []
+        while pending and len(in_flight) + len(wave) < max_in_flight:
+            host_deployment = pending.pop(0)
+
+            # If host already has a valid deployment, nothing to do
+            if host_deployment.status == 'ok':
+                states.append('ok')
+                continue
+
+            wave.append(host_deployment)
+            if host_deployment.delay:
+                break
+
+        if not wave:
+            return
+
+        if self._is_canceled(wave[0].deployment_id):
+            states.append('canceled')
+            return
+
+        tds.model.HostDeployment.update_statuses(
+            [host_deployment.id for host_deployment in wave], 'inprogress'
+        )
+        tagopsdb.Session.commit()
+
+        # The hosts of a wave are handed to the deploy strategy together
+        # (one per package version), so it can reach them in one round trip
+        packages = collections.OrderedDict()
+        for host_deployment in wave:
+            log.info(
+                "Starting deployment of %s version %s to host %s..." % (
+                    host_deployment.package_name,
+                    host_deployment.version,
+                    host_deployment.host_name,
+                )
+            )
+
+            in_flight[host_deployment.id] = host_deployment
+            packages.setdefault(
+                (host_deployment.package_name, host_deployment.version), []
+            ).append(host_deployment)
+
+        for (app, version), package_wave in packages.iteritems():
+            pool.apply_async(self._deploy_wave_task, (
+                package_wave, app, version, results,
+            ))
+
+    @staticmethod
+    def _parse_max_in_flight(limit, num_hosts):
+        """
+        Convert a max-in-flight setting, either a host count or a percentage
+        of num_hosts (e.g. '25%'), into a host count of at least 1.
+        """
+        try:
+            if isinstance(limit, basestring) and limit.strip().endswith('%'):
+                percent = float(limit.strip()[:-1])
+                limit = int(math.ceil(num_hosts * percent / 100.0))
+            else:
+                limit = int(limit)
+        except ValueError:
+            raise tds.exceptions.ConfigurationError(
+                'Invalid max_in_flight value: %r', limit
             )
+
+        return max(limit, 1)
+
+    def _get_max_in_flight_setting(self, tier_name=None):
+        """
+        Return the raw max-in-flight setting for the tier with the given name,
+        falling back to the default in the 'parallel_deploy' section.
+        """
+        tiers = self.parallel_config.get('tiers', None) or {}
+        if tier_name is not None and tier_name in tiers:
+            return tiers[tier_name]
+
+        return self.parallel_config.get('max_in_flight', 1)
+
+    def get_max_in_flight(self, num_hosts, tier_name=None):
+        """
+        Return the number of hosts that may be deployed to at once for the
+        tier with the given name, which has num_hosts hosts to deploy to.
+        """
+        return self._parse_max_in_flight(
+            self._get_max_in_flight_setting(tier_name), num_hosts
         )
 
-        return host_deployment.status
+    def is_parallel_deployment(self, deployment):
+        """
+        Return True if the given deployment should be done in parallel, i.e.
+        if the 'parallel_deploy' config allows more than one host in flight
+        for any of its tiers or for its standalone host deployments.
+        Percentages are taken of all of the deployment's hosts, which no
+        tier or set of standalone hosts exceeds.
+        """
+        tier_names = [dep.target.name for dep in deployment.app_deployments]
+        num_hosts = len(
+            tds.model.HostDeployment.get_statuses_for_deployment(deployment.id)
+        )
+
+        return any(
+            self.get_max_in_flight(num_hosts, tier_name) > 1
+            for tier_name in tier_names + [None]
+        )
 
-    def _do_tier_deployment(self, tier_deployment, first_dep=True):
+    def _do_tier_deployment(self, tier_deployment, first_dep=True,
+                            parallel=False, host_deployments_by_host=None):
         """
         Perform tier deployment for given tier (only doing hosts that
         require the deployment) and update database with results.
+        If parallel, deploy to up to the tier's configured max-in-flight
+        number of hosts at once.
+        host_deployments_by_host is the result of _load_host_deployments
+        for the deployment, which is loaded here if not given.
+        Return the IDs of the host deployments done.
         """
         now = datetime.now()
         dep_hosts = sorted(
@@ -197,20 +576,38 @@ class Installer(TDSProgramBase):
         canceled = False
         tier_deployment.status = 'inprogress'
         tagopsdb.Session.commit()
-        for dep_host in dep_hosts:
-            host_deployment = tds.model.HostDeployment.get(
-                host_id=dep_host.id,
-                deployment_id=tier_deployment.deployment_id,
+
+        if host_deployments_by_host is None:
+            host_deployments_by_host = self._load_host_deployments(
+                tier_deployment.deployment
             )
-            if host_deployment is None:
-                continue
-            host_state = self._do_host_deployment(host_deployment, first_dep)
-            done_host_dep_ids.add(host_deployment.id)
-            tier_state.append(host_state)
-            if host_state == 'canceled':
-                canceled = True
-                break
-            first_dep = False
+
+        host_deployments = [
+            host_deployments_by_host[dep_host.id] for dep_host in dep_hosts
+            if dep_host.id in host_deployments_by_host
+        ]
+
+        if parallel:
+            tier_state, canceled, first_dep = \
+                self._do_parallel_host_deployments(
+                    host_deployments,
+                    self.get_max_in_flight(
+                        len(host_deployments), tier_deployment.target.name
+                    ),
+                    first_dep,
+                )
+            done_host_dep_ids = set(dep.id for dep in host_deployments)
+        else:
+            for host_deployment in host_deployments:
+                host_state = self._do_host_deployment(
+                    host_deployment, first_dep
+                )
+                done_host_dep_ids.add(host_deployment.id)
+                tier_state.append(host_state)
+                if host_state == 'canceled':
+                    canceled = True
+                    break
+                first_dep = False
 
         if (canceled and not first_dep) or any(
             x in tier_state for x in ('failed', 'canceled')
@@ -231,10 +628,24 @@ class Installer(TDSProgramBase):
         tagopsdb.Session.commit()
         return done_host_dep_ids
 
-    def do_serial_deployment(self, deployment):
+    def _stop_if_canceled(self, deployment, now):
         """
-        Perform deployments for tier or host(s) one host at a time
-        (no parallelism).
+        If the deployment has been canceled, mark it stopped.
+        Return True if the deployment was stopped.
+        """
+        if not self._is_canceled(deployment.id):
+            return False
+
+        deployment.status = 'stopped'
+        self._set_duration(deployment, now)
+        tagopsdb.Session.commit()
+        return True
+
+    def _do_deployment(self, deployment, parallel=False):
+        """
+        Perform deployments for tier or host(s), one tier at a time.
+        If parallel, hosts within a tier (and standalone hosts) are deployed
+        to concurrently, up to the configured max-in-flight limits.
         """
         now = datetime.now()
         tier_deployments = sorted(
@@ -242,46 +653,79 @@ class Installer(TDSProgramBase):
             key=lambda dep:dep.target.name,
         )
 
+        host_deployments_by_host = self._load_host_deployments(deployment)
+
         first_dep = True
         done_host_dep_ids = set()
         for tier_deployment in tier_deployments:
             done_host_dep_ids |= self._do_tier_deployment(
-                tier_deployment, first_dep
+                tier_deployment, first_dep, parallel, host_deployments_by_host
             )
             first_dep = False
 
-            self._refresh(deployment)
-            if deployment.status == 'canceled':
-                deployment.status = 'stopped'
-                self._set_duration(deployment, now)
-                tagopsdb.Session.commit()
+            if self._stop_if_canceled(deployment, now):
                 return
 
         host_deployments = sorted(
-            [dep for dep in deployment.host_deployments if dep.id not in
+            [dep for dep in host_deployments_by_host.values() if dep.id not in
              done_host_dep_ids],
-            key=lambda host_dep: host_dep.host.name,
+            key=lambda host_dep: host_dep.host_name,
         )
 
-        for host_deployment in host_deployments:
-            self._do_host_deployment(host_deployment, first_dep)
-            first_dep = False
+        if parallel:
+            if host_deployments:
+                self._do_parallel_host_deployments(
+                    host_deployments,
+                    self.get_max_in_flight(len(host_deployments)),
+                    first_dep,
+                )
+                if self._stop_if_canceled(deployment, now):
+                    return
+        else:
+            for host_deployment in host_deployments:
+                self._do_host_deployment(host_deployment, first_dep)
+                first_dep = False
 
-            self._refresh(deployment)
-            if deployment.status == 'canceled':
-                deployment.status = 'stopped'
-                self._set_duration(deployment, now)
-                tagopsdb.Session.commit()
-                return
+                if self._stop_if_canceled(deployment, now):
+                    return
 
         if any(dep.status != 'complete' for dep in tier_deployments) or \
-                any(dep.status != 'ok' for dep in deployment.host_deployments):
+                any(status != 'ok' for status in
+                    tds.model.HostDeployment.get_statuses_for_deployment(
+                        deployment.id
+                    )):
             deployment.status = 'failed'
         else:
             deployment.status = 'complete'
         self._set_duration(deployment, now)
         tagopsdb.Session.commit()
 
+    def do_serial_deployment(self, deployment):
+        """
+        Perform deployments for tier or host(s) one host at a time
+        (no parallelism).
+        """
+        self._do_deployment(deployment, parallel=False)
+
+    def do_parallel_deployment(self, deployment):
+        """
+        Perform deployments for tier or host(s) with up to the configured
+        number of hosts per tier being deployed to at once.
+        """
+        self._do_deployment(deployment, parallel=True)
+
+    def do_deployment(self, deployment):
+        """
+        Perform the given deployment in parallel or serially, depending on
+        the 'parallel_deploy' configuration for its tiers.
+        """
+        if self.is_parallel_deployment(deployment):
+            log.info('Deployment with ID %s running in parallel mode',
+                     deployment.id)
+            self.do_parallel_deployment(deployment)
+        else:
+            self.do_serial_deployment(deployment)
+
     @staticmethod
     def _set_duration(deployment, now):
         """
@@ -302,7 +746,45 @@ class Installer(TDSProgramBase):
         else:
             deployment = self.find_deployment()
         if deployment is not None:
-            self.do_serial_deployment(deployment)
+            self.do_deployment(deployment)
+
+        if self._cancel_channel is not None:
+            self._cancel_channel.close()
+
+    def serve(self, infile=None, outfile=None):
+        """
+        Run as a pre-started worker for TDSInstallerDaemon: read deployment
+        IDs from infile (stdin by default), one per line, do each deployment
+        and report it by writing 'done <ID>' to outfile (stdout by default).
+        Exit when infile is closed.
+        """
+        if infile is None:
+            infile = sys.stdin
+        if outfile is None:
+            outfile = sys.stdout
+
+        for line in iter(infile.readline, ''):
+            dep_id = int(line)
+            log.info('Worker %d received deployment ID %d', os.getpid(),
+                     dep_id)
+
+            # Start from a clean session for every deployment; the engine
+            # and its connection pool are kept.
+            tagopsdb.Session.close()
+
+            try:
+                deployment = self.get_deployment(dep_id=dep_id)
+                if deployment is not None:
+                    self.do_deployment(deployment)
+            except Exception:
+                # The daemon marks the deployment as failed when it did not
+                # reach a final status; keep serving.
+                log.exception('Deployment ID %d failed with an exception',
+                              dep_id)
+                tagopsdb.Session.rollback()
+
+            outfile.write('done %d\n' % dep_id)
+            outfile.flush()
 
 
 if __name__ == '__main__':
@@ -312,17 +794,26 @@ if __name__ == '__main__':
         """
         # TODO implement parser thing?
         # Be sure to pass '--config-dir' for testing
+        worker = '--worker' in cl_args
+        cl_args = [arg for arg in cl_args if arg != '--worker']
+
+        if not cl_args:
+            return dict(worker=worker)
+
         try:
             int(cl_args[-1])
         except ValueError:
             return {
                 'config_dir': cl_args[-1],
+                'worker': worker,
             }
         else:
             return {
                 'deployment_id': cl_args[-1],
+                'worker': worker,
             }
     parsed_args = parse_command_line(sys.argv[1:])
+    worker = parsed_args.pop('worker')
     parsed_args['user_level'] = 'admin'
 
     if 'config_dir' in parsed_args:
@@ -341,4 +832,7 @@ if __name__ == '__main__':
     log.addHandler(handler)
 
     prog = Installer(parsed_args)
-    prog.run()
+    if worker:
+        prog.serve()
+    else:
+        prog.run()
@@ -26,13 +26,10 @@ import time
 import hashlib
 
 from email.mime.text import MIMEText
+from multiprocessing.pool import ThreadPool
 
 import requests
 import requests.exceptions
-import lxml.html
-import jenkinsapi.jenkins
-
-from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
 
 import tagopsdb
 import tagopsdb.exceptions
@@ -50,6 +47,42 @@ from . import TDSProgramBase
 
 log = logging.getLogger('tds.apps.repo_updater')
 
+# Size of the chunks RPMs are downloaded (and hashed) in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class PackageWorkItem(object):
+    """
+    A pending package on its way into the repository.  The values needed
+    from its database row are read once, when the item is created, and
+    carried with the RPM file through download, verification, linking and
+    publishing; database updates only need the package's ID.
+    """
+
+    def __init__(self, package, incoming_dir):
+        """Initialize object from the package's tagopsdb object."""
+        self.id = package.id
+        self.job = package.job
+        self.version = package.version
+        self.revision = package.revision
+        self.pkg_name = package.application.pkg_name
+        self.rpm_name = '{name}-{version}-{revision}.{arch}.rpm'.format(
+            name=self.pkg_name,
+            version=self.version,
+            revision=self.revision,
+            arch=package.application.arch,
+        )
+        self.path = os.path.join(incoming_dir, self.rpm_name)
+        self.rpm = None
+
+    def matches_rpm(self):
+        """Return True if the downloaded RPM is the one for this package."""
+        return (
+            str(self.rpm.name) == str(self.pkg_name) and
+            str(self.rpm.version) == str(self.version) and
+            str(self.rpm.release) == str(self.revision)
+        )
+
 
 class RepoUpdater(TDSProgramBase):
     """
@@ -88,6 +121,64 @@ class RepoUpdater(TDSProgramBase):
         self.max_attempts = self.config.get('jenkins').get(
             'max_download_attempts', 3
         )
+        self.download_timeout = self.config.get('jenkins').get(
+            'download_timeout', 60
+        )
+        self.jenkins = utils.jenkins.JenkinsClient(
+            self.jenkins_url,
+            ttl=self.config.get('jenkins').get('cache_ttl', 600),
+            max_entries=self.config.get('jenkins').get('cache_size', 256),
+        )
+        self.repo_metadata = self.config.get('repo').get('metadata', 'make')
+        if self.repo_metadata not in ('make', 'createrepo'):
+            raise exceptions.ConfigurationError(
+                'Unknown repo metadata update method %r', self.repo_metadata
+            )
+        self.createrepo_cachedir = self.config.get('repo').get(
+            'createrepo_cachedir', os.path.join(self.repo_dir, '.cache')
+        )
+        self.publish_min_window = self.config.get('repo').get(
+            'publish_min_window', 0
+        )
+        self.publish_max_window = self.config.get('repo').get(
+            'publish_max_window', 60
+        )
+        self.publish_max_batch = self.config.get('repo').get(
+            'publish_max_batch', None
+        )
+        self.unpublished = list()
+        self.batch_started = self.batch_updated = None
+        self.artifact_store = None
+        artifact_cache = self.config.get('repo').get('artifact_cache', None)
+        if artifact_cache is not None:
+            self.artifact_store = utils.artifact_store.ArtifactStore(
+                artifact_cache,
+                self.config.get('repo').get(
+                    'artifact_cache_size', 10 * 1024 ** 3
+                ),
+            )
+        rpm_query = self.config.get('repo').get('rpm_query', 'rpm')
+        try:
+            self.rpm_query_provider = utils.rpm.QUERY_PROVIDERS[rpm_query]
+        except KeyError:
+            raise exceptions.ConfigurationError(
+                'Unknown RPM query provider %r', rpm_query
+            )
+        download_workers = self.config.get('jenkins').get(
+            'download_workers', 4
+        )
+        try:
+            self.download_workers = int(download_workers)
+        except (TypeError, ValueError):
+            self.download_workers = 0
+        if self.download_workers < 1:
+            raise exceptions.ConfigurationError(
+                'Invalid number of Jenkins download workers: %r',
+                download_workers
+            )
+        # Started on first use and kept across passes, so that the workers'
+        # Jenkins sessions keep their connections
+        self.download_pool = None
 
     def validate_repo_config(self):
         """
@@ -127,84 +218,167 @@ class RepoUpdater(TDSProgramBase):
         except smtplib.SMTPException as exc:
             log.error('Email send failed: %s', exc)
 
+    def _get_download_pool(self):
+        """
+        Return the pool of download workers, starting it if needed.
+        """
+        if self.download_pool is None:
+            self.download_pool = ThreadPool(self.download_workers)
+
+        return self.download_pool
+
     def _download_rpms(self):
         """
         Determine the RPMs that need to be downloaded by reading the database
         and download those RPMs into the self.incoming_dir directory.
+        Return the work items of the packages whose RPMs were downloaded.
+
+        Up to self.download_workers packages are fetched at once; all
+        database updates are done here, as the workers only talk to Jenkins
+        and the file system.  Packages are marked as processing together,
+        while failures are committed as soon as they come in; if the pass is
+        aborted, the pool is stopped and the packages not handled yet are
+        made pending again.
         """
-        rpms = list()
+        items = list()
 
         # Close the session to ensure the DB is read again
         tagopsdb.Session.close()
-        self.pending_pkgs = tagopsdb.Package.find(status='pending')
+        self.pending_pkgs = model.Package.find_pending()
         if not self.pending_pkgs:
             return
         try:
-            jenkins = jenkinsapi.jenkins.Jenkins(self.jenkins_url)
-        except Exception:
+            self.jenkins.check_connection()
+        except exceptions.FailedConnectionError:
             log.error(
                 'Unable to contact Jenkins server at {url}.'.format(
                     url=self.jenkins_url,
                 )
             )
-            return rpms
-
-        for pkg in self.pending_pkgs:
-            rpm_name = '{name}-{version}-{revision}.{arch}.rpm'.format(
-                name=pkg.application.pkg_name,
-                version=pkg.version,
-                revision=pkg.revision,
-                arch=pkg.application.arch,
-            )
-            rpm_path = os.path.join(self.incoming_dir, rpm_name)
-            try:
-                rpm = self._download_rpm_for_pkg(
-                    pkg, jenkins, rpm_name, rpm_path
-                )
-            except exceptions.TDSException as exc:
-                if os.path.isfile(rpm_path):
-                    self.remove_file(rpm_path)
-                log.error('Failed to download RPM for package with id={id}: '
-                          '{exc}'.format(id=pkg.id, exc=exc))
-                pkg.status = 'failed'
+            return items
+
+        fetches = [
+            PackageWorkItem(pkg, self.incoming_dir) for pkg in self.pending_pkgs
+        ]
+        model.Package.update_statuses(
+            [item.id for item in fetches], 'processing'
+        )
+        tagopsdb.Session.commit()
+
+        unhandled = set(item.id for item in fetches)
+        pool = self._get_download_pool()
+        try:
+            for item, exc in pool.imap_unordered(self._fetch_rpm, fetches):
+                unhandled.discard(item.id)
+
+                if exc is None:
+                    items.append(item)
+                    continue
+
+                if os.path.isfile(item.path):
+                    self.remove_file(item.path)
+                if isinstance(exc, exceptions.FailedConnectionError):
+                    # Jenkins went away; try again on the next pass
+                    log.error('{exc} Leaving package with id={id} pending.'
+                              .format(id=item.id, exc=exc))
+                    model.Package.update_statuses([item.id], 'pending')
+                else:
+                    log.error('Failed to download RPM for package with '
+                              'id={id}: {exc}'.format(id=item.id, exc=exc))
+                    model.Package.update_statuses([item.id], 'failed')
+                tagopsdb.Session.commit()
+        finally:
+            if unhandled:
+                # Wait for the fetches still running before retrying them
+                pool.close()
+                pool.join()
+                self.download_pool = None
+
+                log.error('Aborted download pass, leaving packages with '
+                          'ids=%s pending.', sorted(unhandled))
+                tagopsdb.Session.rollback()
+                model.Package.update_statuses(sorted(unhandled), 'pending')
                 tagopsdb.Session.commit()
-            else:
-                rpms.append(rpm)
 
-        return rpms
+        return items
 
-    def _download_rpm_for_pkg(self, pkg, jenkins, rpm_name, rpm_path):
+    def _fetch_rpm(self, item):
         """
-        Download the RPM for the given package. Raise an error on failure.
+        Worker for _download_rpms: download the RPM for the given work item,
+        setting its RPM descriptor.  Return (item, None), or the
+        exception in place of None on failure.
         """
-        pkg.status = 'processing'
-        tagopsdb.Session.commit()
+        try:
+            item.rpm = self._download_rpm_for_pkg(
+                item.job, item.version, item.rpm_name, item.path
+            )
+        except exceptions.TDSException as exc:
+            return item, exc
+        except Exception as exc:
+            # Any other error (e.g., from the file system) only fails this
+            # package; raising it would abort the whole pass
+            log.exception('Unexpected error downloading RPM for package '
+                          'with id=%s', item.id)
+            return item, exc
+        else:
+            return item, None
+
+    def _download_rpm_for_pkg(self, job, version, rpm_name, rpm_path):
+        """
+        Download the RPM for the given package job and version.
+        Raise an error on failure.
+        """
+        job_name = job.split('/', 1)[0]
 
-        job_name = pkg.job
-        matrix_name = None
-        if '/' in job_name:
-            job_name, matrix_name = job_name.split('/', 1)
-        job = jenkins[job_name]
         try:
-            build = job.get_build(int(pkg.version))
-        except KeyError:
+            fingerprint_md5 = self.jenkins.get_fingerprint_md5(
+                job, version, rpm_name,
+            )
+        except exceptions.JenkinsJobNotFoundError:
             raise exceptions.JenkinsJobNotFoundError(
-                'Artifact', job_name, pkg.version, self.jenkins_url,
+                'Artifact', job_name, version, self.jenkins_url,
             )
-        if matrix_name is not None:
-            build = [run for run in build.get_matrix_runs() if matrix_name
-                     in run.baseurl][0]
 
-        fingerprint_md5 = self._get_jenkins_fingerprint_md5(
-            job_name, rpm_name, pkg.version,
+        # Artifacts already downloaded (e.g., for an earlier attempt to add
+        # the same package) are linked from the store
+        if fingerprint_md5 is None or self.artifact_store is None:
+            self._download_artifact(job, version, rpm_name, rpm_path,
+                                    fingerprint_md5)
+        elif not self.artifact_store.fetch(fingerprint_md5, rpm_path):
+            self._download_artifact(job, version, rpm_name, rpm_path,
+                                    fingerprint_md5)
+            self.artifact_store.add(fingerprint_md5, rpm_path)
+
+        rpm = utils.rpm.RPMDescriptor.from_path(
+            rpm_path, self.rpm_query_provider
         )
+        if rpm is None:
+            self.notify_bad_rpm(rpm_name)
+            raise exceptions.InvalidRPMError(
+                'Package {rpm_name} is an invalid RPM.'.format(
+                    rpm_name=rpm_name
+                )
+            )
+        else:
+            return rpm
+
+    def _download_artifact(self, job, version, rpm_name, rpm_path,
+                           fingerprint_md5):
+        """
+        Download the given artifact from Jenkins to rpm_path, checking it
+        against its fingerprint MD5 if there is one.
+        Raise an error on failure.
+        """
+        job_name = job.split('/', 1)[0]
+
+        # Start from scratch; retries resume interrupted transfers
+        self.remove_file(rpm_path)
         for _attempt in range(self.max_attempts):
             try:
-                artifact = build.get_artifact_dict()[rpm_name]
-                rpm_url = artifact.url
-            except (KeyError, JenkinsAPIException, NotFound):
+                rpm_url = self.jenkins.get_artifact_url(job, version, rpm_name)
+            except exceptions.JenkinsJobNotFoundError:
                 raise exceptions.JenkinsJobNotFoundError(
-                    'Artifact', job_name, pkg.version, self.jenkins_url,
+                    'Artifact', job_name, version, self.jenkins_url,
                 )
 
             if self.jenkins_direct_url is not None:
@@ -212,22 +386,15 @@ class RepoUpdater(TDSProgramBase):
                     self.jenkins_url, self.jenkins_direct_url,
                 )
 
-            req = requests.get(rpm_url)
-
-            if req.status_code != requests.codes.ok:
+            try:
+                file_md5 = self._stream_to_file(rpm_url, rpm_path)
+            except requests.exceptions.HTTPError:
                 raise exceptions.JenkinsJobNotFoundError(
-                    'Artifact', job_name, pkg.version, self.jenkins_url,
+                    'Artifact', job_name, version, self.jenkins_url,
                 )
-            data = req.content
-            with open(rpm_path, 'wb') as rpm_file:
-                rpm_file.write(data)
-                rpm_file.flush()
-                os.fsync(rpm_file.fileno())
-
-            md5 = hashlib.md5()
-            with open(rpm_path) as rpm_file:
-                md5.update(rpm_file.read())
-                file_md5 = md5.hexdigest()
+            except requests.exceptions.RequestException as exc:
+                log.warning('Download of %s interrupted: %s', rpm_url, exc)
+                continue
 
             if fingerprint_md5 is None or fingerprint_md5.lower() == \
                     file_md5.lower():
@@ -236,90 +403,104 @@ class RepoUpdater(TDSProgramBase):
                 self.remove_file(rpm_path)
         else:
             raise exceptions.JenkinsJobTransferError(
-                'Artifact', job_name, pkg.verion, self.jenkins_url,
-            )
-
-        rpm = utils.rpm.RPMDescriptor.from_path(rpm_path)
-        if rpm is None:
-            self.notify_bad_rpm(rpm_name)
-            raise exceptions.InvalidRPMError(
-                'Package {rpm_name} is an invalid RPM.'.format(
-                    rpm_name=rpm_name
-                )
+                'Artifact', job_name, version, self.jenkins_url,
             )
-        else:
-            return rpm
 
-    def _get_jenkins_fingerprint_md5(self, job_name, rpm_name, version):
+    def _stream_to_file(self, url, path):
         """
-        Acquire the Jenkins fingerprint MD5 for the given package.
-        This may return 'None' if fingerprinting has not been enabled
-        for the given job (specifically for the RPM artifacts).
+        Download url into the file at path in chunks, hashing the data as it
+        is written, and return its MD5 hex digest.
+        If the file already exists, it holds the start of an earlier,
+        interrupted download of url, and only the rest is requested (with
+        a Range header) unless the server can not resume.
+        An interrupted transfer raises requests.exceptions.RequestException
+        and leaves the data received so far in the file.
         """
+        md5 = hashlib.md5()
+        size = 0
+        headers = dict()
+
+        if os.path.isfile(path):
+            with open(path, 'rb') as rpm_file:
+                for chunk in iter(
+                    lambda: rpm_file.read(DOWNLOAD_CHUNK_SIZE), ''
+                ):
+                    md5.update(chunk)
+                    size += len(chunk)
+            headers['Range'] = 'bytes=%d-' % size
+
+        req = requests.get(url, headers=headers, stream=True,
+                           timeout=self.download_timeout)
+        try:
+            if size and req.status_code != requests.codes.partial_content:
+                log.debug('Unable to resume download of %s, restarting', url)
+                req.close()
+                md5 = hashlib.md5()
+                size = 0
+                req = requests.get(url, stream=True,
+                                   timeout=self.download_timeout)
+
+            if req.status_code not in (
+                requests.codes.ok, requests.codes.partial_content
+            ):
+                raise requests.exceptions.HTTPError(
+                    'Unexpected status %d for %s' % (req.status_code, url),
+                    response=req
+                )
 
-        # Grab the 'fingerprints' page for the job
-        req = requests.get(os.path.join(
-            self.jenkins_url, 'job', job_name,
-            version, 'fingerprints', ''
-        ))
-
-        # The XPath is to extract an href from a row in a table
-        # where the artifact matches the RPM file
-        html = lxml.html.fromstring(req.content)
-        xpath = (
-            '//td[re:test(.,"(?<!\w)%s")]/../td[contains(.,"details")]/a/@href'
-            % rpm_name.replace('.', '\.')
-        )
-        fingerprint_href = html.xpath(
-            xpath,
-            namespaces = {'re': 'http://exslt.org/regular-expressions'}
-        )
+            with open(path, 'ab' if size else 'wb') as rpm_file:
+                for chunk in req.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    rpm_file.write(chunk)
+                    md5.update(chunk)
 
-        # Found an href?  Get the md5 in it (last part of the path)!
-        # Otherwise let user know it's not there
-        if fingerprint_href:
-            return fingerprint_href[0].split('/')[-2]
-        else:
-            return None
+                rpm_file.flush()
+                os.fsync(rpm_file.fileno())
+        finally:
+            req.close()
+
+        return md5.hexdigest()
 
     def prepare_rpms(self):
-        """Move RPMs in incoming directory to the processing directory."""
-        rpms = self._download_rpms()
+        """
+        Download the pending packages' RPMs, check that each matches its
+        package and move the good ones to the processing directory.
+        Return the work items of the RPMs ready for the repository.
+        """
+        items = self._download_rpms()
 
-        if not rpms:
+        if not items:
             return
 
         log.info('Valid files found, moving them from incoming directory '
                  'to processing directory to be processed...')
 
         good = list()
-        for rpm in rpms:
-            package = model.Package.get(**rpm.info)
-
-            if package is None:
+        failed = list()
+        for item in items:
+            if not item.matches_rpm():
                 log.error(
                     'Missing entry for package "%s", '
                     'version %s, revision %s in database',
-                    rpm.name, rpm.version, rpm.release
+                    item.rpm.name, item.rpm.version, item.rpm.release
                 )
-                self.remove_file(rpm.path)
+                self.remove_file(item.path)
+                failed.append(item.id)
                 continue
 
+            processing_path = os.path.join(self.processing_dir, item.rpm_name)
             try:
-                os.rename(
-                    rpm.path,
-                    os.path.join(self.processing_dir, rpm.filename)
-                )
+                os.rename(item.path, processing_path)
             except OSError as exc:
                 log.error('Unable to move file "%s" to "%s": %s',
-                          rpm.path, self.processing_dir, exc)
-                package.status = 'failed'
-                self.remove_file(rpm.path)
+                          item.path, self.processing_dir, exc)
+                self.remove_file(item.path)
+                failed.append(item.id)
             else:
-                rpm.path = os.path.join(self.processing_dir, rpm.filename)
-                good.append(rpm)
-            finally:
-                tagopsdb.Session.commit()
+                item.path = item.rpm.path = processing_path
+                good.append(item)
+
+        model.Package.update_statuses(failed, 'failed')
+        tagopsdb.Session.commit()
 
         return good
 
@@ -342,95 +523,153 @@ class RepoUpdater(TDSProgramBase):
         smtp.sendmail(sender, receiver_emails, msg.as_string())
         smtp.quit()
 
-    def process_rpms(self, rpms):
-        """Copy RPMs in processing directory to the repository and run
-           update the repo.
+    def process_rpms(self, items):
+        """Link the RPMs of the given work items from the processing
+           directory into the repository and queue them for the next repo
+           update (see publish()).
         """
         ready_for_repo = []
+        failed = []
 
-        if not rpms:
+        if not items:
             return
 
-        for rpm in rpms:
+        for item in items:
             log.info('Verifying file %s and if valid moving to repository',
-                     rpm.path)
-
-            package = model.Package.get(**rpm.info)
-
-            if package is None:
-                log.error(
-                    'Missing entry for package "%s", '
-                    'version %s, revision %s in database',
-                    rpm.name, rpm.version, rpm.release
-                )
-                self.remove_file(rpm.path)
-                continue
+                     item.path)
 
             # TODO: ensure package is valid (security purposes)
 
-            dest_file = os.path.join(self.repo_dir, rpm.arch, rpm.filename)
+            dest_file = os.path.join(self.repo_dir, item.rpm.arch,
+                                     item.rpm_name)
 
             try:
                 self.remove_file(dest_file)
-                os.link(rpm.path, dest_file)
+                os.link(item.path, dest_file)
             except IOError:
                 time.sleep(2)   # Short delay before re-attempting
 
                 try:
                     self.remove_file(dest_file)
-                    os.link(rpm.path, dest_file)
+                    os.link(item.path, dest_file)
                 except IOError:
-                    package.status = 'failed'
-                    self.remove_file(rpm.path)
+                    self.remove_file(item.path)
+                    failed.append(item.id)
                     continue
-                finally:
-                    tagopsdb.Session.commit()
 
-            ready_for_repo.append((rpm, package))
+            ready_for_repo.append(item)
+
+        if failed:
+            model.Package.update_statuses(failed, 'failed')
+            tagopsdb.Session.commit()
+
+        if ready_for_repo:
+            now = time.time()
+            if not self.unpublished:
+                self.batch_started = now
+            self.batch_updated = now
+            self.unpublished.extend(ready_for_repo)
+
+    @property
+    def publish_deadline(self):
+        """
+        Return the time by which the waiting RPMs are to be published,
+        or None if there are none.
+        """
+        if not self.unpublished:
+            return None
 
-        if len(ready_for_repo) > 0:
-            self.update_repo(ready_for_repo)
-            log.info('Done processing.')
+        return min(self.batch_updated + self.publish_min_window,
+                   self.batch_started + self.publish_max_window)
 
-    def update_repo(self, rpms_packages):
+    def publish(self, force=False):
         """
-        Update the repo with the given RPMs.
+        Update the repo for the RPMs added to it since the last update,
+        once the batching policy allows it (or right away if force is set).
+
+        RPMs arriving close together are published with a single metadata
+        update: the update waits until no new RPM came in for
+        repo.publish_min_window seconds, but no longer than
+        repo.publish_max_window seconds after the first one, or until
+        repo.publish_max_batch RPMs are waiting.  With the default minimum
+        window of 0, every pass publishes what it added.
+        """
+        if not self.unpublished:
+            return
+
+        now = time.time()
+        if not (
+            force or
+            now - self.batch_updated >= self.publish_min_window or
+            now - self.batch_started >= self.publish_max_window or
+            (self.publish_max_batch is not None and
+             len(self.unpublished) >= self.publish_max_batch)
+        ):
+            return
+
+        items, self.unpublished = self.unpublished, list()
+
+        log.info('Publishing %d package(s)', len(items))
+        self.update_repo(items)
+        log.info('Done processing.')
+
+    @property
+    def repo_update_command(self):
+        """
+        Return the command regenerating the yum repository metadata.
+        With repo.metadata set to 'createrepo', the metadata is updated
+        in place: createrepo only reads the headers of RPMs that are new
+        or changed since the last run (reusing the existing metadata and
+        the checksums kept in the cache directory for the rest), and drops
+        RPMs that are gone.  By default, the repository's Makefile is run.
+        """
+        if self.repo_metadata == 'createrepo':
+            return [
+                'createrepo', '--update',
+                '--cachedir', self.createrepo_cachedir,
+                self.repo_dir,
+            ]
+
+        return ['make', '-C', self.repo_dir]
+
+    def update_repo(self, items):
+        """
+        Update the repo with the RPMs of the given work items.
         """
         log.info('Updating repo...')
         old_umask = os.umask(0o002)
         final_status = 'completed'
 
         try:
-            utils.run(['make', '-C', self.repo_dir])
+            utils.run(self.repo_update_command)
         except exceptions.RunProcessError as exc:
             log.error('yum database update failed, retrying: %s', exc)
             time.sleep(5)   # Short delay before re-attempting
 
             try:
-                utils.run(['make', '-C', self.repo_dir])
+                utils.run(self.repo_update_command)
             except exceptions.RunProcessError as exc:
                 log.error('yum database update failed, aborting: %s', exc)
                 final_status = 'failed'
 
         log.info('Updating status of packages to: %s', final_status)
-        # Yes, making the assumption none of the package finds
-        # will fail...
-        for rpm, package in rpms_packages:
-            package.status = final_status
-            tagopsdb.Session.commit()
+        model.Package.update_statuses([item.id for item in items],
+                                      final_status)
+        tagopsdb.Session.commit()
 
         os.umask(old_umask)
         log.info('Removing processed files...')
 
-        for rpm, package in rpms_packages:
-            self.remove_file(rpm.path)
+        for item in items:
+            self.remove_file(item.path)
 
     def run(self):
         """
         Find files in incoming dir and add them to the yum repository
         """
-        rpms = self.prepare_rpms()
-        self.process_rpms(rpms)
+        items = self.prepare_rpms()
+        self.process_rpms(items)
+        self.publish()
 
     @property
     def incoming_dir(self):
@@ -27,6 +27,7 @@ import tds.deploy_strategy
 import tds.exceptions
 import tds.model
 import tds.notifications
+import tds.utils.wakeup
 
 from .base import BaseController, validate as input_validate
 
@@ -291,6 +292,10 @@ class DeployController(BaseController):
                          'host deployment is complete.')
                 self.deployment.status = 'canceled'
                 tagopsdb.Session.commit()
+                tds.utils.wakeup.publish(
+                    self.app_config, block=True,
+                    path=tds.utils.wakeup.CANCEL_PATH,
+                )
             elif self.deployment.status in ['complete', 'failed']:
                 log.info('Deployment was already completed, nothing to do.')
             else:
@@ -401,6 +406,15 @@ class DeployController(BaseController):
         notification = tds.notifications.Notifications(self.app_config)
         notification.notify(deployment)
 
+    def queue_deployment(self):
+        """
+        Mark the deployment as queued, commit, and wake up the installer
+        daemons.
+        """
+        self.deployment.status = 'queued'
+        tagopsdb.Session.commit()
+        tds.utils.wakeup.publish(self.app_config, block=True)
+
     @input_validate('package_hostonly')
     @input_validate('targets')
     @input_validate('application')
@@ -552,8 +566,7 @@ class DeployController(BaseController):
         params['version'] = package.version
         self.send_notifications(**params)
 
-        self.deployment.status = 'queued'
-        tagopsdb.Session.commit()
+        self.queue_deployment()
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
                      'now.')
@@ -710,8 +723,7 @@ class DeployController(BaseController):
         self.send_notifications(**params)
 
         # Let installer daemon access deployment now
-        self.deployment.status = 'queued'
-        tagopsdb.Session.commit()
+        self.queue_deployment()
 
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
@@ -948,7 +960,6 @@ class DeployController(BaseController):
         params['version'] = package.version
         self.send_notifications(**params)
 
-        self.deployment.status = 'queued'
         for invalid_dep in tier_deps_to_invalidate:
             invalid_dep.status = 'invalidated'
             tagopsdb.Session.add(invalid_dep)
@@ -956,7 +967,7 @@ class DeployController(BaseController):
                 if host_dep.host.app_id != invalid_dep.app_id:
                     continue
                 tagopsdb.Session.delete(host_dep)
-        tagopsdb.Session.commit()
+        self.queue_deployment()
         if params['detach']:
             log.info('Deployment ready for installer daemon, disconnecting '
                      'now.')
@@ -16,20 +16,9 @@
 
 import hashlib
 import logging
-import os.path
 import signal
 import time
 
-import jenkinsapi.jenkins
-try:
-    from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
-except ImportError:
-    from jenkinsapi.exceptions import JenkinsAPIException, NotFound
-
-import lxml.html
-import requests
-import requests.exceptions
-
 import tagopsdb
 import tagopsdb.exceptions
 import tagopsdb.deploy.repo
@@ -37,6 +26,7 @@ import tagopsdb.deploy.deploy
 import tagopsdb.deploy.package
 
 import tds.exceptions
+import tds.utils.wakeup
 from .base import BaseController, validate
 from .. import utils
 
@@ -72,6 +62,16 @@ class PackageController(BaseController):
         """
         return self.app_config['jenkins.url']
 
+    @property
+    def jenkins(self):
+        """
+        Return the Jenkins client, creating it on first use.
+        """
+        if getattr(self, '_jenkins', None) is None:
+            self._jenkins = utils.jenkins.JenkinsClient(self.jenkins_url)
+
+        return self._jenkins
+
     def _refresh(self, obj):
         """
         WTF
@@ -113,38 +113,6 @@ class PackageController(BaseController):
             log.info('Session detached.')
             return dict()
 
-    def _get_jenkins_fingerprint_md5(self, job_name, rpm_name, version):
-        """
-        Acquire the Jenkins fingerprint MD5 for the given package.
-        This may return 'None' if fingerprinting has not been enabled
-        for the given job (specifically for the RPM artifacts).
-        """
-
-        # Grab the 'fingerprints' page for the job
-        req = requests.get(os.path.join(
-            self.jenkins_url, 'job', job_name,
-            version, 'fingerprints', ''
-        ))
-
-        # The XPath is to extract an href from a row in a table
-        # where the artifact matches the RPM file
-        html = lxml.html.fromstring(req.content)
-        xpath = (
-            '//td[re:test(.,"(?<!\w)%s")]/../td[contains(.,"details")]/a/@href'
-            % rpm_name.replace('.', '\.')
-        )
-        fingerprint_href = html.xpath(
-            xpath,
-            namespaces = {'re': 'http://exslt.org/regular-expressions'}
-        )
-
-        # Found an href?  Get the md5 in it (last part of the path)!
-        # Otherwise let user know it's not there
-        if fingerprint_href:
-            return fingerprint_href[0].split('/')[-2]
-        else:
-            return None
-
     @validate('application')
     def add(
         self, application, version, user, job=None, force=False, **params
@@ -175,8 +143,8 @@ class PackageController(BaseController):
             revision=revision,
             arch=application.arch,
         )
-        fingerprint_md5 = self._get_jenkins_fingerprint_md5(
-            job, rpm_name, version,
+        fingerprint_md5 = self.jenkins.get_fingerprint_md5(
+            job, version, rpm_name,
         )
         if fingerprint_md5 is None:
             log.info(
@@ -235,6 +203,9 @@ class PackageController(BaseController):
 
         package.status = 'pending'
         tagopsdb.Session.commit()
+        tds.utils.wakeup.publish(
+            self.app_config, block=True, path=tds.utils.wakeup.REPO_PATH
+        )
         if params['detach']:
             log.info('Package ready for repo updater daemon. Disconnecting '
                      'now.')
@@ -248,46 +219,7 @@ class PackageController(BaseController):
         Return the revision (e.g., git commit hash) if the build exists and is
         valid.
         """
-        try:
-            jenkins = jenkinsapi.jenkins.Jenkins(self.jenkins_url)
-        except Exception:
-            raise tds.exceptions.FailedConnectionError(
-                'Unable to contact Jenkins server at {url}.'.format(
-                    url=self.jenkins_url,
-                )
-            )
-
-        matrix_name = None
-        if '/' in job_name:
-            job_name, matrix_name = job_name.split('/', 1)
-
-        try:
-            job = jenkins[job_name]
-        except KeyError:
-            raise tds.exceptions.JenkinsJobNotFoundError(
-                "Job", job_name, version, self.jenkins_url,
-            )
-
-        try:
-            build = job.get_build(int(version))
-        except (KeyError, JenkinsAPIException, NotFound):
-            raise tds.exceptions.JenkinsJobNotFoundError(
-                "Build", job_name, version, self.jenkins_url,
-            )
-
-        if matrix_name is not None:
-            for run in build.get_matrix_runs():
-                if matrix_name in run.baseurl:
-                    build = run
-                    break
-            else:
-                raise tds.exceptions.JenkinsJobNotFoundError(
-                    "Matrix build", job_name, version, self.jenkins_url,
-                )
-        try:
-            return build.get_revision()
-        except:             # Not sure what exception will be raised --KN
-            return None
+        return self.jenkins.get_revision(job_name, version)
 
     @validate('package')
     def delete(self, package, **params):
@@ -20,10 +20,36 @@ Abstract base DeployStrategy class.
 class DeployStrategy(object):
     """Abstract base DeployStrategy class."""
 
+    @staticmethod
+    def _match_host(name, hosts):
+        """
+        Return the host in hosts that the given name reported by the
+        deployment system belongs to (either the same name or its FQDN),
+        or None if there is none.
+        """
+        for host in hosts:
+            if name == host or name.startswith(host + '.'):
+                return host
+
+        return None
+
     def deploy_to_host(self, dep_host, app, version, retry=4):
         """Raise NotImplementedError."""
         raise NotImplementedError
 
+    def deploy_to_hosts(self, dep_hosts, app, version, retry=4):
+        """
+        Deploy an application to each of the given hosts, yielding
+        (host, success, result) tuples as results become available.
+        Strategies that can dispatch to many hosts at once should override
+        this; by default each host is deployed to in turn.
+        """
+        for dep_host in dep_hosts:
+            success, host_result = self.deploy_to_host(
+                dep_host, app, version, retry=retry
+            )
+            yield (dep_host, success, host_result)
+
     def restart_host(self, dep_host, app, retry=4):
         """Raise NotImplementedError."""
         raise NotImplementedError
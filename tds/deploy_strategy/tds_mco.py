@@ -35,9 +35,27 @@ class TDSMCODeployStrategy(DeployStrategy):
         """Initialize object."""
         self.mco_bin = bin
 
+    @staticmethod
+    def _host_filter(dep_hosts):
+        """
+        Return an mco fact filter matching exactly the given hosts; a plain
+        equality filter is used for a single host, otherwise an anchored
+        regex alternation covering all of them.
+        """
+        if len(dep_hosts) == 1:
+            return 'hostname=%s' % dep_hosts[0]
+
+        return 'hostname=/^(%s)$/' % '|'.join(
+            re.escape(host) for host in dep_hosts
+        )
+
     @tds.utils.debug
-    def _process_mco_command(self, mco_cmd, retry):
-        """Run a given MCollective 'mco' command"""
+    def _run_mco_command(self, mco_cmd):
+        """
+        Run a given MCollective 'mco' command and parse its output.
+        Return a tuple of (error, per-host output, number of discovered
+        hosts); error is None on success.
+        """
 
         log.debug('Running MCollective command')
         log.debug(5, 'Command is: %s' % ' '.join(mco_cmd))
@@ -46,51 +64,124 @@ class TDSMCODeployStrategy(DeployStrategy):
         stdout, stderr = proc.stdout, proc.stderr
 
         if proc.returncode:
-            return (False, 'The mco process failed to run successfully.\n'
-                           'return code is %r.\n'
-                           'Stdout: %r\n'
-                           'Stderr: %r' % (proc.returncode, stdout, stderr))
+            return ('The mco process failed to run successfully.\n'
+                    'return code is %r.\n'
+                    'Stdout: %r\n'
+                    'Stderr: %r' % (proc.returncode, stdout, stderr),
+                    None, None)
 
         mc_output = None
         summary = None
 
-        # Extract the JSON output and summary line
+        # Extract the JSON output (one or more lines of per-host
+        # entries) and summary line
         for line in stdout.split('\n'):
             if not line:
                 continue
 
             if line.startswith('{'):
-                mc_output = json.loads(line)
+                if mc_output is None:
+                    mc_output = {}
+                mc_output.update(json.loads(line))
 
             if line.startswith('Finished'):
                 summary = line.strip()
 
         # Ensure valid response and extract information
         if mc_output is None or summary is None:
-            return (False, 'No output or summary information returned '
-                           'from mco process')
+            return ('No output or summary information returned '
+                    'from mco process', None, None)
 
         log.debug(summary)
         match = re.search(r'processing (\d+) / (\d+) ', summary)
 
         if match is None:
-            return (False, 'Error parsing summary line.')
+            return ('Error parsing summary line.', None, None)
+
+        return (None, mc_output, int(match.group(2)))
+
+    @staticmethod
+    def _host_result(hostinfo):
+        """Convert a host's mco output entry into a (success, result)"""
+
+        if hostinfo['exitcode'] != 0:
+            return (False, hostinfo['stderr'].strip())
+        else:
+            return (True, 'Deploy successful')
+
+    @tds.utils.debug
+    def _process_mco_command(self, mco_cmd, retry):
+        """Run a given MCollective 'mco' command"""
+
+        error, mc_output, discovered = self._run_mco_command(mco_cmd)
+
+        if error is not None:
+            return (False, error)
 
         # Virtual hosts in dev tend to time out unpredictably, probably
         # because vmware is slow to respond when the hosts are not
         # active. Subsequent retries after a timeout work better.
-        if match.group(2) == '0' and retry > 0:
+        if discovered == 0 and retry > 0:
             log.debug('Discovery failure, trying again.')
             return self._process_mco_command(mco_cmd, retry-1)
 
         for _host, hostinfo in mc_output.iteritems():
-            if hostinfo['exitcode'] != 0:
-                return (False, hostinfo['stderr'].strip())
-            else:
-                return (True, 'Deploy successful')
+            return self._host_result(hostinfo)
+
+        return (False, 'Unknown/unparseable mcollective output: %r' %
+                mc_output)
+
+    @tds.utils.debug
+    def _process_mco_hosts(self, dep_hosts, mco_args, retry):
+        """
+        Run a single 'mco' command against all given hosts, yielding
+        (host, success, result) for each of them.  Hosts which were not
+        discovered are retried together until the retries are exhausted;
+        hosts which already answered are not contacted again.  If any
+        discovered host did not answer before the timeout, its install may
+        still be running, so no host is retried and those that did not
+        answer are reported as failed.
+        """
 
-        return (False, 'Unknown/unparseable mcollective output: %s' %
-                stdout)
+        remaining = list(dep_hosts)
+
+        while remaining:
+            mco_cmd = [self.mco_bin, 'tds', '--discovery-timeout', '4',
+                       '--timeout', '60', '-W',
+                       self._host_filter(remaining)] + mco_args
+
+            error, mc_output, discovered = self._run_mco_command(mco_cmd)
+
+            if error is not None:
+                for host in remaining:
+                    yield (host, False, error)
+                return
+
+            for name, hostinfo in mc_output.iteritems():
+                host = self._match_host(name, remaining)
+
+                if host is None:
+                    continue
+
+                remaining.remove(host)
+                success, host_result = self._host_result(hostinfo)
+                yield (host, success, host_result)
+
+            if not remaining or retry <= 0:
+                break
+
+            if discovered > len(mc_output):
+                log.debug('%d host(s) timed out, not trying again.',
+                          discovered - len(mc_output))
+                break
+
+            # See _process_mco_command for why discovery is retried
+            log.debug('Discovery failure for %d host(s), trying again.',
+                      len(remaining))
+            retry -= 1
+
+        for host in remaining:
+            yield (host, False, 'No data returned from host %s' % host)
 
     @tds.utils.debug
     def restart_host(self, dep_host, app, retry=4):
@@ -113,3 +204,17 @@ class TDSMCODeployStrategy(DeployStrategy):
                    app, version]
 
         return self._process_mco_command(mco_cmd, retry)
+
+    @tds.utils.debug
+    def deploy_to_hosts(self, dep_hosts, app, version, retry=4):
+        """
+        Deploy to the given hosts with a single mco invocation, yielding
+        (host, success, result) for each of them as results come in.
+        """
+
+        log.debug('Deploying to hosts %r', dep_hosts)
+
+        if not dep_hosts:
+            return iter([])
+
+        return self._process_mco_hosts(dep_hosts, [app, version], retry)
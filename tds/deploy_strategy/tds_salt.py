@@ -15,6 +15,7 @@
 """Salt-based DeployStrategy."""
 
 import os
+import threading
 
 import salt.client
 import salt.config
@@ -26,11 +27,10 @@ from .base import DeployStrategy
 import logging
 log = logging.getLogger('tds')
 
-# Note: in order to do multi-host in one call, need to specify them as
-# comma-separated string in the first arguent to publish.publish, like:
-# 'x.tagged.com,y.tagged.com'
-# Then, after all the args to the function call being published, add
-# 'expr_form=list'
+# Note: in order to do multi-host in one call, the targets are joined into a
+# compound expression ('x.* or y.*') and 'expr_form=compound' is added after
+# all the args to the function call being published; this keeps the FQDN
+# matching used for single hosts.
 
 
 class TDSSaltDeployStrategy(DeployStrategy):
@@ -38,23 +38,45 @@ class TDSSaltDeployStrategy(DeployStrategy):
 
     def __init__(self, c_dir=None):
         self.c_dir = c_dir
+        self._opts = None
+        self._local = threading.local()
+
+    @property
+    def opts(self):
+        """
+        Return the salt minion config, loading it on first use.
+        """
+        if self._opts is None:
+            if self.c_dir is not None:
+                self._opts = salt.config.minion_config(
+                    os.path.join(self.c_dir, 'minion')
+                )
+            else:
+                self._opts = salt.config.minion_config('/etc/salt.tds/minion')
+
+        return self._opts
+
+    @property
+    def caller(self):
+        """
+        Return the salt Caller, creating it on first use; it is reused for
+        the life of this object.  Callers are kept per thread, since the
+        installer may publish from several threads at once.
+        """
+        caller = getattr(self._local, 'caller', None)
+        if caller is None:
+            caller = self._local.caller = salt.client.Caller(mopts=self.opts)
+
+        return caller
 
     @tds.utils.debug
     def _publish(self, host, cmd, *args):
         """Dispatch to salt master."""
 
-        if self.c_dir is not None:
-            opts = salt.config.minion_config(
-                os.path.join(self.c_dir, 'minion')
-            )
-        else:
-            opts = salt.config.minion_config('/etc/salt.tds/minion')
-
-        caller = salt.client.Caller(mopts=opts)
         host_re = '%s.*' % host   # To allow FQDN matching
 
         # Set timeout high because... RedHat
-        result = caller.sminion.functions['publish.full_data'](
+        result = self.caller.sminion.functions['publish.full_data'](
             host_re, cmd, args, timeout=120
         )
 
@@ -67,6 +89,36 @@ class TDSSaltDeployStrategy(DeployStrategy):
 
         return (success, host_result)
 
+    @tds.utils.debug
+    def _publish_many(self, hosts, cmd, *args):
+        """
+        Dispatch a single job targeting all the given hosts to salt master
+        and yield (host, success, result) for each host.
+        Note that publish.full_data only returns once every targeted minion
+        has replied or the timeout has passed; results are yielded in the
+        order they were returned, followed by any hosts that did not reply,
+        which are reported as failed as _publish does.  They are not
+        targeted again, since they may still be running the command.
+        """
+        target = ' or '.join('%s.*' % host for host in hosts)
+
+        result = self.caller.sminion.functions['publish.full_data'](
+            target, cmd, args, timeout=120, expr_form='compound'
+        )
+
+        remaining = list(hosts)
+        for minion_id, minion_data in (result or {}).iteritems():
+            host = self._match_host(minion_id, remaining)
+            if host is None:
+                continue
+
+            remaining.remove(host)
+            host_result = minion_data['ret']
+            yield (host, host_result.endswith('successful'), host_result)
+
+        for host in remaining:
+            yield (host, False, 'No data returned from host %s' % host)
+
     @tds.utils.debug
     def deploy_to_host(self, dep_host, app, version, retry=4):
         """Deploy an application to a given host"""
@@ -74,6 +126,18 @@ class TDSSaltDeployStrategy(DeployStrategy):
         log.debug('Deploying to host %r', dep_host)
         return self._publish(dep_host, 'tds.install', app, version)
 
+    def deploy_to_hosts(self, dep_hosts, app, version, retry=4):
+        """
+        Deploy an application to the given hosts with one salt job,
+        yielding (host, success, result) for each host.
+        """
+        dep_hosts = list(dep_hosts)
+        if not dep_hosts:
+            return iter([])
+
+        log.debug('Deploying to hosts %r', dep_hosts)
+        return self._publish_many(dep_hosts, 'tds.install', app, version)
+
     @tds.utils.debug
     def restart_host(self, dep_host, app, retry=4):
         """Restart application on a given host"""
@@ -14,7 +14,7 @@
 
 """Model module for application object."""
 
-from sqlalchemy import desc, not_
+from sqlalchemy import and_, desc, func, not_
 
 from .base import Base
 import tagopsdb
@@ -155,6 +155,68 @@ class Application(Base):
             desc(tagopsdb.model.AppDeployment.realized)
         ).first()
 
+    @staticmethod
+    def get_latest_completed_tier_deployments(tier_ids, query=None):
+        """
+        Return the latest completed tier deployment of every application on
+        every tier with an ID in tier_ids (for the applications associated
+        with the tier) in every environment, in a single query.
+        The result is a list of (AppDeployment, Package, PackageDefinition)
+        tuples; a query over AppDeployment may be passed in.
+        """
+        if not tier_ids:
+            return []
+
+        if query is None:
+            query = tagopsdb.Session.query(tagopsdb.model.AppDeployment)
+
+        app_dep = tagopsdb.model.AppDeployment
+        package = tagopsdb.model.Package
+        proj_pkg = tagopsdb.model.ProjectPackage
+
+        latest = query.session.query(
+            package.pkg_def_id.label('pkg_def_id'),
+            app_dep.app_id.label('app_id'),
+            app_dep.environment_id.label('environment_id'),
+            func.max(app_dep.realized).label('realized'),
+        ).join(
+            app_dep.package
+        ).join(
+            proj_pkg,
+            and_(
+                proj_pkg.pkg_def_id == package.pkg_def_id,
+                proj_pkg.app_id == app_dep.app_id,
+            ),
+        ).filter(
+            app_dep.app_id.in_(tier_ids),
+            app_dep.status.in_(['validated', 'complete']),
+        ).group_by(
+            package.pkg_def_id,
+            app_dep.app_id,
+            app_dep.environment_id,
+        ).subquery()
+
+        # Deployments realized at the same time as the latest one are
+        # ordered by ID, so the caller can keep the last one
+        return query.add_entity(package).add_entity(
+            tagopsdb.model.PackageDefinition
+        ).join(
+            app_dep.package
+        ).join(
+            tagopsdb.model.PackageDefinition,
+            tagopsdb.model.PackageDefinition.id == package.pkg_def_id,
+        ).join(
+            latest,
+            and_(
+                latest.c.pkg_def_id == package.pkg_def_id,
+                latest.c.app_id == app_dep.app_id,
+                latest.c.environment_id == app_dep.environment_id,
+                latest.c.realized == app_dep.realized,
+            ),
+        ).filter(
+            app_dep.status.in_(['validated', 'complete']),
+        ).order_by(app_dep.id).all()
+
     def get_latest_host_deployment(self, host_id, package_id=None, query=None):
         """
         Return latest host deployment of this application on host with ID
@@ -16,6 +16,8 @@
 
 import tagopsdb
 
+from sqlalchemy.orm import joinedload
+
 from .base import Base
 from .application import Application
 from .deploy_target import AppTarget
@@ -26,6 +28,95 @@ class Deployment(Base):
 
     delegate = tagopsdb.Deployment
 
+    @classmethod
+    def find_queued_for_environment(cls, environment_id, limit=None,
+                                    query=None):
+        """
+        Return queued deployments, oldest first, all of whose tier and host
+        deployments are in the environment with ID environment_id.
+        At most limit deployments are returned if it is given.
+        """
+        if query is None:
+            query = tagopsdb.Session.query(tagopsdb.model.Deployment)
+        query = query.filter(
+            tagopsdb.model.Deployment.status == 'queued',
+            ~tagopsdb.model.Deployment.app_deployments.any(
+                tagopsdb.model.AppDeployment.environment_id != environment_id
+            ),
+            ~tagopsdb.model.Deployment.host_deployments.any(
+                tagopsdb.model.HostDeployment.host.has(
+                    tagopsdb.model.Host.environment_id != environment_id
+                )
+            ),
+        ).order_by(tagopsdb.model.Deployment.declared)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return [cls(delegate=d) for d in query]
+
+    @classmethod
+    def next_queued_for_environment(cls, environment_id, query=None):
+        """
+        Return the oldest queued deployment all of whose tier and host
+        deployments are in the environment with ID environment_id, or None
+        if there is no such deployment.
+        """
+        deps = cls.find_queued_for_environment(
+            environment_id, limit=1, query=query
+        )
+
+        return deps[0] if deps else None
+
+    @staticmethod
+    def get_status(dep_id):
+        """
+        Return the status of the deployment with ID dep_id, reading just
+        that column.
+        """
+        return tagopsdb.Session.query(
+            tagopsdb.model.Deployment.status
+        ).filter(tagopsdb.model.Deployment.id == dep_id).scalar()
+
+    @staticmethod
+    def get_statuses(ids):
+        """
+        Return a dict mapping the IDs of the given deployments to their
+        status, with a single query.
+        """
+        if not ids:
+            return dict()
+
+        return dict(
+            tagopsdb.Session.query(
+                tagopsdb.model.Deployment.id, tagopsdb.model.Deployment.status
+            ).filter(tagopsdb.model.Deployment.id.in_(ids))
+        )
+
+    @staticmethod
+    def update_statuses(ids, status):
+        """
+        Set the status of the given deployments with a single UPDATE.
+        The session is not committed.
+        """
+        tagopsdb.Session.query(tagopsdb.model.Deployment).filter(
+            tagopsdb.model.Deployment.id.in_(ids)
+        ).update(dict(status=status), synchronize_session=False)
+
+    def claim(self, status='inprogress'):
+        """
+        Move this deployment from queued to the given status with a single
+        conditional UPDATE and commit.  Return True if this call made the
+        change, False if someone else already claimed the deployment.
+        """
+        rows = tagopsdb.Session.query(tagopsdb.model.Deployment).filter(
+            tagopsdb.model.Deployment.id == self.id,
+            tagopsdb.model.Deployment.status == 'queued',
+        ).update(dict(status=status), synchronize_session=False)
+        tagopsdb.Session.commit()
+
+        return rows == 1
+
 
 class AppDeployment(Deployment):
     """Model class for deployment of an application to a tier."""
@@ -61,6 +152,60 @@ class HostDeployment(Deployment):
 
     delegate = tagopsdb.HostDeployment
 
+    @classmethod
+    def find_for_deployment(cls, deployment_id):
+        """
+        Return all host deployments of the deployment with ID deployment_id,
+        with their hosts and packages loaded by the same query.
+        """
+        return [
+            cls(delegate=d) for d in
+            tagopsdb.Session.query(tagopsdb.model.HostDeployment).options(
+                joinedload(tagopsdb.model.HostDeployment.host),
+                joinedload(tagopsdb.model.HostDeployment.package),
+            ).filter(
+                tagopsdb.model.HostDeployment.deployment_id == deployment_id
+            )
+        ]
+
+    @staticmethod
+    def get_statuses_for_deployment(deployment_id):
+        """
+        Return the statuses of all host deployments of the deployment with
+        ID deployment_id, reading just that column.
+        """
+        return [
+            status for (status,) in tagopsdb.Session.query(
+                tagopsdb.model.HostDeployment.status
+            ).filter(
+                tagopsdb.model.HostDeployment.deployment_id == deployment_id
+            )
+        ]
+
+    @staticmethod
+    def update_statuses(ids, status):
+        """
+        Set the status of the given host deployments with a single UPDATE.
+        The session is not committed.
+        """
+        tagopsdb.Session.query(tagopsdb.model.HostDeployment).filter(
+            tagopsdb.model.HostDeployment.id.in_(ids)
+        ).update(dict(status=status), synchronize_session=False)
+
+    @staticmethod
+    def update_result(host_dep_id, status, duration, deploy_result):
+        """
+        Record the outcome of the host deployment with ID host_dep_id
+        without loading it.  The session is not committed.
+        """
+        tagopsdb.Session.query(tagopsdb.model.HostDeployment).filter(
+            tagopsdb.model.HostDeployment.id == host_dep_id
+        ).update(
+            dict(status=status, duration=duration,
+                 deploy_result=deploy_result),
+            synchronize_session=False
+        )
+
     @property
     def app_target(self):
         """
@@ -14,6 +14,8 @@
 
 """Model module for package object."""
 
+from sqlalchemy.orm import joinedload
+
 from .base import Base
 import tagopsdb
 
@@ -26,6 +28,29 @@ class Package(Base):
 
     delegate = tagopsdb.Package
 
+    @staticmethod
+    def find_pending():
+        """
+        Return the pending packages (the tagopsdb objects), with their
+        applications loaded in the same query.
+        """
+        return tagopsdb.Session.query(tagopsdb.Package).options(
+            joinedload(tagopsdb.Package.application)
+        ).filter(tagopsdb.Package.status == 'pending').all()
+
+    @staticmethod
+    def update_statuses(ids, status):
+        """
+        Set the status of the given packages with a single UPDATE.
+        The session is not committed.
+        """
+        if not ids:
+            return
+
+        tagopsdb.Session.query(tagopsdb.Package).filter(
+            tagopsdb.Package.id.in_(ids)
+        ).update(dict(status=status), synchronize_session=False)
+
     def check_app_deployments(self, tier, environment):
         """
         Check for an existing validated deployment for a given tier
@@ -18,20 +18,30 @@ Interacts with Zookeeper to get lock for grabbing queued deployments from DB.
 When it grabs the lock, it calls self.app.run().
 self.app is passed in during initialization and should be of type Installer,
 from tds.apps.installer.
+
+With 'installer_lock: deployment' in the configuration, there is no single
+leader: every daemon picks up deployments, taking a ZooKeeper lock per
+deployment ID under /tdsinstaller/deployments so that several daemons can
+run different deployments at once.
 """
 
+import errno
+import fcntl
 import logging
 import os
 import os.path
+import select
 import socket
 import signal
+import subprocess
 import sys
 import time
 import traceback
 
 from datetime import datetime, timedelta
 from kazoo.client import KazooClient, KazooState
-from kazoo.exceptions import CancelledError, ConnectionClosedError, LockTimeout
+from kazoo.exceptions import CancelledError, ConnectionClosedError, \
+    KazooException, LockTimeout, NoNodeError, NotEmptyError
 from kazoo.retry import KazooRetry
 
 import tagopsdb
@@ -39,6 +49,7 @@ import tds.apps
 import tds.exceptions
 import tds.model
 import tds.utils.processes
+import tds.utils.wakeup
 
 log = logging.getLogger('tds_installer')
 
@@ -57,6 +68,25 @@ class TDSInstallerDaemon:
         self.heartbeat_time = datetime.now()
         self.has_lock = False
         self.lock = None
+        self.zoo = None
+        self.wakeup = None
+        self.hostname = socket.gethostname()
+        self.sharded = False
+        # deployment_locks is a dict with deployment ID keys and the
+        # ZooKeeper lock held for the deployment as values, in sharded mode.
+        self.deployment_locks = dict()
+        # Pre-started installer worker processes, if configured: idle ones
+        # are waiting for a deployment ID, busy ones are also found in
+        # ongoing_processes, retired ones are exiting and need reaping.
+        self.worker_count = 0
+        self.workers = set()
+        self.idle_workers = []
+        self.retired_workers = []
+        self.worker_output = dict()
+        # Self-pipe written to on SIGCHLD, and the time at which the next
+        # ongoing process will time out.
+        self.child_events = None
+        self.next_deadline = None
 
     def should_stop(self):
         return self._should_stop
@@ -86,16 +116,37 @@ class TDSInstallerDaemon:
             seconds=self.app.config.get('deploy_exit_timeout', 5)
         )
         zookeeper_config = self.app.config.get('zookeeper', None)
+        lock_mode = self.app.config.get('installer_lock', 'global')
+
+        if lock_mode not in ('global', 'deployment'):
+            raise tds.exceptions.ConfigurationError(
+                'Invalid installer_lock mode %r', lock_mode
+            )
 
-        if zookeeper_config is not None:
+        if zookeeper_config is not None and lock_mode == 'deployment':
+            self.create_zoo(zookeeper_config)
+            self.sharded = True
+            self.zk_run = lambda f, *a, **k: f(*a, **k)
+        elif zookeeper_config is not None:
             self.lock = self.create_zoo(zookeeper_config)
             self.zk_run = self.lock_run
         else:
             self.zk_run = lambda f, *a, **k: f(*a, **k)
 
+        self.wakeup = tds.utils.wakeup.get_channel(
+            self.app.config, zoo=self.zoo
+        )
+
+        self.setup_child_events()
+
+        self.worker_count = int(self.app.config.get('installer_workers', 0))
+        for _ in range(self.worker_count):
+            self.release_worker(self.start_worker())
+
         while not self.should_stop():
+            found = False
             try:
-                self.zk_run(self.handle_incoming_deployments)
+                found = self.zk_run(self.handle_incoming_deployments)
             except ConnectionClosedError, TimeoutError:
                 if not self.should_stop():
                     # Ignore errors raised by kazoo when it is having
@@ -103,16 +154,25 @@ class TDSInstallerDaemon:
                     raise
 
             self.clean_up_processes(wait=self.should_stop())
-            time.sleep(0.1)     # Increase probability of other daemons running
+            self.reap_retired_workers()
+
+            if not found:
+                self.wait_for_deployments()
 
         self.clean_up_processes(wait=True)
-        self.zoo.close();
+        self.stop_workers()
+        self.wakeup.close()
+        if self.zoo is not None:
+            self.zoo.close()
         log.info("Stopped.")
 
     def handle_incoming_deployments(self):
         """Look for files in 'incoming' directory and handle them."""
         tagopsdb.Session.close()
-        deployment = self.app.find_deployment()
+        if self.sharded:
+            deployment = self.find_unlocked_deployment()
+        else:
+            deployment = self.app.find_deployment()
 
         # Heartbeat test to see if daemon is 'stuck'
         if (datetime.now() - self.heartbeat_time).seconds >= 900:
@@ -125,27 +185,378 @@ class TDSInstallerDaemon:
             ))
 
         if deployment is None:
-            return
+            return False
 
         log.info('Found deployment with ID %s', deployment.id)
-        deployment.status = 'inprogress'
-        tagopsdb.Session.commit()
-        installer_file_path = os.path.abspath(tds.apps.installer.__file__)
-        if installer_file_path.endswith('.pyc'):
-            installer_file_path = installer_file_path[:-1]
+        if not deployment.claim():
+            # Someone else got to it first; look again right away.
+            log.info('Deployment with ID %s already claimed', deployment.id)
+            self.release_deployment_lock(deployment.id)
+            return True
+
         try:
-            deployment_process = tds.utils.processes.start_process([
-                sys.executable,
-                installer_file_path,
-                deployment.id,
-            ])
+            deployment_process = self.start_deployment_process(deployment.id)
         except tds.exceptions.RunProcessError as exc:
             log.error('Exception: %r', exc.stderr)
+            self.release_deployment_lock(deployment.id)
         else:
             self.ongoing_processes[deployment.id] = (
                 deployment_process, datetime.now()
             )
 
+        return True
+
+    @staticmethod
+    def installer_command(*args):
+        """
+        Return the command line running tds.apps.installer with args.
+        """
+        installer_file_path = os.path.abspath(tds.apps.installer.__file__)
+        if installer_file_path.endswith('.pyc'):
+            installer_file_path = installer_file_path[:-1]
+
+        return [sys.executable, installer_file_path] + list(args)
+
+    def start_deployment_process(self, dep_id):
+        """
+        Start the deployment with ID dep_id, either in a new installer
+        process or on a worker, and return the process doing it.
+        """
+        if not self.worker_count:
+            return tds.utils.processes.start_process(
+                self.installer_command(dep_id)
+            )
+
+        while True:
+            worker = self.get_worker()
+            try:
+                worker.stdin.write('%d\n' % dep_id)
+                worker.stdin.flush()
+            except IOError as exc:
+                if exc.errno != errno.EPIPE:
+                    raise
+                # The worker died while idle; try another one.
+                log.warning('Installer worker %d is gone', worker.pid)
+                self.discard_worker(worker)
+            else:
+                log.debug('Deployment ID %s handed to worker %d',
+                          dep_id, worker.pid)
+                return worker
+
+    def start_worker(self):
+        """
+        Start a new installer worker process and return it.
+        """
+        # Workers live long, so do not collect their stderr in a pipe that
+        # nobody reads, and do not let them inherit other workers' pipes
+        # (which would keep those open after we close them).
+        worker = tds.utils.processes.start_process(
+            self.installer_command('--worker'), stdin=subprocess.PIPE,
+            stderr=None, close_fds=True
+        )
+        log.info('Started installer worker %d', worker.pid)
+        self.workers.add(worker)
+        self.worker_output[worker] = ''
+        return worker
+
+    def get_worker(self):
+        """
+        Return an idle worker, starting a new one if all of them are busy.
+        """
+        if self.idle_workers:
+            return self.idle_workers.pop()
+
+        return self.start_worker()
+
+    def release_worker(self, worker):
+        """
+        Put a worker that finished its deployment back in the idle pool,
+        or retire it if there are enough idle workers already.
+        """
+        if len(self.idle_workers) < self.worker_count:
+            self.idle_workers.append(worker)
+        else:
+            self.retire_worker(worker)
+
+    def retire_worker(self, worker):
+        """
+        Tell a worker to exit by closing its input; it is reaped later.
+        """
+        self.workers.discard(worker)
+        self.worker_output.pop(worker, None)
+        if not worker.stdin.closed:
+            try:
+                worker.stdin.close()
+            except IOError:
+                pass
+        self.retired_workers.append(worker)
+
+    def discard_worker(self, worker):
+        """
+        Forget about a worker whose process has exited (or is exiting).
+        """
+        if worker in self.idle_workers:
+            self.idle_workers.remove(worker)
+        self.retire_worker(worker)
+
+    def reap_retired_workers(self):
+        """
+        Reap retired workers that have exited.
+        """
+        for worker in self.retired_workers[:]:
+            try:
+                pid, _status = os.waitpid(worker.pid, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno != errno.ECHILD:
+                    raise
+                pid = worker.pid
+
+            if pid == worker.pid:
+                self.retired_workers.remove(worker)
+
+    def stop_workers(self):
+        """
+        Retire all idle workers and wait (up to deploy_exit_timeout) for
+        every retired worker to exit, killing any that do not.
+        """
+        while self.idle_workers:
+            self.retire_worker(self.idle_workers.pop())
+
+        give_up_time = datetime.now() + self.deploy_exit_timeout
+        while self.retired_workers and datetime.now() < give_up_time:
+            self.reap_retired_workers()
+            time.sleep(0.1)
+
+        for worker in self.retired_workers:
+            log.warning('Killing installer worker %d.', worker.pid)
+            worker.kill()
+        self.reap_retired_workers()
+
+    def worker_done(self, dep_id, worker):
+        """
+        Read any pending output from a busy worker without blocking and
+        return True if it reported the deployment with ID dep_id as done.
+        """
+        fd = worker.stdout.fileno()
+        while select.select([fd], [], [], 0)[0]:
+            data = os.read(fd, 4096)
+            if not data:
+                # EOF; the worker exited, which waitproc will notice.
+                break
+            self.worker_output[worker] += data
+
+        lines = self.worker_output[worker].split('\n')
+        self.worker_output[worker] = lines.pop()
+        done = 'done %s' % dep_id
+
+        # Anything else a deployment prints on stdout is ignored.
+        return done in (line.strip() for line in lines)
+
+    def process_finished(self, dep_id, proc):
+        """
+        Return True if the process running the deployment with ID dep_id
+        has finished it. A worker that finished is made available again;
+        one that exited is forgotten.
+        """
+        if proc in self.workers and self.worker_done(dep_id, proc):
+            log.debug('Worker %d finished deployment ID %d',
+                      proc.pid, dep_id)
+            self.release_worker(proc)
+            return True
+
+        if self.waitproc(dep_id=dep_id, proc=proc):
+            if proc in self.workers:
+                self.workers.discard(proc)
+                self.worker_output.pop(proc, None)
+            return True
+
+        return False
+
+    def deployment_lock_path(self, dep_id):
+        """
+        Return the ZooKeeper lock path for the deployment with ID dep_id.
+        """
+        return '/tdsinstaller/deployments/%s' % dep_id
+
+    def find_unlocked_deployment(self, candidates=5):
+        """
+        Return the oldest of the first few queued deployments for which a
+        per-deployment ZooKeeper lock could be taken without blocking, or
+        None. Other daemons will be holding the locks of the deployments
+        that are skipped.
+        The lock only keeps daemons from racing for the same deployment;
+        claiming it in the database is what guarantees it runs only once.
+        """
+        for deployment in self.app.find_deployments(limit=candidates):
+            if deployment.id in self.deployment_locks:
+                continue
+
+            lock = self.zoo.Lock(
+                self.deployment_lock_path(deployment.id), self.hostname
+            )
+
+            try:
+                acquired = lock.acquire(blocking=False)
+            except LockTimeout:
+                acquired = False
+
+            if acquired:
+                log.debug(
+                    'Acquired ZooKeeper lock for deployment ID %s',
+                    deployment.id
+                )
+                self.deployment_locks[deployment.id] = lock
+                return deployment
+
+        return None
+
+    def release_deployment_lock(self, dep_id):
+        """
+        Release the per-deployment lock for the deployment with ID dep_id,
+        if held, and remove its lock node.
+        """
+        lock = self.deployment_locks.pop(dep_id, None)
+        if lock is None:
+            return
+
+        try:
+            lock.release()
+            self.zoo.delete(self.deployment_lock_path(dep_id))
+        except (NoNodeError, NotEmptyError):
+            # Already gone, or another daemon is contending for it.
+            pass
+        except KazooException as exc:
+            # The lock node is ephemeral and goes away with our session.
+            log.debug(
+                'Unable to release lock for deployment ID %s: %r',
+                dep_id, exc
+            )
+
+    def wait_for_deployments(self):
+        """
+        Wait until new deployments may have been queued: either a wake-up
+        is published on the configured channel or the polling interval
+        expires.  While there are ongoing processes, also wake up as soon
+        as one of them finishes or the next one times out.
+        """
+        if not self.ongoing_processes:
+            self.wakeup.wait(interrupt=self.should_stop)
+            return
+
+        timeout = self.wakeup.interval
+        if self.next_deadline is not None:
+            timeout = min(
+                timeout,
+                (self.next_deadline - datetime.now()).total_seconds()
+            )
+
+        channel_fd = self.wakeup.fileno()
+        ready = self.wait_for_children(
+            timeout, [] if channel_fd is None else [channel_fd]
+        )
+
+        if channel_fd in ready:
+            self.wakeup.clear()
+
+    def setup_child_events(self):
+        """
+        Set up a SIGCHLD handler writing to a pipe, so that the daemon can
+        select() on child exits instead of polling for them.
+        """
+        self.child_events = os.pipe()
+        for fd in self.child_events:
+            fcntl.fcntl(fd, fcntl.F_SETFL,
+                        fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        signal.signal(signal.SIGCHLD, self.sigchld_handler)
+        # Restart other interrupted system calls (e.g. database I/O).
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+    def sigchld_handler(self, signum, frame):
+        """
+        Wake up wait_for_children().
+        """
+        try:
+            os.write(self.child_events[1], 'x')
+        except OSError as exc:
+            # The pipe is full, so a wake-up is pending anyway.
+            if exc.errno != errno.EAGAIN:
+                raise
+
+    def wait_for_children(self, timeout, fds=()):
+        """
+        Block until a child process exits, a busy worker reports back,
+        one of the other given file descriptors is readable, or timeout
+        seconds pass.  Return the list of readable descriptors.
+        """
+        timeout = max(timeout, 0)
+        if self.child_events is None:
+            # Old python does not provide timeouts for Popen methods.
+            time.sleep(timeout)
+            return []
+
+        fds = list(fds) + [self.child_events[0]] + [
+            proc.stdout.fileno()
+            for (proc, _start) in self.ongoing_processes.values()
+            if proc in self.workers
+        ]
+
+        try:
+            ready = select.select(fds, [], [], timeout)[0]
+        except select.error as exc:
+            if exc.args[0] != errno.EINTR:
+                raise
+            # Interrupted by a signal; let the caller look around.
+            return []
+
+        if self.child_events[0] in ready:
+            try:
+                while os.read(self.child_events[0], 4096):
+                    pass
+            except OSError as exc:
+                if exc.errno != errno.EAGAIN:
+                    raise
+
+        return ready
+
+    def reconcile_finished(self, dep_ids):
+        """
+        Verify the status of the deployments with the given IDs, whose
+        processes have finished, with one query, and mark any that did not
+        reach a final status as failed.
+        """
+        if not dep_ids:
+            return
+
+        # Start a new transaction to see what the children committed.
+        self.app.commit_session()
+        statuses = tds.model.Deployment.get_statuses(dep_ids)
+        unfinished = []
+
+        for dep_id in dep_ids:
+            status = statuses.get(dep_id)
+            log.debug(
+                'Deployment ID %d finished, status: %s.' % (dep_id, status)
+            )
+
+            if status not in ('complete', 'failed', 'stopped'):
+                # If it finished with a non-finished status, then
+                # something is wrong.
+                log.debug(
+                    'Deployment ID %d forcing status to "failed".' % (dep_id)
+                )
+                unfinished.append(dep_id)
+
+        if unfinished:
+            # Note: this only sets the top-level deployments table entry to
+            # 'failed'; if the child process crashes or is killed, then the
+            # host_deployments and app_deployments entries will remain
+            # 'inprogress'. This is probably a deficiency here, but on the
+            # other hand, code elsewhere needs to be able to handle that
+            # situation anyway, should e.g. the entire host crash.
+            tds.model.Deployment.update_statuses(unfinished, 'failed')
+            self.app.commit_session()
+
     def clean_up_processes(self, wait=False):
         """
         Check processes that have finished, terminate stalled processes, and
@@ -158,6 +569,8 @@ class TDSInstallerDaemon:
         killed = {}
         while True:
             now = datetime.now()
+            finished = []
+            deadlines = []
             for dep_id in self.ongoing_processes.keys():
                 (proc, process_start) = self.ongoing_processes[dep_id];
                 term_time = process_start + self.threshold
@@ -186,39 +599,29 @@ class TDSInstallerDaemon:
                     proc.terminate()
                     terminated[proc] = now
 
-                # 3. Check for processes that have exited and verify status.
-                if self.waitproc(dep_id=dep_id, proc=proc):
-                    dep = self.app.get_deployment(dep_id=dep_id)
-                    self.app._refresh(dep)
-                    log.debug(
-                        'Deployment ID %d finished, status: %s.' % \
-                            (dep_id, dep.status)
-                    )
-
-                    if dep.status not in ('complete', 'failed', 'stopped'):
-                        # If it finished with a non-finished status, then
-                        # something is wrong.
-                        log.debug(
-                            'Deployment ID %d forcing status to "failed".' % \
-                                (dep_id)
-                        )
-                        # Note: this only sets the top-level deployments table
-                        # entry to 'failed'; if the child process crashes or is
-                        # killed, then the host_deployments and app_deployments
-                        # entries will remain 'inprogress'. This is probably a
-                        # deficiency here, but on the other hand, code
-                        # elsewhere needs to be able to handle that situation
-                        # anyway, should e.g. the entire host crash.
-                        dep.status = 'failed'
-                        self.app.commit_session()
+                # 3. Check for processes that have exited (or workers that
+                # are done with their deployment); their status is verified
+                # below.
+                if self.process_finished(dep_id=dep_id, proc=proc):
+                    finished.append(dep_id)
 
                     del self.ongoing_processes[dep_id]
+                    self.release_deployment_lock(dep_id)
 
                     if proc in terminated:
                         del(terminated[proc])
 
                     if proc in killed:
                         del(killed[proc])
+                elif proc not in terminated:
+                    deadlines.append(term_time)
+                elif proc not in killed:
+                    deadlines.append(
+                        terminated[proc] + self.deploy_exit_timeout
+                    )
+
+            self.reconcile_finished(finished)
+            self.next_deadline = min(deadlines) if deadlines else None
 
             # If we signalled any processes, then we generally want to keep
             # looping in order to not lose track of them. Only give up if we
@@ -236,15 +639,20 @@ class TDSInstallerDaemon:
             time_left = give_up_time - now
             seconds_left = time_left.total_seconds()
             log.debug('Waiting %.1fs for children to finish.' % (seconds_left))
-            # Old python does not provide timeouts for Popen methods.
-            time.sleep(1)
+
+            # Wake up when a child exits or the next deadline passes; the
+            # cap is only a safety net.
+            deadlines.append(datetime.now() + timedelta(seconds=5))
+            if wait:
+                deadlines.append(give_up_time)
+            self.wait_for_children(
+                (min(deadlines) - datetime.now()).total_seconds()
+            )
 
     def create_zoo(self, zoo_config):
         """
         Create and return a new zoo.
         """
-        hostname = socket.gethostname()
-
         # Set up our own KazooRetry classes in order to override default
         # parameters.
         command_retry = KazooRetry(
@@ -286,17 +694,23 @@ class TDSInstallerDaemon:
                     # the lock, since it is probably invalid.
                     self.release_lock()
 
+                    if state == KazooState.LOST:
+                        # Per-deployment locks went away with the session;
+                        # the running deployments stay claimed in the
+                        # database.
+                        self.deployment_locks.clear()
+
         self.zoo.add_listener(state_listener)
         self.zoo.start()
-        return self.zoo.Lock('/tdsinstaller', hostname)
+        return self.zoo.Lock('/tdsinstaller', self.hostname)
 
     def lock_run(self, func, *args, **kwargs):
         """
         Run the specified function, with the specified arguments, under a
-        zookeeper lock. This will block until the lock is acquired or
-        shutdown is initiated. Once done, the lock is not released, such that
-        it may be re-used by subsequent runs. Lock release is handled
-        elsewhere:
+        zookeeper lock, and return its result. This will block until the
+        lock is acquired or shutdown is initiated. Once done, the lock is not
+        released, such that it may be re-used by subsequent runs. Lock
+        release is handled elsewhere:
         1. During shutdown.
         2. When there is zookeeper connection trouble, which likely just
            updates client state, since zookeeper will automatically remove the
@@ -327,7 +741,7 @@ class TDSInstallerDaemon:
         # the supplied function, or we are in shutdown (see loop conditions
         # above).
         if self.has_lock:
-            func(*args, **kwargs)
+            return func(*args, **kwargs)
         elif self.should_stop():
             log.debug("Aborted acquiring ZooKeeper lock due to shutdown")
 
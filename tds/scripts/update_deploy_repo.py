@@ -27,6 +27,7 @@ from kazoo.client import KazooClient   # , KazooState
 from simpledaemon import Daemon
 
 import tds.apps
+import tds.utils.wakeup
 
 log = logging.getLogger('update_deploy_repo')
 
@@ -36,6 +37,8 @@ class UpdateDeployRepoDaemon(Daemon):
 
     should_stop = False
     election = None
+    zoo = None
+    wakeup = None
 
     def __init__(self, app, *args, **kwargs):
         """
@@ -70,7 +73,14 @@ class UpdateDeployRepoDaemon(Daemon):
         else:
             run = lambda f, *a, **k: f(*a, **k)
 
-        run(self.process_incoming_directory)
+        self.wakeup = tds.utils.wakeup.get_channel(
+            self.app.config, zoo=self.zoo, path=tds.utils.wakeup.REPO_PATH
+        )
+
+        try:
+            run(self.process_incoming_directory)
+        finally:
+            self.wakeup.close()
 
     def process_incoming_directory(self):
         """Look for files in 'incoming' directory and handle them."""
@@ -79,20 +89,39 @@ class UpdateDeployRepoDaemon(Daemon):
 
         while not self.should_stop:
             self.app.run()
-            time.sleep(1.0)
+            self.wait_for_packages()
 
+        # Don't leave packages waiting for the batching window behind
+        self.app.publish(force=True)
         log.info("Stopped.")
 
-    @staticmethod
-    def create_zoo(zoo_config):
+    def wait_for_packages(self):
+        """
+        Wait until packages may have been added: either a wake-up is
+        published on the configured channel or its polling interval
+        expires.  Wake up earlier if waiting packages are due to be
+        published.  Without a wake-up channel, just poll every second.
+        """
+        if self.wakeup.fileno() is None:
+            time.sleep(1.0)
+            return
+
+        timeout = self.wakeup.interval
+        deadline = self.app.publish_deadline
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.time(), 0))
+
+        self.wakeup.wait(timeout, interrupt=lambda: self.should_stop)
+
+    def create_zoo(self, zoo_config):
         """
-        Create and return a new zoo.
+        Create and return a new election, keeping its client in self.zoo.
         """
         hostname = socket.gethostname()
 
-        zoo = KazooClient('hosts=%s' % ','.join(zoo_config))
-        zoo.start()
-        return zoo.Election('/deployrepo', hostname)
+        self.zoo = KazooClient('hosts=%s' % ','.join(zoo_config))
+        self.zoo.start()
+        return self.zoo.Election('/deployrepo', hostname)
 
     def run(self):
         """A wrapper for the main process to ensure any unhandled
@@ -14,10 +14,13 @@
 
 """Common utility methods for the TDS application"""
 
+from . import artifact_store
 from . import config
+from . import jenkins
 from .debug import debug
 from .processes import run
 from . import merge
 from . import rpm
 
-__all__ = ['config', 'debug', 'merge', 'rpm', 'run']
+__all__ = ['artifact_store', 'config', 'debug', 'jenkins', 'merge', 'rpm',
+           'run']
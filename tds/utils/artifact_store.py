@@ -0,0 +1,258 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content-addressed store for downloaded artifacts.
+
+Files are kept under their MD5 hex digest and handed out as hard links,
+so the store must be on the same file system as the directories the
+files are linked into.  The store is trimmed to a maximum size by
+removing the least recently used files.  Use is recorded on a separate,
+empty '.used' file next to each file, so the files themselves (which are
+linked into the repository) keep their modification times.  Files still
+linked from elsewhere are not counted against the size and are not
+removed, since removing them would not free any space; they are checked
+again every LINKED_CHECK_INTERVAL seconds, or on an explicit evict().
+"""
+
+import errno
+import logging
+import os
+import os.path
+import threading
+import time
+import uuid
+
+log = logging.getLogger('tds.utils.artifact_store')
+
+USED_SUFFIX = '.used'
+
+# Seconds between checks whether files linked from elsewhere were released
+LINKED_CHECK_INTERVAL = 3600
+
+
+class ArtifactStore(object):
+    """
+    Content-addressed file store with size-based LRU eviction.
+    Instances may be shared between threads.
+    """
+
+    def __init__(self, path, max_size):
+        """Initialize object."""
+        self.path = path
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # Map digests to (last use, size) for files that may be evicted,
+        # whose sizes add up to total, and for files still linked from
+        # elsewhere; loaded on first use
+        self.index = None
+        self.linked = None
+        self.total = 0
+        self.linked_checked = None
+
+    def blob_path(self, digest):
+        """Return the path of the file for the given digest."""
+        digest = digest.lower()
+        return os.path.join(self.path, digest[:2], digest)
+
+    @staticmethod
+    def _replace_link(src, dest):
+        """Atomically make dest a hard link to src."""
+        tmp = '%s.%s.tmp' % (dest, uuid.uuid4().hex)
+        os.link(src, tmp)
+
+        try:
+            os.rename(tmp, dest)
+        except OSError:
+            os.unlink(tmp)
+            raise
+
+    def _load_index(self):
+        """
+        Build the index of the files in the store, once.
+        Must be called with the lock held.
+        """
+        if self.index is not None:
+            return
+
+        self.index = dict()
+        self.linked = dict()
+        self.total = 0
+        self.linked_checked = time.time()
+        for dirpath, _dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.endswith(USED_SUFFIX) or \
+                        filename.endswith('.tmp'):
+                    continue
+
+                blob = os.path.join(dirpath, filename)
+                try:
+                    blob_stat = os.stat(blob)
+                except OSError:
+                    continue
+
+                try:
+                    used = os.stat(blob + USED_SUFFIX).st_mtime
+                except OSError:
+                    used = 0
+
+                if blob_stat.st_nlink > 1:
+                    self.linked[filename] = (used, blob_stat.st_size)
+                else:
+                    self.index[filename] = (used, blob_stat.st_size)
+                    self.total += blob_stat.st_size
+
+    def _check_linked(self):
+        """
+        Count files which are no longer linked from elsewhere against the
+        size again, and forget files which are gone.
+        Must be called with the lock held.
+        """
+        self.linked_checked = time.time()
+
+        for digest, entry in self.linked.items():
+            try:
+                linked = os.stat(self.blob_path(digest)).st_nlink > 1
+            except OSError:
+                del self.linked[digest]
+                continue
+
+            if not linked:
+                del self.linked[digest]
+                self.index[digest] = entry
+                self.total += entry[1]
+
+    def _mark_used(self, digest, size):
+        """
+        Record that the file for digest was used now.
+        Must be called with the lock held.
+        """
+        stamp = self.blob_path(digest) + USED_SUFFIX
+
+        try:
+            with open(stamp, 'a'):
+                os.utime(stamp, None)
+            used = os.stat(stamp).st_mtime
+        except (IOError, OSError) as exc:
+            log.warning('Unable to record use of %s: %s', digest, exc)
+            used = 0
+
+        # Counted until eviction finds it linked from elsewhere
+        self.linked.pop(digest, None)
+        old = self.index.get(digest, None)
+        if old is not None:
+            self.total -= old[1]
+        self.index[digest] = (used, size)
+        self.total += size
+
+    def fetch(self, digest, dest):
+        """
+        Link the file with the given digest to dest.
+        Return False if it is not in the store (or can not be linked).
+        """
+        digest = digest.lower()
+        blob = self.blob_path(digest)
+
+        with self.lock:
+            self._load_index()
+
+            try:
+                self._replace_link(blob, dest)
+                size = os.stat(blob).st_size
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    log.warning('Unable to link %s to %s: %s',
+                                blob, dest, exc)
+                return False
+
+            self._mark_used(digest, size)
+
+        log.debug('Found %s in artifact store', digest)
+        return True
+
+    def add(self, digest, path):
+        """
+        Add the file at path (which must have the given digest) to the
+        store, then evict old files if the store is over its size.
+        """
+        digest = digest.lower()
+        blob = self.blob_path(digest)
+
+        with self.lock:
+            self._load_index()
+
+            try:
+                if not os.path.isdir(os.path.dirname(blob)):
+                    os.makedirs(os.path.dirname(blob))
+                self._replace_link(path, blob)
+                size = os.stat(blob).st_size
+            except OSError as exc:
+                log.warning('Unable to add %s to artifact store: %s',
+                            path, exc)
+                return
+
+            self._mark_used(digest, size)
+
+            if time.time() - self.linked_checked >= LINKED_CHECK_INTERVAL:
+                self._check_linked()
+
+            if self.total > self.max_size:
+                self._evict()
+
+    def evict(self):
+        """Remove least recently used files until the store fits."""
+        with self.lock:
+            self._load_index()
+            self._check_linked()
+            self._evict()
+
+    def _evict(self):
+        """
+        Remove least recently used files until the store fits.  Files that
+        are still linked from elsewhere are set aside instead, and no longer
+        counted against the size.
+        Must be called with the lock held.
+        """
+        for (_used, size), digest in sorted(
+            (entry, digest) for digest, entry in self.index.iteritems()
+        ):
+            if self.total <= self.max_size:
+                break
+
+            blob = self.blob_path(digest)
+            try:
+                linked = os.stat(blob).st_nlink > 1
+            except OSError:
+                linked = False
+
+            if linked:
+                self.linked[digest] = self.index.pop(digest)
+                self.total -= size
+                continue
+
+            log.debug('Evicting %s from artifact store', blob)
+            try:
+                os.unlink(blob)
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    log.warning('Unable to evict %s: %s', blob, exc)
+                    continue
+
+            try:
+                os.unlink(blob + USED_SUFFIX)
+            except OSError:
+                pass
+
+            del self.index[digest]
+            self.total -= size
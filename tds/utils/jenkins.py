@@ -0,0 +1,267 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Access to Jenkins build and artifact metadata.
+
+Unlike jenkinsapi, which crawls the server's whole job list on startup and
+fetches complete objects, JenkinsClient keeps an HTTP session per thread,
+asks the JSON API for just the fields TDS uses (with 'tree=' projections),
+and caches the metadata of finished builds, keyed by (job, build number).
+"""
+
+import collections
+import logging
+import posixpath
+import threading
+import time
+import urllib
+
+import requests
+import requests.exceptions
+
+import tds.exceptions
+
+log = logging.getLogger('tds.utils.jenkins')
+
+# Fields requested for builds (and matrix runs)
+BUILD_TREE = ','.join([
+    'number',
+    'url',
+    'building',
+    'artifacts[fileName,relativePath]',
+    'fingerprint[fileName,hash]',
+    'runs[number,url]',
+    'actions[lastBuiltRevision[SHA1],mercurialNodeName]',
+    'changeSet[kind,revisions[revision]]',
+])
+
+
+class JenkinsClient(object):
+    """
+    Client for the Jenkins JSON API with a TTL/LRU cache of build metadata.
+    Instances may be shared between threads; the cache is shared, but each
+    thread gets its own requests.Session, which is not thread-safe.
+    """
+
+    def __init__(self, url, ttl=600, max_entries=256, timeout=30):
+        """Initialize object."""
+        self.url = url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """
+        Return the HTTP session of the current thread, creating it if needed.
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+
+        return session
+
+    def _get_json(self, url, tree):
+        """
+        Return the JSON data at url restricted to tree, or None if there is
+        nothing at url.
+        """
+        try:
+            req = self.session.get(url, params=dict(tree=tree),
+                                   timeout=self.timeout)
+        except requests.exceptions.RequestException as exc:
+            log.debug('Request for %s failed: %s', url, exc)
+            raise tds.exceptions.FailedConnectionError(
+                'Unable to contact Jenkins server at {url}.'.format(
+                    url=self.url,
+                )
+            )
+
+        if req.status_code == requests.codes.not_found:
+            return None
+
+        try:
+            req.raise_for_status()
+            return req.json()
+        except (requests.exceptions.HTTPError, ValueError) as exc:
+            log.debug('Bad response for %s: %s', url, exc)
+            raise tds.exceptions.FailedConnectionError(
+                'Unable to contact Jenkins server at {url}.'.format(
+                    url=self.url,
+                )
+            )
+
+    def _api_url(self, *path):
+        """Return the JSON API URL of the given path on the server."""
+        return '/'.join(
+            [self.url.rstrip('/')] +
+            [urllib.quote(str(part)) for part in path] +
+            ['api', 'json']
+        )
+
+    def _cache_get(self, key):
+        """Return the unexpired cache entry for key, or None."""
+        with self.lock:
+            entry = self.cache.pop(key, None)
+
+            if entry is None or entry[0] < time.time():
+                return None
+
+            # Reinsert to mark it as most recently used
+            self.cache[key] = entry
+            return entry[1]
+
+    def _cache_put(self, key, value):
+        """Cache value for key, evicting the least recently used entries."""
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = (time.time() + self.ttl, value)
+
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def check_connection(self):
+        """Raise FailedConnectionError if the server can not be reached."""
+        self._get_json(self._api_url(), 'mode')
+
+    def job_exists(self, job_name):
+        """Return True if the given job exists."""
+        return self._get_json(self._api_url('job', job_name), 'name') \
+            is not None
+
+    def get_build(self, job, number):
+        """
+        Return the metadata of the given build (as a dict with the fields
+        in BUILD_TREE).  A job of the form 'job/matrix' selects the run of
+        the matrix build whose URL contains 'matrix'.
+        Raise JenkinsJobNotFoundError if the job, build or run is missing.
+        """
+        number = int(number)
+        key = (job, number)
+        build = self._cache_get(key)
+
+        if build is not None:
+            return build
+
+        job_name, _sep, matrix_name = job.partition('/')
+        build = self._get_json(self._api_url('job', job_name, number),
+                               BUILD_TREE)
+
+        if build is None:
+            raise tds.exceptions.JenkinsJobNotFoundError(
+                'Build' if self.job_exists(job_name) else 'Job',
+                job_name, number, self.url,
+            )
+
+        if matrix_name:
+            for run in build.get('runs') or []:
+                if run['number'] == number and matrix_name in run['url']:
+                    break
+            else:
+                raise tds.exceptions.JenkinsJobNotFoundError(
+                    'Matrix build', job_name, number, self.url,
+                )
+
+            building = build.get('building')
+            build = self._get_json(
+                '%s/api/json' % run['url'].rstrip('/'), BUILD_TREE
+            )
+
+            if build is None:
+                raise tds.exceptions.JenkinsJobNotFoundError(
+                    'Matrix build', job_name, number, self.url,
+                )
+
+            build['building'] = building or build.get('building')
+
+        if not build.get('url'):
+            build['url'] = '%s/job/%s/%d/' % (
+                self.url.rstrip('/'), job_name, number
+            )
+
+        # Running builds may still gain artifacts; only cache finished ones
+        if not build.get('building'):
+            self._cache_put(key, build)
+
+        return build
+
+    def get_artifact_url(self, job, number, filename):
+        """
+        Return the URL of the artifact with the given file name in the
+        given build.  Raise JenkinsJobNotFoundError if it does not exist.
+        """
+        build = self.get_build(job, number)
+
+        for artifact in build.get('artifacts') or []:
+            if artifact['fileName'] == filename:
+                return '%s/artifact/%s' % (
+                    build['url'].rstrip('/'),
+                    urllib.quote(artifact['relativePath'])
+                )
+
+        raise tds.exceptions.JenkinsJobNotFoundError(
+            'Artifact', job.partition('/')[0], number, self.url,
+        )
+
+    def get_fingerprints(self, job, number):
+        """
+        Return a dict mapping the names of the fingerprinted files of the
+        given build to their MD5 hashes.  It is empty if fingerprinting is
+        not enabled for the job.
+        """
+        build = self.get_build(job, number)
+
+        return dict(
+            (posixpath.basename(fingerprint['fileName']), fingerprint['hash'])
+            for fingerprint in build.get('fingerprint') or []
+        )
+
+    def get_fingerprint_md5(self, job, number, filename):
+        """
+        Return the fingerprint MD5 of the file with the given name in the
+        given build, or None if it was not fingerprinted.
+        """
+        return self.get_fingerprints(job, number).get(filename)
+
+    def get_revision(self, job, number):
+        """
+        Return the VCS revision (e.g., git commit hash) the given build was
+        made from, or None if it is unknown.
+        """
+        build = self.get_build(job, number)
+        change_set = build.get('changeSet') or {}
+        kind = change_set.get('kind') or 'git'
+        actions = [action for action in build.get('actions') or [] if action]
+
+        if kind == 'git':
+            for action in actions:
+                if 'lastBuiltRevision' in action:
+                    return action['lastBuiltRevision']['SHA1']
+        elif kind == 'hg':
+            for action in actions:
+                if 'mercurialNodeName' in action:
+                    return action['mercurialNodeName']
+        elif kind == 'svn':
+            revisions = [
+                path_set['revision']
+                for path_set in change_set.get('revisions') or []
+            ]
+            if revisions:
+                return max(revisions)
+
+        return None
@@ -46,8 +46,9 @@ def start_process(cmd, shell=False, **kwds):
 
     try:
         start = time.time()
-        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE, shell=shell, **kwds)
+        kwds.setdefault('stdout', subprocess.PIPE)
+        kwds.setdefault('stderr', subprocess.PIPE)
+        proc = subprocess.Popen(args, shell=shell, **kwds)
         proc.cmd = args
         proc.start_time = start
     except OSError as e:
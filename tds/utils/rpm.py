@@ -15,7 +15,9 @@
 """Classes for working with RPMs."""
 
 import logging
+import mmap
 import os.path
+import struct
 
 import tds.exceptions
 
@@ -55,6 +57,124 @@ class RPMQueryProvider(object):
             )
 
 
+class RPMHeaderProvider(object):
+    """
+    Provider reading the data of an RPM file directly from its header,
+    without running the rpm command.
+    """
+
+    lead_size = 96
+    lead_magic = '\xed\xab\xee\xdb'
+    header_magic = '\x8e\xad\xe8\x01'
+
+    # Header tags for the supported query fields
+    tags = dict(
+        name=1000,
+        version=1001,
+        release=1002,
+        epoch=1003,
+        summary=1004,
+        arch=1022,
+    )
+
+    # Header entry types
+    int32_type = 4
+    string_types = (6, 8, 9)   # STRING, STRING_ARRAY, I18NSTRING
+
+    @classmethod
+    def _read_header(cls, data, offset):
+        """
+        Return the index entries of the header at offset in data, keyed by
+        tag, the offset of its data store, and the offset of its end.
+        """
+        if data[offset:offset + 4] != cls.header_magic:
+            raise ValueError('bad header magic at offset %d' % offset)
+
+        num_entries, store_size = struct.unpack(
+            '>II', data[offset + 8:offset + 16]
+        )
+        index_start = offset + 16
+        store_start = index_start + num_entries * 16
+
+        entries = dict()
+        for idx in range(num_entries):
+            start = index_start + idx * 16
+            tag, tag_type, tag_offset, count = struct.unpack(
+                '>IIII', data[start:start + 16]
+            )
+            entries[tag] = (tag_type, tag_offset, count)
+
+        return entries, store_start, store_start + store_size
+
+    @classmethod
+    def _tag_value(cls, data, store_start, entry):
+        """Decode the (first) value of the given header entry."""
+        tag_type, tag_offset, _count = entry
+        start = store_start + tag_offset
+
+        if tag_type in cls.string_types:
+            end = data.find('\0', start)
+            if end < 0:
+                raise ValueError('unterminated string at offset %d' % start)
+            return data[start:end]
+        elif tag_type == cls.int32_type:
+            return str(struct.unpack('>I', data[start:start + 4])[0])
+
+        raise ValueError('unsupported header entry type %d' % tag_type)
+
+    @classmethod
+    def query(cls, filename, fields):
+        """
+        Query for given fields from file filename, assuming it's a valid RPM.
+        Like 'rpm -q', return '(none)' for fields the RPM has no value for.
+        """
+        unknown = [field for field in fields if field not in cls.tags]
+        if unknown:
+            log.error('Unsupported RPM query fields: %s', ', '.join(unknown))
+            return None
+
+        try:
+            with open(filename, 'rb') as rpm_file:
+                data = mmap.mmap(rpm_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+
+            try:
+                if data[:4] != cls.lead_magic:
+                    raise ValueError('bad lead magic')
+
+                # The signature header is padded to a multiple of 8 bytes
+                _sig_entries, _sig_store, sig_end = cls._read_header(
+                    data, cls.lead_size
+                )
+                entries, store_start, _end = cls._read_header(
+                    data, sig_end + (-sig_end % 8)
+                )
+
+                values = list()
+                for field in fields:
+                    entry = entries.get(cls.tags[field])
+                    if entry is None:
+                        values.append('(none)')
+                    else:
+                        values.append(
+                            cls._tag_value(data, store_start, entry)
+                        )
+            finally:
+                data.close()
+        except (EnvironmentError, ValueError, struct.error) as exc:
+            log.error('Unable to read RPM header of %s: %s', filename, exc)
+
+            return None
+
+        return zip(fields, values)
+
+
+QUERY_PROVIDERS = dict(
+    rpm=RPMQueryProvider,
+    header=RPMHeaderProvider,
+)
+
+
 class RPMDescriptor(object):
     """
     Descriptor for an RPM.
@@ -109,11 +229,12 @@ class RPMDescriptor(object):
         return self_info
 
     @classmethod
-    def from_path(cls, path):
+    def from_path(cls, path, provider=RPMQueryProvider):
         """
-        Build a new RPM descriptor from the given path.
+        Build a new RPM descriptor from the given path, reading the RPM's
+        data with the given provider.
         """
-        info = RPMQueryProvider.query(path, RPMDescriptor.query_fields)
+        info = provider.query(path, RPMDescriptor.query_fields)
         if info is None:
             return None
         return cls(path, **dict(info))
@@ -0,0 +1,353 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Wake-up channels used to tell daemons there is new work for them.
+
+Publishers (the CLI and the REST API) call publish() after queueing
+work; the daemon calls wait() on the same channel between passes instead
+of polling the database continuously.  The channel is selected with the
+'queue_wakeup' section of deploy.yml:
+
+    queue_wakeup:
+      channel: zookeeper
+      poll_interval: 30
+
+Without that section the 'poll' channel is used, which publishes nothing
+and simply sleeps, keeping the daemons' original polling behavior.
+
+Besides queued deployments (INSTALLER_PATH), the same channel type is used
+to tell running installers that a deployment was canceled (CANCEL_PATH),
+and the repo updater that packages are pending (REPO_PATH).
+
+publish() runs in the request path of the CLI and the REST API, so it
+shares one ZooKeeper client per process, gives up connecting after
+'publish_timeout' seconds (half a second by default) and then does not
+try again for PUBLISH_RETRY_INTERVAL seconds.  By default it does not
+wait for the write to complete, which suits the long-lived REST process;
+the CLI, which exits right afterward, passes block=True to wait for the
+write for up to 'publish_timeout' seconds as well.
+"""
+
+import errno
+import fcntl
+import logging
+import os
+import select
+import threading
+import time
+
+from kazoo.client import KazooClient
+
+import tds.exceptions
+
+log = logging.getLogger('tds.utils.wakeup')
+
+INSTALLER_PATH = '/tdsinstaller-queue'
+CANCEL_PATH = '/tdsinstaller-cancel'
+REPO_PATH = '/deployrepo-queue'
+
+# Seconds to wait before trying to connect the publishing client again
+PUBLISH_RETRY_INTERVAL = 30
+
+
+class PollingChannel(object):
+    """Channel that never wakes anyone up; waiters just sleep."""
+
+    def __init__(self, poll_interval=0.1, **_kwargs):
+        """Initialize object."""
+        self.interval = poll_interval
+
+    def publish(self, block=True, timeout=None):
+        """Nothing to do; waiters will notice new work on their own."""
+        pass
+
+    def wait(self, timeout=None, interrupt=None):
+        """
+        Sleep for the polling interval (or timeout, if shorter).
+        Return False, as nothing can wake us up earlier.
+        """
+        if timeout is None:
+            timeout = self.interval
+
+        time.sleep(min(timeout, self.interval))
+        return False
+
+    def fileno(self):
+        """There is nothing to select() on."""
+        return None
+
+    def clear(self):
+        """Nothing to clear."""
+        pass
+
+    def close(self):
+        """Nothing to clean up."""
+        pass
+
+
+class ZooKeeperChannel(object):
+    """
+    Channel backed by a ZooKeeper znode: publishing writes the node, and
+    waiters hold a data watch on it.  The watch writes to a pipe, so that
+    waiters can also select() on the channel together with other events.
+    """
+
+    def __init__(self, zoo, path=INSTALLER_PATH, poll_interval=30,
+                 own_client=False, **_kwargs):
+        """Initialize object."""
+        self.zoo = zoo
+        self.path = path
+        self.interval = poll_interval
+        self.own_client = own_client
+        self.pipe = None
+
+    def publish(self, block=True, timeout=None):
+        """
+        Touch the znode, waking up anyone watching it.  If block, wait for
+        the write, for at most timeout seconds if given.  Otherwise, the
+        write is only started.  Failures of a write which is not waited for
+        without a timeout are logged.
+        """
+        data = str(time.time())
+
+        if block and timeout is None:
+            self.zoo.ensure_path(self.path)
+            self.zoo.set(self.path, data)
+            return
+
+        done = threading.Event()
+
+        def check_set(result):
+            """Log a failed write."""
+            try:
+                result.get()
+            except Exception as exc:
+                log.warning('Unable to publish queue wake-up: %r', exc)
+            finally:
+                done.set()
+
+        def set_data(result):
+            """Write the znode once it is known to exist."""
+            try:
+                result.get()
+                self.zoo.set_async(self.path, data).rawlink(check_set)
+            except Exception as exc:
+                log.warning('Unable to publish queue wake-up: %r', exc)
+                done.set()
+
+        self.zoo.ensure_path_async(self.path).rawlink(set_data)
+
+        if block and not done.wait(timeout):
+            log.warning('Timed out publishing queue wake-up to %s',
+                        self.path)
+
+    def _watch(self, _data, _stat):
+        """DataWatch callback; wake up the waiter."""
+        if self.pipe is None:
+            # Closed; returning False removes the watch.
+            return False
+
+        try:
+            os.write(self.pipe[1], 'x')
+        except OSError as exc:
+            # The pipe is full, so a wake-up is pending anyway.
+            if exc.errno != errno.EAGAIN:
+                raise
+
+    def fileno(self):
+        """
+        Return a file descriptor which becomes readable when the znode
+        changes, setting up the watch if needed.  The watch fires once on
+        registration, so the first wait returns immediately; that is
+        harmless, the caller just checks for work once more.
+        """
+        if self.pipe is None:
+            self.pipe = os.pipe()
+            for fd in self.pipe:
+                fcntl.fcntl(fd, fcntl.F_SETFL,
+                            fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            self.zoo.DataWatch(self.path, self._watch)
+
+        return self.pipe[0]
+
+    def clear(self):
+        """Consume pending wake-ups; return True if there were any."""
+        woken = False
+        try:
+            while os.read(self.fileno(), 4096):
+                woken = True
+        except OSError as exc:
+            if exc.errno != errno.EAGAIN:
+                raise
+
+        return woken
+
+    def wait(self, timeout=None, interrupt=None):
+        """
+        Block until the znode changes or timeout (by default, the polling
+        interval) expires, checking the interrupt callable every half
+        second.  Return True if woken up by a publish.
+        """
+        fd = self.fileno()
+
+        if timeout is None:
+            timeout = self.interval
+
+        end = time.time() + timeout
+
+        while True:
+            remaining = end - time.time()
+
+            if remaining <= 0 or (interrupt is not None and interrupt()):
+                return False
+
+            try:
+                ready = select.select([fd], [], [], min(remaining, 0.5))[0]
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:
+                    raise
+                continue
+
+            if ready and self.clear():
+                return True
+
+    def close(self):
+        """Stop the ZooKeeper client if it was created for this channel."""
+        if self.own_client:
+            self.zoo.stop()
+            self.zoo.close()
+
+        if self.pipe is not None:
+            for fd in self.pipe:
+                os.close(fd)
+            self.pipe = None
+
+
+CHANNELS = dict(
+    poll=PollingChannel,
+    zookeeper=ZooKeeperChannel,
+)
+
+
+def get_channel(config, zoo=None, **kwargs):
+    """
+    Return the wake-up channel configured in config.  An existing
+    KazooClient may be passed in to be shared; otherwise one is created
+    (and owned by the channel) from the 'zookeeper' host list.
+    """
+    wakeup_config = dict(config.get('queue_wakeup', None) or {})
+    name = wakeup_config.pop('channel', 'poll')
+
+    if name not in CHANNELS:
+        raise tds.exceptions.ConfigurationError(
+            'Unknown queue wake-up channel %r', name
+        )
+
+    wakeup_config.update(kwargs)
+
+    if name == 'zookeeper' and zoo is None:
+        zookeeper_config = config.get('zookeeper', None)
+
+        if zookeeper_config is None:
+            raise tds.exceptions.ConfigurationError(
+                'The zookeeper queue wake-up channel requires a '
+                '"zookeeper" host list'
+            )
+
+        zoo = KazooClient(hosts=','.join(zookeeper_config), timeout=3)
+        zoo.start(timeout=3)
+        wakeup_config['own_client'] = True
+
+    if name == 'zookeeper':
+        wakeup_config['zoo'] = zoo
+
+    return CHANNELS[name](**wakeup_config)
+
+
+# Clients used by publish(), by ZooKeeper host list, with the time of the
+# last failure to connect for hosts which could not be reached
+_publish_clients = dict()
+_publish_lock = threading.Lock()
+
+
+def _get_publish_client(config, timeout):
+    """
+    Return the started KazooClient shared by publish() calls for the
+    'zookeeper' host list in config, or None if ZooKeeper could not be
+    reached within timeout seconds recently.
+    """
+    hosts = ','.join(config.get('zookeeper', None) or [])
+
+    with _publish_lock:
+        client, failed = _publish_clients.get(hosts, (None, None))
+
+        if client is not None:
+            return client
+
+        if failed is not None and \
+                time.time() - failed < PUBLISH_RETRY_INTERVAL:
+            return None
+
+        client = KazooClient(hosts=hosts, timeout=3)
+        try:
+            client.start(timeout=timeout)
+        except Exception as exc:
+            log.warning('Unable to connect to ZooKeeper to publish queue '
+                        'wake-ups: %r', exc)
+            client.stop()
+            _publish_clients[hosts] = (None, time.time())
+            return None
+
+        _publish_clients[hosts] = (client, None)
+        return client
+
+
+def publish(config, block=False, **kwargs):
+    """
+    Wake up whoever waits on the configured channel.  This is best effort:
+    waiters fall back to polling, so failures are only logged, and the
+    request path is not held up waiting for ZooKeeper.  If block, wait
+    (up to 'publish_timeout' seconds) for the write to complete; callers
+    which exit right away, like the CLI, must do so or the write may be
+    lost with the client's daemon threads.
+    """
+    try:
+        wakeup_config = config.get('queue_wakeup', None) or {}
+
+        if wakeup_config.get('channel', None) == 'zookeeper' and \
+                kwargs.get('zoo', None) is None:
+            if config.get('zookeeper', None) is None:
+                raise tds.exceptions.ConfigurationError(
+                    'The zookeeper queue wake-up channel requires a '
+                    '"zookeeper" host list'
+                )
+
+            kwargs['zoo'] = _get_publish_client(
+                config, wakeup_config.get('publish_timeout', 0.5)
+            )
+            if kwargs['zoo'] is None:
+                return
+
+        channel = get_channel(config, **kwargs)
+
+        try:
+            channel.publish(
+                block=block,
+                timeout=wakeup_config.get('publish_timeout', 0.5),
+            )
+        finally:
+            channel.close()
+    except Exception as exc:
+        log.warning('Unable to publish queue wake-up: %r', exc)
@@ -17,9 +17,11 @@ Base view class for REST API.
 """
 
 import json
+import urllib
 
 from pyramid.response import Response
 from cornice.resource import view
+from sqlalchemy import inspect
 
 from ..json_encoder import TDSEncoder
 
@@ -27,6 +29,7 @@ import tagopsdb
 
 import tds.model
 import tds.exceptions
+import tds.utils.wakeup
 
 from .validators import ValidatedView
 from . import obj_types, descriptions
@@ -107,6 +110,12 @@ class BaseView(ValidatedView):
     It also handles validation for requests and parameters in requests.
     """
 
+    # Number of rows fetched at a time when streaming a collection
+    STREAM_BATCH_SIZE = 100
+
+    # The 'limit' of a collection request paginated by ID with 'start'
+    page_limit = None
+
     def to_json_obj(self, obj, param_routes=None):
         """
         Return a JSON object representation of this object.
@@ -114,6 +123,10 @@ class BaseView(ValidatedView):
         if param_routes is None:
             param_routes = self.param_routes
 
+        select = None
+        if getattr(self.request, 'validated', False):
+            select = self.request.validated.get('select', None)
+
         obj_dict = obj
         if getattr(obj, 'to_dict', None) is not None:
             obj_dict = obj.to_dict()
@@ -123,14 +136,43 @@ class BaseView(ValidatedView):
                 obj_dict[param] = obj_dict[param_routes[param]]
                 del obj_dict[param_routes[param]]
 
-        if getattr(self.request, 'validated', False) and 'select' in \
-                self.request.validated:
-            for key in obj_dict:
-                if key not in self.request.validated['select']:
+        if select is not None:
+            for key in obj_dict.keys():
+                if key not in select:
                     del obj_dict[key]
 
         return obj_dict
 
+    def select_columns(self, query, param_routes=None):
+        """
+        Return query changed to read just the columns named by the 'select'
+        parameter, followed by the ID, as plain rows.  Return None if there
+        is no selection, or if a selected attribute is not a plain column
+        (e.g., a relationship), in which case whole objects must be loaded.
+        """
+        select = None
+        if getattr(self.request, 'validated', False):
+            select = self.request.validated.get('select', None)
+
+        if not select or getattr(query, 'column_descriptions', None) is None:
+            return None
+
+        if param_routes is None:
+            param_routes = self.param_routes
+
+        entity = query.column_descriptions[0]['entity']
+        mapper = inspect(entity)
+        columns = list()
+        for attr in [param_routes.get(param, param) for param in select] + \
+                ['id']:
+            if attr in mapper.synonyms:
+                attr = mapper.synonyms[attr].name
+            if attr not in mapper.column_attrs:
+                return None
+            columns.append(getattr(entity, attr))
+
+        return query.with_entities(*columns)
+
     def get_obj_by_name_or_id(self, obj_type=None, model=None, name_attr=None,
                               param_name=None, can_be_name=True,
                               dict_name=None):
@@ -246,10 +288,9 @@ class BaseView(ValidatedView):
             )
 
         if 'limit' in self.request.validated_params:
+            self.page_limit = self.request.validated_params['limit']
             self.request.validated[plural] = (
-                self.request.validated[plural].limit(
-                    self.request.validated_params['limit']
-                )
+                self.request.validated[plural].limit(self.page_limit)
             )
 
     @staticmethod
@@ -282,6 +323,75 @@ class BaseView(ValidatedView):
                 )
             )
 
+    def _next_page_url(self, start):
+        """
+        Return the URL of this request with the 'start' parameter replaced.
+        """
+        params = self.request.GET.copy()
+        params['start'] = str(start)
+        return '{path}?{query}'.format(
+            path=self.request.path_url,
+            query=urllib.urlencode(params.items()),
+        )
+
+    def make_collection_response(self, objs, param_routes=None, limit=None):
+        """
+        Make and return a Response with the JSON list of objs.
+        If limit is given, objs is a page of a collection ordered by ID and
+        a 'Link' header with the URL of the next page is added if the page
+        is full; the client is done when it gets a page without one.
+        Otherwise, the response body is encoded and sent one object at a
+        time, fetching query results in batches, so that large collections
+        can be exported in bounded memory.
+        With a 'select' parameter, only the selected columns are read if
+        possible (see select_columns); their values are encoded as they
+        would be in the objects' to_dict() output.
+        """
+        rows = self.select_columns(objs, param_routes)
+
+        if rows is not None:
+            select = self.request.validated['select']
+            objs = rows
+            to_json_obj = lambda row: dict(zip(select, row))
+            get_id = lambda row: row[-1]
+        else:
+            to_json_obj = lambda obj: self.to_json_obj(obj, param_routes)
+            get_id = lambda obj: obj.id
+
+        if limit is not None:
+            objs = list(objs)
+            headers = dict()
+            if objs and len(objs) >= limit:
+                headers['Link'] = '<{url}>; rel="next"'.format(
+                    url=self._next_page_url(get_id(objs[-1]) + 1),
+                )
+            return self.make_response(
+                [to_json_obj(x) for x in objs],
+                headers=headers,
+            )
+
+        if getattr(objs, 'yield_per', None) is not None:
+            objs = objs.yield_per(self.STREAM_BATCH_SIZE)
+
+        def encode_objs():
+            """Yield the JSON list of objs in pieces."""
+            encoder = TDSEncoder()
+            try:
+                yield '['
+                for index, obj in enumerate(objs):
+                    if index:
+                        yield ', '
+                    yield encoder.encode(to_json_obj(obj))
+                yield ']'
+            finally:
+                tagopsdb.Session.remove()
+
+        return Response(
+            app_iter=encode_objs(),
+            content_type="text/json",
+            status="200 OK",
+        )
+
     def _route_params(self, routes=None):
         """
         Map params from their front-end names to their backend names in the
@@ -311,10 +421,17 @@ class BaseView(ValidatedView):
         Returns:
             "200 OK" if valid request successfully processed
         """
-        return self.make_response(
-            [self.to_json_obj(x) for x in self.request.validated[self.plural]]
+        return self.make_collection_response(
+            self.request.validated[self.plural], limit=self.page_limit
         )
 
+    def _after_commit(self):
+        """
+        Called once a PUT or POST has been committed, while the session
+        is still open.  Does nothing by default.
+        """
+        pass
+
     @view(validators=('validate_collection_get', 'validate_cookie'))
     def collection_head(self):
         """
@@ -340,6 +457,7 @@ class BaseView(ValidatedView):
             )
             self.session.add(self.request.validated[self.name])
             self.session.commit()
+        self._after_commit()
         return self.make_response(
             self.to_json_obj(self.request.validated[self.name]),
             "201 Created",
@@ -405,6 +523,7 @@ class BaseView(ValidatedView):
                 self.request.validated_params[attr],
             )
         self.session.commit()
+        self._after_commit()
         return self.make_response(
             self.to_json_obj(self.request.validated[self.name])
         )
@@ -436,3 +555,25 @@ class BaseView(ValidatedView):
                 )
             )
         )
+
+
+class RepoUpdaterNotifyMixin(object):
+    """
+    Wake up the repo updater when a package is added or set to pending.
+    Used by the package views ahead of BaseView.
+    """
+
+    def _after_commit(self):
+        """
+        Publish to the repo updater if the package is now pending.
+        The status is read here as the session is removed afterward.
+        """
+        if self.request.method == 'PUT' and \
+                'status' not in self.request.validated_params:
+            return
+
+        if getattr(self.request.validated[self.name], 'status', None) == \
+                'pending':
+            tds.utils.wakeup.publish(
+                self.settings, path=tds.utils.wakeup.REPO_PATH
+            )
@@ -143,6 +143,50 @@ STAGE_ID = 2
 PROD_ID = 3
 
 
+def get_results(tiers, envs, deployments):
+    """
+    Return the bystander result for the given tiers (a dict with tier ID
+    keys) from the latest completed tier deployments, which are
+    (AppDeployment, Package, PackageDefinition) tuples; a later tuple for
+    the same application, tier and environment replaces an earlier one.
+    envs is a dict with environment ID keys.
+    """
+    env_sub_dicts = dict()
+    for env_dep, package, app in deployments:
+        env = envs[env_dep.environment_id]
+        env_sub_dict = env_sub_dicts.setdefault(
+            (env_dep.app_id, app.id), dict(name=app.name)
+        )
+        env_sub_dict[env.id] = dict(
+            name=env.env,
+            package_id=env_dep.package_id,
+            package_version=package.version,
+            package_revision=package.revision,
+            package_commit_hash=package.commit_hash,
+        )
+
+    result = dict()
+    for (tier_id, app_id), env_sub_dict in env_sub_dicts.iteritems():
+        tier = tiers[tier_id]
+        if tier.id not in result:
+            result[tier.id] = dict(name=tier.name, status=tier.status)
+        try:
+            env_sub_dict['prod_ahead'] = int(env_sub_dict[PROD_ID][
+                'package_version'
+            ]) > int(env_sub_dict[STAGE_ID]['package_version'])
+        except (KeyError, ValueError):
+            env_sub_dict['prod_ahead'] = False
+        try:
+            env_sub_dict['stage_ahead'] = int(env_sub_dict[STAGE_ID][
+                'package_version'
+            ]) > int(env_sub_dict[DEV_ID]['package_version'])
+        except (KeyError, ValueError):
+            env_sub_dict['stage_ahead'] = False
+        result[tier.id][app_id] = env_sub_dict
+
+    return result
+
+
 @resource(path=ALL_URLS['bystander'])
 class BystanderView(base.BaseView):
     """
@@ -172,49 +216,20 @@ class BystanderView(base.BaseView):
                 request.validated_params['limit']
             )
 
-        # self.applications = self.applications.all()
-        self.result = dict()
-        all_envs = tagopsdb.model.Environment.all()
-        for app_tier in self.query(tagopsdb.model.ProjectPackage).filter(
-            tagopsdb.model.ProjectPackage.app_id.in_(
-                [tier.id for tier in self.tiers]
-            )
-        ).all():
-            app = self.query(tds.model.Application).get(id=app_tier.pkg_def_id)
-            tier = self.query(tds.model.AppTarget).get(id=app_tier.app_id)
-            env_sub_dict = dict()
-            for env in all_envs:
-                env_dep = app.get_latest_completed_tier_deployment(
-                    tier.id,
-                    env.id,
-                    query=self.query(tagopsdb.model.AppDeployment),
-                )
-                if env_dep is not None:
-                    env_sub_dict[env.id] = dict(
-                        name=env.env,
-                        package_id=env_dep.package_id,
-                        package_version=env_dep.package.version,
-                        package_revision=env_dep.package.revision,
-                        package_commit_hash=env_dep.package.commit_hash,
-                    )
-            if len(env_sub_dict) == 0:
-                continue
-            if tier.id not in self.result:
-                self.result[tier.id] = dict(name=tier.name, status=tier.status)
-            try:
-                env_sub_dict['prod_ahead'] = int(env_sub_dict[PROD_ID][
-                    'package_version'
-                ]) > int(env_sub_dict[STAGE_ID]['package_version'])
-            except (KeyError, ValueError):
-                env_sub_dict['prod_ahead'] = False
-            try:
-                env_sub_dict['stage_ahead'] = int(env_sub_dict[STAGE_ID][
-                    'package_version'
-                ]) > int(env_sub_dict[DEV_ID]['package_version'])
-            except (KeyError, ValueError):
-                env_sub_dict['stage_ahead'] = False
-            self.result[tier.id][app.id] = env_sub_dict
-            self.result[tier.id][app.id]['name'] = app.name
+        tiers = dict((tier.id, tier) for tier in self.tiers.all())
+        all_envs = dict(
+            (env.id, env) for env in self.query(tagopsdb.model.Environment)
+        )
+
+        # All latest deployments are fetched at once, keeping the number of
+        # queries constant regardless of the number of applications and tiers
+        self.result = get_results(
+            tiers, all_envs,
+            tds.model.Application.get_latest_completed_tier_deployments(
+                tiers.keys(),
+                query=self.query(tagopsdb.model.AppDeployment),
+            ),
+        )
 
     def validate_bystander_options(self, _request):
         """
@@ -20,6 +20,7 @@ from cornice.resource import resource, view
 
 import tagopsdb.model
 import tds.model
+import tds.utils.wakeup
 from .base import BaseView, init_view
 from .urls import ALL_URLS
 from .permissions import DEPLOYMENT_PERMISSIONS
@@ -366,6 +367,12 @@ class DeploymentView(BaseView):
                 self.request.validated_params[attr],
             )
         self.session.commit()
+        if self.request.validated_params.get('status') == 'queued':
+            tds.utils.wakeup.publish(self.settings)
+        elif self.request.validated_params.get('status') == 'canceled':
+            tds.utils.wakeup.publish(
+                self.settings, path=tds.utils.wakeup.CANCEL_PATH
+            )
         return self.make_response(
             self.to_json_obj(self.request.validated[self.name])
         )
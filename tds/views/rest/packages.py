@@ -23,7 +23,7 @@ from jenkinsapi.custom_exceptions import JenkinsAPIException, NotFound
 
 import tds.exceptions
 import tds.model
-from .base import BaseView, init_view
+from .base import BaseView, RepoUpdaterNotifyMixin, init_view
 from .urls import ALL_URLS
 from .permissions import PACKAGE_PERMISSIONS
 
@@ -31,7 +31,7 @@ from .permissions import PACKAGE_PERMISSIONS
 @resource(collection_path=ALL_URLS['package_collection'],
           path=ALL_URLS['package'])
 @init_view(name='package')
-class PackageView(BaseView):
+class PackageView(RepoUpdaterNotifyMixin, BaseView):
     """
     Package view. This object maps to the /applications/{name_or_id}/packages
     and /applications/{name_or_id}/packages/{version}/{revision} URLs.
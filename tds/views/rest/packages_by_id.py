@@ -24,7 +24,7 @@ except ImportError:
     from jenkinsapi.exceptions import JenkinsAPIException, NotFound
 
 import tds.model
-from .base import BaseView, init_view
+from .base import BaseView, RepoUpdaterNotifyMixin, init_view
 from . import obj_types, descriptions
 from .urls import ALL_URLS
 from .permissions import PACKAGE_BY_ID_PERMISSIONS
@@ -33,7 +33,7 @@ from .permissions import PACKAGE_BY_ID_PERMISSIONS
 @resource(collection_path=ALL_URLS['package_by_id_collection'],
           path=ALL_URLS['package_by_id'])
 @init_view(name='package-by-id', model=tds.model.Package, set_params=False)
-class PackageByIDView(BaseView):
+class PackageByIDView(RepoUpdaterNotifyMixin, BaseView):
     """
     View for packages retrieved by ID.
     """
@@ -16,12 +16,22 @@
 REST API performance endpoint. Provides information on monthly performance.
 e.g., number of tier deployments by status and total for every month since
 first tier deployment in database.
+
+The counts are computed by the database with one GROUP BY query.  If the
+'performance_rollup' REST setting is true, the counts of months that have
+ended are also kept in memory for 'performance_rollup_ttl' seconds (an
+hour by default), so mostly only the current month is queried.  Statuses
+may still change after a month ends (e.g., tier deployments are validated
+later), which is why the counts are not kept for good.
 """
 
 
 from datetime import datetime, timedelta
+import threading
+import time
 
 from cornice.resource import resource, view
+from sqlalchemy import func
 
 import tds.model
 from . import base
@@ -29,6 +39,118 @@ from .urls import ALL_URLS
 from .permissions import PERFORMANCE_PERMISSIONS
 
 
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+
+def add_one_month(date_obj):
+    """Return the start of the month after the one date_obj is in."""
+    return (date_obj.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class MonthlyRollup(object):
+    """
+    Counts of objects by status for months that have ended, by object type
+    and month start, each kept for a limited time.
+    Instances may be shared between threads.
+    """
+
+    def __init__(self):
+        """Initialize object."""
+        self.entries = dict()
+        self.lock = threading.Lock()
+
+    def get(self, obj_type, months, now=None):
+        """
+        Return a dict mapping those of the given months that have unexpired
+        counts to the counts.
+        """
+        if now is None:
+            now = time.time()
+
+        found = dict()
+        with self.lock:
+            for month in months:
+                entry = self.entries.get((obj_type, month), None)
+                if entry is not None and entry[0] > now:
+                    found[month] = entry[1]
+
+        return found
+
+    def put(self, obj_type, counts, ttl, now=None):
+        """
+        Keep the given counts (a dict mapping month starts to counts) for
+        ttl seconds, dropping any expired entries.
+        """
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            for key in [key for key, entry in self.entries.iteritems()
+                        if entry[0] <= now]:
+                del self.entries[key]
+
+            for month, month_counts in counts.iteritems():
+                self.entries[(obj_type, month)] = (now + ttl, month_counts)
+
+
+def get_monthly_counts(session, model, col_name, start, end):
+    """
+    Return a dict mapping the start of each month between the datetimes
+    start and end to a dict of numbers of objects of model by status, for
+    objects with col_name in that range, using one GROUP BY query.
+    """
+    column = getattr(model, col_name)
+    year = func.year(column)
+    month = func.month(column)
+    status_column = getattr(model, 'status')
+    counts = dict()
+
+    for obj_year, obj_month, status, count in session.query(
+        year, month, status_column, func.count()
+    ).filter(
+        column >= start.strftime(TIME_FMT),
+        column < end.strftime(TIME_FMT),
+    ).group_by(year, month, status_column):
+        month_start = datetime(year=obj_year, month=obj_month, day=1)
+        counts.setdefault(month_start, dict())[status] = count
+
+    return counts
+
+
+def get_counts_for_months(session, obj_type, model, col_name, months, today,
+                          rollup=None, ttl=None):
+    """
+    Return a dict mapping each of the given month starts to the counts of
+    objects of model by status in that month.
+    If rollup (a MonthlyRollup) is given, counts of months before today's
+    are taken from it when possible, and kept in it for ttl seconds.
+    """
+    counts = dict()
+    if rollup is not None:
+        counts.update(rollup.get(obj_type, months))
+
+    missing = [month for month in months if month not in counts]
+    if not missing:
+        return counts
+
+    month_counts = get_monthly_counts(
+        session, model, col_name, missing[0], add_one_month(missing[-1])
+    )
+    for month in missing:
+        counts[month] = month_counts.get(month, dict())
+
+    if rollup is not None:
+        this_month = datetime(year=today.year, month=today.month, day=1)
+        rollup.put(
+            obj_type,
+            dict((month, counts[month]) for month in missing
+                 if month < this_month),
+            ttl,
+        )
+
+    return counts
+
+
 @resource(path=ALL_URLS['performance'])
 class PerformanceView(base.BaseView):
     """
@@ -44,9 +166,8 @@ class PerformanceView(base.BaseView):
         host_deployments=dict(model=tds.model.HostDeployment, attr='realized'),
     )
 
-    @staticmethod
-    def _add_one_month(date_obj):
-        return (date_obj.replace(day=1) + timedelta(days=32)).replace(day=1)
+    # Shared between requests when 'performance_rollup' is enabled
+    rollup = MonthlyRollup()
 
     def validate_performance_get(self, request):
         """
@@ -70,7 +191,6 @@ class PerformanceView(base.BaseView):
         if request.errors:
             return
 
-        time_fmt = "%Y-%m-%d %H:%M:%S"
         to_return = dict()
         model = self.model_dict[obj_type]['model']
         col_name = self.model_dict[obj_type]['attr']
@@ -94,8 +214,7 @@ class PerformanceView(base.BaseView):
             )
         else:
             earliest = min(
-                [getattr(obj, col_name) for obj in self.query(model).all()] +
-                [today]
+                self.session.query(func.min(column)).scalar() or today, today
             )
         earliest = datetime(
             year=earliest.year, month=earliest.month, day=1
@@ -105,30 +224,35 @@ class PerformanceView(base.BaseView):
             limit = int(request.validated_params['limit'])
             latest = earliest
             while limit:
-                latest = self._add_one_month(latest)
+                latest = add_one_month(latest)
                 limit -= 1
         else:
             latest = today
         if latest > today:
             latest = today
 
+        months = list()
         current = earliest
-        month_later = self._add_one_month(current)
-        while month_later <= latest:
-            date_obj = dict(month=current.strftime("%Y-%m"))
-            all_objs = self.query(model).filter(
-                column < month_later.strftime(time_fmt),
-                column >= current.strftime(time_fmt)
-            ).all()
-            date_obj['total'] = len(all_objs)
+        while add_one_month(current) <= latest:
+            months.append(current)
+            current = add_one_month(current)
+
+        if self.settings.get('performance_rollup', False):
+            counts = get_counts_for_months(
+                self.session, obj_type, model, col_name, months, today,
+                self.rollup, self.settings.get('performance_rollup_ttl', 3600),
+            )
+        else:
+            counts = get_counts_for_months(
+                self.session, obj_type, model, col_name, months, today,
+            )
+
+        for month in months:
+            date_obj = dict(month=month.strftime("%Y-%m"))
+            date_obj['total'] = sum(counts[month].values())
             for status in statuses:
-                date_obj[status] = len([
-                    obj for obj in all_objs if
-                    getattr(obj, 'status') == status
-                ])
+                date_obj[status] = counts[month].get(status, 0)
             date_objs.append(date_obj)
-            current = self._add_one_month(current)
-            month_later = self._add_one_month(current)
         # to_return[model_name] = date_objs
         # self.result = to_return
         self.result = date_objs
@@ -189,9 +189,6 @@ class SearchView(base.BaseView):
                 self.model.id >= self.start
             )
 
-        if self.limit is not None:
-            self.results = self.results.limit(self.limit)
-
         if self.before is not None:
             timestamp_col = getattr(
                 self.model, self.TIMESTAMP_MAP[self.obj_type]
@@ -207,6 +204,12 @@ class SearchView(base.BaseView):
                 timestamp_col > self.after
             )
 
+        # Ordered by ID so that 'start' works as a cursor between pages
+        self.results = self.results.order_by(self.model.id)
+
+        if self.limit is not None:
+            self.results = self.results.limit(self.limit)
+
     def _validate_obj_type_exists(self):
         """
         If the obj_type is in the self.types, return True.
@@ -367,10 +370,9 @@ class SearchView(base.BaseView):
                     body='',
                     status="417 Expectation Failed",
                 )
-        return self.make_response([
-            self.to_json_obj(x, self.obj_dict['param_routes']) for x in
-            self.results
-        ])
+        return self.make_collection_response(
+            self.results, self.obj_dict['param_routes'], limit=self.limit
+        )
 
     @view(validators=('validate_search_get', 'validate_cookie'))
     def head(self):
@@ -19,8 +19,52 @@ REST API utilities.
 import hmac
 import hashlib
 import base64
+import collections
+import threading
 from datetime import datetime
 
+# Verified cookies, mapping (secret key, cookie, client address) to whether
+# the digest is an admin one, so the digests are not recomputed on every
+# request; the expiry of the cookie is still checked every time.
+VERIFIED_COOKIE_CACHE_SIZE = 1024
+_verified_cookies = collections.OrderedDict()
+_verified_cookies_lock = threading.Lock()
+
+
+def _get_verified_cookie(key):
+    """
+    Return whether the verified cookie for key is an admin one, or None if
+    it has not been verified.
+    """
+    with _verified_cookies_lock:
+        is_admin = _verified_cookies.pop(key, None)
+
+        if is_admin is not None:
+            # Reinsert to mark it as most recently used
+            _verified_cookies[key] = is_admin
+
+        return is_admin
+
+
+def _put_verified_cookie(key, is_admin, settings):
+    """Remember a verified cookie, evicting the least recently used ones."""
+    max_size = settings.get(
+        'verified_cookie_cache_size', VERIFIED_COOKIE_CACHE_SIZE
+    )
+
+    with _verified_cookies_lock:
+        _verified_cookies.pop(key, None)
+        _verified_cookies[key] = is_admin
+
+        while len(_verified_cookies) > max_size:
+            _verified_cookies.popitem(last=False)
+
+
+def _forget_verified_cookie(key):
+    """Drop a cookie that is no longer valid from the cache."""
+    with _verified_cookies_lock:
+        _verified_cookies.pop(key, None)
+
 
 def _create_digest(username, addr, seconds, settings, is_admin, prepend,
                    eternal):
@@ -147,32 +191,40 @@ def validate_cookie(request, settings):
     else:
         remote_addr = request.remote_addr
 
-    admin_digest = _create_digest(
-        username, remote_addr, seconds, settings, True, prepend, eternal
-    )
-    non_admin_digest = _create_digest(
-        username, remote_addr, seconds, settings, False, prepend, eternal
-    )
-    wildcard_admin_digest = _create_digest(
-        username, 'any', seconds, settings, True, prepend, eternal
-    )
-    wildcard_non_admin_digest = _create_digest(
-        username, 'any', seconds, settings, False, prepend, eternal
-    )
-    if digest not in (
-        admin_digest, non_admin_digest, wildcard_admin_digest,
-        wildcard_non_admin_digest,
-    ):
-        return (True, False, False, restrictions)
+    cache_key = (settings['secret_key'], request.cookies['session'],
+                 remote_addr)
+    is_admin = _get_verified_cookie(cache_key)
+
+    if is_admin is None:
+        admin_digest = _create_digest(
+            username, remote_addr, seconds, settings, True, prepend, eternal
+        )
+        non_admin_digest = _create_digest(
+            username, remote_addr, seconds, settings, False, prepend, eternal
+        )
+        wildcard_admin_digest = _create_digest(
+            username, 'any', seconds, settings, True, prepend, eternal
+        )
+        wildcard_non_admin_digest = _create_digest(
+            username, 'any', seconds, settings, False, prepend, eternal
+        )
+        if digest not in (
+            admin_digest, non_admin_digest, wildcard_admin_digest,
+            wildcard_non_admin_digest,
+        ):
+            return (True, False, False, restrictions)
+
+        is_admin = digest in (admin_digest, wildcard_admin_digest,)
+        _put_verified_cookie(cache_key, is_admin, settings)
 
     if eternal:
         if settings.get('eternal_users', None) is None or username not in \
                 settings['eternal_users']:
+            _forget_verified_cookie(cache_key)
             return (True, False, False, restrictions)
     elif (datetime.now() - datetime.utcfromtimestamp(0)).total_seconds() - \
             seconds - settings['cookie_life'] >= 0:
+        _forget_verified_cookie(cache_key)
         return (True, False, False, restrictions)
 
-    is_admin = digest in (admin_digest, wildcard_admin_digest,)
-
     return (True, username, is_admin, restrictions)
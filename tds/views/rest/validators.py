@@ -29,12 +29,43 @@ from sqlalchemy.orm.exc import NoResultFound
 from . import utils
 from .json_validators import JSONValidatedView
 
+# Matches URL parameters (e.g., '{name_or_id}') in service paths
+URL_PLACEHOLDER = re.compile(r'\{[a-zA-Z0-9_-]*\}')
+
 
 class ValidatedView(JSONValidatedView):
     """
     This class implements common non-JSON validators.
     """
 
+    # Collection path regexes by view class and URL prefix
+    _collection_matchers = dict()
+
+    @classmethod
+    def _get_collection_matcher(cls, url_prefix):
+        """
+        Return a regex matching the collection path of this view, or None if
+        it has no collection path.  The regex is compiled once per class.
+        """
+        key = (cls, url_prefix)
+        if key not in cls._collection_matchers:
+            try:
+                collection_path = url_prefix + cls._services[
+                    'collection_{name}'.format(name=cls.__name__.lower())
+                ].path
+            except KeyError:
+                matcher = None
+            else:
+                # Change URL parameters to regexes, so that the actual path
+                # of a request can be matched against the collection path.
+                matcher = re.compile(
+                    URL_PLACEHOLDER.sub('[a-zA-Z0-9_-]*', collection_path) +
+                    '$'
+                )
+            cls._collection_matchers[key] = matcher
+
+        return cls._collection_matchers[key]
+
     def query(self, model):
         """
         Convenience method for creating a query over the model or its delegate
@@ -405,27 +436,11 @@ class ValidatedView(JSONValidatedView):
             for key in restrictions:
                 restrictions[key] = restrictions[key].split('+')
             request.restrictions = restrictions
-            try:
-                collection_path = self.settings['url_prefix'] + \
-                    self._services[
-                        'collection_{name}'.format(
-                            name=self.__class__.__name__.lower()
-                        )
-                    ].path
-            except KeyError:
-                collection_path = None
-
-            # Change URL parameters to regexes and check if the actual path
-            # matches the newly constructed regex to determine if the path of
-            # this request is the collection path.
-            if collection_path is not None:
-                url_placeholder = re.compile(r'\{[a-zA-Z0-9_-]*\}')
-                url_matcher = re.compile(
-                    url_placeholder.sub('[a-zA-Z0-9_-]*', collection_path) +
-                    '$'
-                )
-                prefix = "collection_" if url_matcher.match(request.path) \
-                    else ''
+            url_matcher = self._get_collection_matcher(
+                self.settings['url_prefix']
+            )
+            if url_matcher is not None and url_matcher.match(request.path):
+                prefix = "collection_"
             else:
                 prefix = ''
             if not getattr(self, 'permissions', None):
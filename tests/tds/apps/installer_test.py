@@ -0,0 +1,319 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock, patch
+from StringIO import StringIO
+from unittest_data_provider import data_provider
+import time
+import unittest
+
+import tds.exceptions
+import tds.model
+import tds.utils.wakeup
+from tds.apps.installer import HostDeploymentInfo, Installer
+
+
+class TestInstallerMaxInFlight(unittest.TestCase):
+    limits = lambda: [
+        (1, 10, 1),
+        (5, 10, 5),
+        ('5', 10, 5),
+        (0, 10, 1),
+        ('25%', 10, 3),
+        ('50%', 200, 100),
+        ('1%', 3, 1),
+        ('100%', 7, 7),
+    ]
+
+    @data_provider(limits)
+    def test_parse_max_in_flight(self, limit, num_hosts, expected):
+        self.assertEqual(
+            Installer._parse_max_in_flight(limit, num_hosts),
+            expected
+        )
+
+    def test_parse_max_in_flight_invalid(self):
+        self.assertRaises(
+            tds.exceptions.ConfigurationError,
+            Installer._parse_max_in_flight, 'lots', 10
+        )
+
+    def setUp(self):
+        patcher = patch.object(
+            tds.model.HostDeployment, 'get_statuses_for_deployment',
+            return_value=['pending'] * 4,
+        )
+        self.get_statuses = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_installer(self, parallel_config):
+        installer = Installer.__new__(Installer)
+        installer.parallel_config = parallel_config
+        return installer
+
+    def get_deployment(self, *tier_names):
+        deployment = Mock(app_deployments=[])
+        for tier_name in tier_names:
+            tier_dep = Mock()
+            tier_dep.target.name = tier_name
+            deployment.app_deployments.append(tier_dep)
+        return deployment
+
+    def test_tier_override(self):
+        installer = self.get_installer(
+            dict(max_in_flight=2, tiers=dict(tier1='10%'))
+        )
+        self.assertEqual(installer.get_max_in_flight(200, 'tier1'), 20)
+        self.assertEqual(installer.get_max_in_flight(200, 'tier2'), 2)
+        self.assertEqual(installer.get_max_in_flight(200), 2)
+
+    def test_serial_without_config(self):
+        installer = self.get_installer({})
+        self.assertFalse(
+            installer.is_parallel_deployment(self.get_deployment('tier1'))
+        )
+
+    def test_parallel_for_configured_tier(self):
+        installer = self.get_installer(dict(tiers=dict(tier1=4)))
+        self.assertTrue(
+            installer.is_parallel_deployment(self.get_deployment('tier1'))
+        )
+        self.assertFalse(
+            installer.is_parallel_deployment(self.get_deployment('tier2'))
+        )
+
+    serial_limits = lambda: [(1,), (0,), ('0',), (' 1 ',), ('25%',)]
+
+    @data_provider(serial_limits)
+    def test_serial_for_limit_of_one(self, limit):
+        installer = self.get_installer(dict(max_in_flight=limit))
+        self.assertFalse(
+            installer.is_parallel_deployment(self.get_deployment('tier1'))
+        )
+
+    def test_parallel_for_percentage(self):
+        installer = self.get_installer(dict(max_in_flight='50%'))
+        self.assertTrue(
+            installer.is_parallel_deployment(self.get_deployment('tier1'))
+        )
+
+
+class TestInstallerWorker(unittest.TestCase):
+    def test_serve(self):
+        installer = Installer.__new__(Installer)
+        installer.get_deployment = Mock(
+            side_effect=lambda dep_id: None if dep_id == 3 else Mock(id=dep_id)
+        )
+        installer.do_deployment = Mock(
+            side_effect=[None, Exception('boom')]
+        )
+        outfile = StringIO()
+
+        installer.serve(StringIO('1\n2\n3\n'), outfile)
+
+        self.assertEqual(outfile.getvalue(), 'done 1\ndone 2\ndone 3\n')
+        self.assertEqual(
+            [call[0][0].id for call in installer.do_deployment.call_args_list],
+            [1, 2]
+        )
+
+
+class TestInstallerCancel(unittest.TestCase):
+    def setUp(self):
+        self.installer = Installer.__new__(Installer)
+        self.channel = tds.utils.wakeup.ZooKeeperChannel(Mock())
+        self.installer._cancel_channel = self.channel
+        self.is_canceled = patch.object(
+            Installer, '_is_canceled', return_value=True
+        ).start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.channel.close()
+
+    def test_wait_interrupted_by_cancel(self):
+        self.channel.fileno()
+        self.channel._watch(None, None)
+
+        start = time.time()
+        self.assertTrue(self.installer._wait_or_cancel(10, 1))
+        self.assertLess(time.time() - start, 1)
+        self.is_canceled.assert_called_once_with(1)
+
+    def test_wait_not_canceled(self):
+        self.is_canceled.return_value = False
+        self.channel.fileno()
+        self.channel._watch(None, None)
+
+        self.assertFalse(self.installer._wait_or_cancel(0.1, 1))
+
+    def test_no_cancel_published(self):
+        self.channel.fileno()
+        self.assertFalse(self.installer._cancel_requested(1))
+        self.assertFalse(self.is_canceled.called)
+
+
+class TestInstallerParallel(unittest.TestCase):
+    def setUp(self):
+        self.installer = Installer.__new__(Installer)
+        self.installer.retry = 0
+        self.installer.parallel_config = dict(max_in_flight=2)
+        self.installer._cancel_channel = tds.utils.wakeup.PollingChannel()
+        self.installer.deploy_strategy = Mock()
+        self.installer.deploy_strategy.deploy_to_hosts.side_effect = \
+            self.deploy_to_hosts
+        self.failing_hosts = set()
+        self.dispatches = []
+
+        self.is_canceled = patch.object(
+            Installer, '_is_canceled', return_value=False
+        ).start()
+        self.update_statuses = patch(
+            'tds.model.HostDeployment.update_statuses'
+        ).start()
+        self.update_result = patch(
+            'tds.model.HostDeployment.update_result'
+        ).start()
+        self.get_statuses = patch(
+            'tds.model.HostDeployment.get_statuses_for_deployment'
+        ).start()
+        patch('tagopsdb.Session').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def deploy_to_hosts(self, dep_hosts, app, version, retry=4):
+        self.dispatches.append((time.time(), list(dep_hosts)))
+        for dep_host in dep_hosts:
+            if dep_host in self.failing_hosts:
+                yield (dep_host, False, 'Install failed')
+            else:
+                yield (dep_host, True, 'Deploy successful')
+
+    @staticmethod
+    def host_deps(count, delay=0, status='pending'):
+        return [
+            HostDeploymentInfo(
+                id=100 + num, deployment_id=1, host_id=num,
+                host_name='host%d' % num, package_name='app', version='1',
+                status=status, delay=delay,
+            )
+            for num in range(1, count + 1)
+        ]
+
+    def results_by_id(self):
+        return dict(
+            (call[0][0], call[0][1])
+            for call in self.update_result.call_args_list
+        )
+
+    def test_per_host_status_writes(self):
+        self.failing_hosts.add('host2')
+
+        states, canceled, first_dep = \
+            self.installer._do_parallel_host_deployments(self.host_deps(3), 2)
+
+        self.assertEqual(sorted(states), ['failed', 'ok', 'ok'])
+        self.assertFalse(canceled)
+        self.assertFalse(first_dep)
+        self.assertEqual(self.dispatches[0][1], ['host1', 'host2'])
+        self.assertEqual(self.update_statuses.call_args_list[0][0],
+                         ([101, 102], 'inprogress'))
+        self.assertEqual(self.results_by_id(),
+                         {101: 'ok', 102: 'failed', 103: 'ok'})
+
+    def test_strategy_error_fails_wave(self):
+        self.installer.deploy_strategy.deploy_to_hosts.side_effect = \
+            Exception('boom')
+
+        states, _canceled, _first_dep = \
+            self.installer._do_parallel_host_deployments(self.host_deps(2), 2)
+
+        self.assertEqual(states, ['failed', 'failed'])
+        self.assertEqual(self.results_by_id(), {101: 'failed', 102: 'failed'})
+
+    def test_ok_hosts_skipped(self):
+        states, _canceled, _first_dep = \
+            self.installer._do_parallel_host_deployments(
+                self.host_deps(2, status='ok'), 2
+            )
+
+        self.assertEqual(states, ['ok', 'ok'])
+        self.assertEqual(self.dispatches, [])
+
+    def test_delay_between_waves(self):
+        states, _canceled, _first_dep = \
+            self.installer._do_parallel_host_deployments(
+                self.host_deps(3, delay=0.2), 3
+            )
+
+        self.assertEqual(states, ['ok', 'ok', 'ok'])
+        self.assertEqual([hosts for _time, hosts in self.dispatches],
+                         [['host1'], ['host2'], ['host3']])
+        for (first, _hosts), (second, _hosts) in zip(self.dispatches,
+                                                     self.dispatches[1:]):
+            self.assertGreaterEqual(second - first, 0.19)
+
+    def test_no_new_hosts_after_cancel(self):
+        self.is_canceled.side_effect = [False, True]
+
+        states, canceled, _first_dep = \
+            self.installer._do_parallel_host_deployments(self.host_deps(3), 1)
+
+        self.assertTrue(canceled)
+        self.assertEqual(states, ['ok', 'canceled'])
+        self.assertEqual([hosts for _time, hosts in self.dispatches],
+                         [['host1']])
+        self.assertEqual(self.results_by_id(), {101: 'ok'})
+
+    def get_tier_deployment(self, host_deps):
+        tier_deployment = Mock()
+        tier_deployment.target.name = 'tier1'
+        tier_deployment.application.hosts = []
+        for dep in host_deps:
+            host = Mock(id=dep.host_id)
+            host.name = dep.host_name
+            tier_deployment.application.hosts.append(host)
+        return tier_deployment
+
+    def test_tier_rollup_on_partial_failure(self):
+        self.failing_hosts.add('host2')
+        host_deps = self.host_deps(3)
+        tier_deployment = self.get_tier_deployment(host_deps)
+
+        done = self.installer._do_tier_deployment(
+            tier_deployment, parallel=True,
+            host_deployments_by_host=dict(
+                (dep.host_id, dep) for dep in host_deps
+            ),
+        )
+
+        self.assertEqual(done, set([101, 102, 103]))
+        self.assertEqual(tier_deployment.status, 'incomplete')
+
+    def test_deployment_rollup_on_partial_failure(self):
+        self.failing_hosts.add('host2')
+        host_deps = self.host_deps(3)
+        tier_deployment = self.get_tier_deployment(host_deps)
+        deployment = Mock(id=1, app_deployments=[tier_deployment])
+        self.get_statuses.return_value = ['ok', 'failed', 'ok']
+
+        with patch.object(Installer, '_load_host_deployments',
+                          return_value=dict(
+                              (dep.host_id, dep) for dep in host_deps
+                          )):
+            self.installer.do_parallel_deployment(deployment)
+
+        self.assertEqual(tier_deployment.status, 'incomplete')
+        self.assertEqual(deployment.status, 'failed')
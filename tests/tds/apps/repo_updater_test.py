@@ -0,0 +1,287 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock, patch
+from multiprocessing.pool import ThreadPool
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+import tds.exceptions
+from tds.apps.repo_updater import PackageWorkItem, RepoUpdater
+
+
+class TestRepoUpdaterDownload(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'foo-1-1.noarch.rpm')
+        self.updater = RepoUpdater.__new__(RepoUpdater)
+        self.updater.download_timeout = 5
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    @staticmethod
+    def response(status_code, *chunks):
+        return Mock(status_code=status_code,
+                    iter_content=Mock(return_value=iter(chunks)))
+
+    def test_stream_to_file(self):
+        with patch('requests.get',
+                   return_value=self.response(200, 'abc', 'def')) as get:
+            md5 = self.updater._stream_to_file('http://jenkins/foo', self.path)
+
+        self.assertEqual(md5, hashlib.md5('abcdef').hexdigest())
+        self.assertEqual(open(self.path).read(), 'abcdef')
+        self.assertEqual(get.call_args[1]['headers'], {})
+        self.assertTrue(get.call_args[1]['stream'])
+
+    def test_stream_to_file_resume(self):
+        with open(self.path, 'w') as partial:
+            partial.write('abc')
+
+        with patch('requests.get',
+                   return_value=self.response(206, 'def')) as get:
+            md5 = self.updater._stream_to_file('http://jenkins/foo', self.path)
+
+        self.assertEqual(md5, hashlib.md5('abcdef').hexdigest())
+        self.assertEqual(open(self.path).read(), 'abcdef')
+        self.assertEqual(get.call_args[1]['headers'], {'Range': 'bytes=3-'})
+
+    def test_stream_to_file_no_resume(self):
+        with open(self.path, 'w') as partial:
+            partial.write('abc')
+
+        responses = [self.response(200, 'xyz'), self.response(200, 'abcdef')]
+        with patch('requests.get', side_effect=responses) as get:
+            md5 = self.updater._stream_to_file('http://jenkins/foo', self.path)
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(md5, hashlib.md5('abcdef').hexdigest())
+        self.assertEqual(open(self.path).read(), 'abcdef')
+
+    def test_stream_to_file_not_found(self):
+        with patch('requests.get', return_value=self.response(404)):
+            self.assertRaises(
+                requests.exceptions.HTTPError,
+                self.updater._stream_to_file, 'http://jenkins/foo', self.path
+            )
+
+
+class TestRepoUpdaterConcurrentDownloads(unittest.TestCase):
+    def setUp(self):
+        self.updater = RepoUpdater.__new__(RepoUpdater)
+        self.updater.download_workers = 2
+        self.updater.download_pool = None
+        self.updater.jenkins_url = 'http://jenkins'
+        self.updater.jenkins = Mock()
+        self.addCleanup(self.stop_pool)
+
+    def stop_pool(self):
+        if self.updater.download_pool is not None:
+            self.updater.download_pool.close()
+            self.updater.download_pool.join()
+
+    def get_package(self, pkg_id, version):
+        pkg = Mock(id=pkg_id, job='foo-job', version=version, revision='1',
+                   status='pending')
+        pkg.application.pkg_name = 'foo'
+        pkg.application.arch = 'noarch'
+        return pkg
+
+    def download_rpms(self, packages, download):
+        with patch('tds.model.Package.find_pending',
+                   return_value=packages), \
+                patch('tds.model.Package.update_statuses') as update, \
+                patch('tagopsdb.Session') as session, \
+                patch.object(RepoUpdater, 'incoming_dir', '/nonexistent'), \
+                patch.object(self.updater, '_download_rpm_for_pkg',
+                             side_effect=download):
+            items = self.updater._download_rpms()
+
+        return items, update, session
+
+    def test_download_rpms(self):
+        packages = [self.get_package(1, '10'), self.get_package(2, '11')]
+
+        def download(job_name, version, rpm_name, rpm_path):
+            if version == '11':
+                raise tds.exceptions.JenkinsJobNotFoundError(
+                    'Artifact', job_name, version, 'http://jenkins'
+                )
+            return rpm_name
+
+        items, update, session = self.download_rpms(packages, download)
+
+        self.assertEqual([item.rpm for item in items],
+                         ['foo-10-1.noarch.rpm'])
+        self.assertEqual(items[0].path, '/nonexistent/foo-10-1.noarch.rpm')
+        self.assertEqual(update.call_args_list, [
+            (([1, 2], 'processing'),), (([2], 'failed'),),
+        ])
+        self.assertEqual(session.commit.call_count, 2)
+
+    def test_download_pool_kept_across_passes(self):
+        def download(job_name, version, rpm_name, rpm_path):
+            return rpm_name
+
+        with patch('tds.apps.repo_updater.ThreadPool',
+                   wraps=ThreadPool) as pool_cls:
+            for version in ('10', '11'):
+                items, _update, _session = self.download_rpms(
+                    [self.get_package(1, version)], download
+                )
+                self.assertEqual(len(items), 1)
+
+        pool_cls.assert_called_once_with(2)
+        self.assertIsNotNone(self.updater.download_pool)
+
+    def test_download_rpms_unexpected_error(self):
+        packages = [self.get_package(1, '10'), self.get_package(2, '11')]
+
+        def download(job_name, version, rpm_name, rpm_path):
+            if version == '11':
+                raise IOError(28, 'No space left on device')
+            return rpm_name
+
+        items, update, _session = self.download_rpms(packages, download)
+
+        self.assertEqual([item.rpm for item in items],
+                         ['foo-10-1.noarch.rpm'])
+        self.assertEqual(update.call_args_list, [
+            (([1, 2], 'processing'),), (([2], 'failed'),),
+        ])
+
+    def test_download_rpms_aborted(self):
+        packages = [self.get_package(1, '10'), self.get_package(2, '11')]
+
+        with patch('tds.model.Package.find_pending',
+                   return_value=packages), \
+                patch('tds.model.Package.update_statuses') as update, \
+                patch('tagopsdb.Session'), \
+                patch.object(RepoUpdater, 'incoming_dir', '/nonexistent'), \
+                patch.object(self.updater, '_fetch_rpm',
+                             side_effect=RuntimeError('boom')):
+            self.assertRaises(RuntimeError, self.updater._download_rpms)
+
+        self.assertEqual(update.call_args_list, [
+            (([1, 2], 'processing'),), (([1, 2], 'pending'),),
+        ])
+        self.assertIsNone(self.updater.download_pool)
+
+
+class TestRepoUpdaterPrepare(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.updater = RepoUpdater.__new__(RepoUpdater)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_item(self, pkg_id, name, rpm_name):
+        pkg = Mock(id=pkg_id, version='10', revision='1')
+        pkg.application.pkg_name = 'foo'
+        pkg.application.arch = 'noarch'
+        item = PackageWorkItem(pkg, self.tmpdir)
+        item.rpm = Mock(version='10', release='1', path=item.path)
+        item.rpm.name = rpm_name
+        open(item.path, 'w').close()
+        return item
+
+    def test_prepare_rpms(self):
+        good = self.get_item(1, 'foo', 'foo')
+        bad = self.get_item(2, 'foo', 'bar')
+        processing_dir = os.path.join(self.tmpdir, 'processing')
+        os.mkdir(processing_dir)
+
+        with patch.object(self.updater, '_download_rpms',
+                          return_value=[good, bad]), \
+                patch.object(RepoUpdater, 'processing_dir', processing_dir), \
+                patch('tds.model.Package.update_statuses') as update, \
+                patch('tagopsdb.Session') as session:
+            items = self.updater.prepare_rpms()
+
+        self.assertEqual(items, [good])
+        self.assertEqual(good.path, good.rpm.path)
+        self.assertTrue(os.path.isfile(good.path))
+        self.assertEqual(os.listdir(self.tmpdir), ['processing'])
+        update.assert_called_once_with([2], 'failed')
+        self.assertEqual(session.commit.call_count, 1)
+
+
+class TestRepoUpdaterMetadata(unittest.TestCase):
+    def get_updater(self, metadata):
+        updater = RepoUpdater.__new__(RepoUpdater)
+        updater.repo_metadata = metadata
+        updater.createrepo_cachedir = '/repo/.cache'
+        return updater
+
+    def test_make(self):
+        with patch.object(RepoUpdater, 'repo_dir', '/repo'):
+            self.assertEqual(self.get_updater('make').repo_update_command,
+                             ['make', '-C', '/repo'])
+
+    def test_createrepo_update(self):
+        with patch.object(RepoUpdater, 'repo_dir', '/repo'):
+            self.assertEqual(
+                self.get_updater('createrepo').repo_update_command,
+                ['createrepo', '--update', '--cachedir', '/repo/.cache',
+                 '/repo']
+            )
+
+
+class TestRepoUpdaterPublish(unittest.TestCase):
+    def setUp(self):
+        self.updater = RepoUpdater.__new__(RepoUpdater)
+        self.updater.publish_min_window = 5
+        self.updater.publish_max_window = 30
+        self.updater.publish_max_batch = 3
+        self.updater.unpublished = list()
+        self.updater.update_repo = Mock()
+
+    def queue(self, started, updated, count=1):
+        self.updater.unpublished.extend(Mock() for _ in range(count))
+        self.updater.batch_started = started
+        self.updater.batch_updated = updated
+
+    def publish(self, now, force=False):
+        with patch('time.time', return_value=now):
+            self.updater.publish(force=force)
+        return self.updater.update_repo.call_count
+
+    def test_nothing_to_publish(self):
+        self.assertEqual(self.publish(100), 0)
+
+    def test_waits_for_quiet_period(self):
+        self.queue(100, 102)
+        self.assertEqual(self.publish(106), 0)
+        self.assertEqual(self.publish(107), 1)
+        self.assertEqual(self.updater.unpublished, [])
+
+    def test_max_window(self):
+        self.queue(100, 128)
+        self.assertEqual(self.publish(130), 1)
+
+    def test_max_batch(self):
+        self.queue(100, 100, count=3)
+        self.assertEqual(self.publish(100), 1)
+        self.assertEqual(len(self.updater.update_repo.call_args[0][0]), 3)
+
+    def test_force(self):
+        self.queue(100, 100)
+        self.assertEqual(self.publish(100, force=True), 1)
@@ -0,0 +1,147 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from mock import Mock, patch
+import unittest
+
+from tds.deploy_strategy.tds_mco import TDSMCODeployStrategy
+
+
+def mco_proc(results, discovered=None):
+    if discovered is None:
+        discovered = len(results)
+
+    return Mock(
+        returncode=0,
+        stderr='',
+        stdout='%s\nFinished processing %d / %d things\n' % (
+            json.dumps(results), len(results), discovered
+        )
+    )
+
+
+class TestTDSMCODeployStrategy(unittest.TestCase):
+    def setUp(self):
+        self.strategy = TDSMCODeployStrategy(bin='mco')
+        self.run = patch('tds.utils.processes.run').start()
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_host_filter(self):
+        self.assertEqual(
+            TDSMCODeployStrategy._host_filter(['host1']),
+            'hostname=host1'
+        )
+        self.assertEqual(
+            TDSMCODeployStrategy._host_filter(['host1', 'host-2']),
+            r'hostname=/^(host1|host\-2)$/'
+        )
+
+    def test_deploy_to_hosts(self):
+        self.run.return_value = mco_proc({
+            'host1.example.com': dict(exitcode=0),
+            'host2.example.com': dict(exitcode=1, stderr='failed\n'),
+        })
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        self.assertEqual(self.run.call_count, 1)
+        self.assertEqual(
+            sorted(results),
+            [('host1', True, 'Deploy successful'),
+             ('host2', False, 'failed')]
+        )
+
+    def test_deploy_to_hosts_retries_missing_hosts(self):
+        self.run.side_effect = [
+            mco_proc({'host1': dict(exitcode=0)}),
+            mco_proc({}, discovered=0),
+            mco_proc({'host2': dict(exitcode=0)}),
+        ]
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        self.assertEqual(self.run.call_count, 3)
+        self.assertIn('hostname=host2', self.run.call_args[0][0])
+        self.assertEqual(
+            results,
+            [('host1', True, 'Deploy successful'),
+             ('host2', True, 'Deploy successful')]
+        )
+
+    def test_deploy_to_hosts_gives_up_on_missing_hosts(self):
+        self.run.return_value = mco_proc({'host1': dict(exitcode=0)})
+
+        results = list(self.strategy.deploy_to_hosts(
+            ['host1', 'host2'], 'app', '1', retry=0
+        ))
+
+        self.assertEqual(self.run.call_count, 1)
+        self.assertEqual(
+            results[1], ('host2', False, 'No data returned from host host2')
+        )
+
+    def test_deploy_to_hosts_reports_missing_hosts_after_retries(self):
+        self.run.side_effect = [
+            mco_proc({'host1.example.com': dict(exitcode=0),
+                      'other.example.com': dict(exitcode=0)}),
+            mco_proc({}, discovered=0),
+        ]
+
+        results = list(self.strategy.deploy_to_hosts(
+            ['host1', 'host2', 'host3'], 'app', '1', retry=1
+        ))
+
+        self.assertEqual(self.run.call_count, 2)
+        self.assertIn(r'hostname=/^(host2|host3)$/', self.run.call_args[0][0])
+        self.assertEqual(
+            results,
+            [('host1', True, 'Deploy successful'),
+             ('host2', False, 'No data returned from host host2'),
+             ('host3', False, 'No data returned from host host3')]
+        )
+
+    def test_deploy_to_hosts_timed_out_hosts_not_retried(self):
+        self.run.return_value = mco_proc(
+            {'host1.example.com': dict(exitcode=0)}, discovered=2
+        )
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        self.assertEqual(self.run.call_count, 1)
+        self.assertEqual(
+            results,
+            [('host1', True, 'Deploy successful'),
+             ('host2', False, 'No data returned from host host2')]
+        )
+
+    def test_deploy_to_hosts_mco_failure(self):
+        self.run.return_value = Mock(returncode=1, stdout='', stderr='boom')
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        self.assertEqual([host for host, _success, _result in results],
+                         ['host1', 'host2'])
+        self.assertFalse(any(success for _host, success, _result in results))
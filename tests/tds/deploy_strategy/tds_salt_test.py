@@ -0,0 +1,92 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock
+import unittest
+
+from tds.deploy_strategy.tds_salt import TDSSaltDeployStrategy
+
+
+class TestTDSSaltDeployStrategy(unittest.TestCase):
+    def setUp(self):
+        self.strategy = TDSSaltDeployStrategy()
+        self.publish = Mock()
+        self.strategy._local.caller = Mock()
+        self.strategy._local.caller.sminion.functions = {
+            'publish.full_data': self.publish,
+        }
+
+    @staticmethod
+    def minion_data(ret):
+        return dict(ret=ret)
+
+    def test_deploy_to_hosts(self):
+        self.publish.return_value = {
+            'host1.example.com': self.minion_data('Deploy successful'),
+            'host2.example.com': self.minion_data('Install failed'),
+            'other.example.com': self.minion_data('Deploy successful'),
+        }
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertEqual(
+            self.publish.call_args,
+            (('host1.* or host2.*', 'tds.install', ('app', '1')),
+             dict(timeout=120, expr_form='compound'))
+        )
+        self.assertEqual(
+            sorted(results),
+            [('host1', True, 'Deploy successful'),
+             ('host2', False, 'Install failed')]
+        )
+
+    def test_deploy_to_hosts_reports_missing_hosts(self):
+        self.publish.return_value = {
+            'host1.example.com': self.minion_data('Deploy successful'),
+        }
+
+        results = list(
+            self.strategy.deploy_to_hosts(['host1', 'host2'], 'app', '1')
+        )
+
+        # Hosts that did not reply may still be installing; not retried
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertEqual(
+            results,
+            [('host1', True, 'Deploy successful'),
+             ('host2', False, 'No data returned from host host2')]
+        )
+
+    def test_deploy_to_hosts_no_data(self):
+        self.publish.return_value = None
+
+        results = list(self.strategy.deploy_to_hosts(
+            ['host1', 'host2'], 'app', '1'
+        ))
+
+        self.assertEqual(self.publish.call_count, 1)
+        self.assertEqual(
+            results,
+            [('host1', False, 'No data returned from host host1'),
+             ('host2', False, 'No data returned from host host2')]
+        )
+
+    def test_deploy_to_no_hosts(self):
+        self.assertEqual(
+            list(self.strategy.deploy_to_hosts([], 'app', '1')), []
+        )
+        self.assertFalse(self.publish.called)
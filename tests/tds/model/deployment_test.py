@@ -0,0 +1,149 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+'''Tests for the deployment models'''
+
+import unittest
+
+from mock import Mock, patch
+
+import tds.model
+import tds.model.deployment
+
+
+class FakeColumn(object):
+    """Stand-in for a mapped column, building row predicates."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, value):
+        return lambda row: row[self.name] == value
+
+    def in_(self, values):
+        return lambda row: row[self.name] in values
+
+
+class FakeQuery(object):
+    """Stand-in for a query over a list of dict rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def options(self, *_options):
+        return self
+
+    def filter(self, *preds):
+        return FakeQuery(
+            [row for row in self.rows if all(pred(row) for pred in preds)]
+        )
+
+    def update(self, values, synchronize_session):
+        assert synchronize_session is False
+        for row in self.rows:
+            row.update(values)
+        return len(self.rows)
+
+
+class TestHostDeploymentUpdates(unittest.TestCase):
+    def setUp(self):
+        self.rows = [
+            dict(id=host_dep_id, deployment_id=1, status='pending',
+                 duration=None, deploy_result=None)
+            for host_dep_id in (1, 2, 3)
+        ]
+        self.rows.append(dict(id=4, deployment_id=2, status='pending'))
+
+        patcher = patch('tagopsdb.Session')
+        self.session = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.session.query.side_effect = lambda *_a: FakeQuery(self.rows)
+
+        patcher = patch('tagopsdb.model.HostDeployment', Mock(
+            id=FakeColumn('id'), deployment_id=FakeColumn('deployment_id'),
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(tds.model.HostDeployment, 'delegate', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statuses(self):
+        return [row['status'] for row in self.rows]
+
+    def test_update_statuses(self):
+        tds.model.HostDeployment.update_statuses([1, 3], 'inprogress')
+
+        self.assertEqual(self.session.query.call_count, 1)
+        self.assertEqual(self.statuses(),
+                         ['inprogress', 'pending', 'inprogress', 'pending'])
+        self.assertFalse(self.session.commit.called)
+
+    def test_update_result(self):
+        tds.model.HostDeployment.update_result(2, 'failed', 1.5, 'oops')
+
+        self.assertEqual(self.session.query.call_count, 1)
+        self.assertEqual(
+            self.rows[1],
+            dict(id=2, deployment_id=1, status='failed', duration=1.5,
+                 deploy_result='oops')
+        )
+        self.assertEqual(self.statuses(),
+                         ['pending', 'failed', 'pending', 'pending'])
+
+    def test_find_for_deployment(self):
+        with patch.object(tds.model.deployment, 'joinedload') as joinedload:
+            host_deps = tds.model.HostDeployment.find_for_deployment(1)
+
+        self.assertEqual([dep.delegate for dep in host_deps], self.rows[:3])
+        self.assertEqual(
+            [call[0][0] for call in joinedload.call_args_list],
+            [tds.model.deployment.tagopsdb.model.HostDeployment.host,
+             tds.model.deployment.tagopsdb.model.HostDeployment.package]
+        )
+
+
+class TestDeploymentClaim(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('tagopsdb.Session')
+        self.session = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.update = self.session.query.return_value.filter.return_value \
+            .update
+
+        patcher = patch.object(tds.model.Deployment, 'delegate', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.deployment = tds.model.Deployment(delegate=Mock(id=1))
+
+    def test_claim_won(self):
+        self.update.return_value = 1
+
+        self.assertTrue(self.deployment.claim())
+        self.update.assert_called_once_with(
+            dict(status='inprogress'), synchronize_session=False
+        )
+        self.session.commit.assert_called_once_with()
+
+    def test_claim_lost(self):
+        self.update.return_value = 0
+
+        self.assertFalse(self.deployment.claim())
+        self.session.commit.assert_called_once_with()
@@ -0,0 +1,227 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timedelta
+from mock import Mock, patch
+import os
+import unittest
+
+import tds.model
+from tds.scripts.tds_installer import TDSInstallerDaemon
+
+
+class TestShardedInstallerDaemon(unittest.TestCase):
+    def setUp(self):
+        self.daemon = TDSInstallerDaemon(Mock())
+        self.daemon.sharded = True
+        self.daemon.zoo = Mock()
+        self.locks = {}
+
+        def make_lock(path, _identifier):
+            lock = Mock()
+            lock.acquire.return_value = path not in self.taken
+            self.locks[path] = lock
+            return lock
+
+        self.taken = set()
+        self.daemon.zoo.Lock.side_effect = make_lock
+        self.daemon.app.find_deployments.return_value = [
+            Mock(id=1), Mock(id=2), Mock(id=3),
+        ]
+
+    def test_skips_deployments_locked_elsewhere(self):
+        self.taken.add('/tdsinstaller/deployments/1')
+
+        deployment = self.daemon.find_unlocked_deployment()
+
+        self.assertEqual(deployment.id, 2)
+        self.assertEqual(self.daemon.deployment_locks.keys(), [2])
+
+    def test_skips_deployments_already_held(self):
+        self.daemon.deployment_locks[1] = Mock()
+
+        self.assertEqual(self.daemon.find_unlocked_deployment().id, 2)
+
+    def test_none_available(self):
+        self.taken.update(
+            self.daemon.deployment_lock_path(dep_id) for dep_id in (1, 2, 3)
+        )
+
+        self.assertIsNone(self.daemon.find_unlocked_deployment())
+        self.assertEqual(self.daemon.deployment_locks, {})
+
+    def test_release_deployment_lock(self):
+        self.daemon.find_unlocked_deployment()
+        lock = self.locks['/tdsinstaller/deployments/1']
+
+        self.daemon.release_deployment_lock(1)
+        self.daemon.release_deployment_lock(1)
+
+        lock.release.assert_called_once_with()
+        self.daemon.zoo.delete.assert_called_once_with(
+            '/tdsinstaller/deployments/1'
+        )
+        self.assertEqual(self.daemon.deployment_locks, {})
+
+
+class TestHandleIncomingDeployments(unittest.TestCase):
+    def setUp(self):
+        self.daemon = TDSInstallerDaemon(Mock())
+        self.deployment = Mock(id=1)
+        self.daemon.app.find_deployment.return_value = self.deployment
+        self.daemon.release_deployment_lock = Mock()
+
+        patcher = patch('tds.utils.processes.start_process')
+        self.start_process = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_won_claim_starts_deployment(self):
+        self.deployment.claim.return_value = True
+
+        self.assertTrue(self.daemon.handle_incoming_deployments())
+
+        self.assertEqual(self.start_process.call_count, 1)
+        self.assertEqual(self.start_process.call_args[0][0][-1], 1)
+        self.assertEqual(self.daemon.ongoing_processes.keys(), [1])
+        self.assertIs(self.daemon.ongoing_processes[1][0],
+                      self.start_process.return_value)
+        self.assertFalse(self.daemon.release_deployment_lock.called)
+
+    def test_lost_claim_skips_deployment(self):
+        self.deployment.claim.return_value = False
+
+        self.assertTrue(self.daemon.handle_incoming_deployments())
+
+        self.assertFalse(self.start_process.called)
+        self.assertEqual(self.daemon.ongoing_processes, {})
+        self.daemon.release_deployment_lock.assert_called_once_with(1)
+
+    def test_no_deployment(self):
+        self.daemon.app.find_deployment.return_value = None
+
+        self.assertFalse(self.daemon.handle_incoming_deployments())
+        self.assertFalse(self.start_process.called)
+
+
+class TestChildEvents(unittest.TestCase):
+    def setUp(self):
+        self.daemon = TDSInstallerDaemon(Mock())
+
+        patcher = patch('tds.scripts.tds_installer.signal')
+        self.signal = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.daemon.setup_child_events()
+        for fd in self.daemon.child_events:
+            self.addCleanup(os.close, fd)
+
+    def test_handler_installed(self):
+        self.signal.signal.assert_called_once_with(
+            self.signal.SIGCHLD, self.daemon.sigchld_handler
+        )
+        self.signal.siginterrupt.assert_called_once_with(
+            self.signal.SIGCHLD, False
+        )
+
+    def test_sigchld_wakes_wait(self):
+        self.assertEqual(self.daemon.wait_for_children(0), [])
+
+        self.daemon.sigchld_handler(self.signal.SIGCHLD, None)
+
+        self.assertEqual(self.daemon.wait_for_children(5),
+                         [self.daemon.child_events[0]])
+        # The pipe was drained, so the next wait times out.
+        self.assertEqual(self.daemon.wait_for_children(0), [])
+
+    def test_sigchld_with_full_pipe(self):
+        # Writes past the pipe's capacity are dropped, not raised.
+        for _i in range(70000):
+            self.daemon.sigchld_handler(self.signal.SIGCHLD, None)
+
+        self.assertEqual(self.daemon.wait_for_children(0),
+                         [self.daemon.child_events[0]])
+        self.assertEqual(self.daemon.wait_for_children(0), [])
+
+
+class TestCleanUpProcesses(unittest.TestCase):
+    def setUp(self):
+        self.daemon = TDSInstallerDaemon(Mock())
+        self.daemon.exit_timeout = timedelta(seconds=160)
+        self.daemon.deploy_exit_timeout = timedelta(seconds=5)
+        self.daemon.wait_for_children = Mock()
+        self.daemon.release_deployment_lock = Mock()
+        self.proc = Mock(pid=10)
+
+        patcher = patch('os.waitpid')
+        self.waitpid = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for name in ('get_statuses', 'update_statuses'):
+            patcher = patch.object(tds.model.Deployment, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def start(self, dep_id, age):
+        start_time = datetime.now() - age
+        self.daemon.ongoing_processes[dep_id] = (self.proc, start_time)
+        return start_time
+
+    def test_running_process_sets_deadline(self):
+        start_time = self.start(1, timedelta(minutes=1))
+        self.waitpid.return_value = (0, 0)
+
+        self.daemon.clean_up_processes()
+
+        self.assertEqual(self.daemon.next_deadline,
+                         start_time + self.daemon.threshold)
+        self.assertFalse(self.proc.terminate.called)
+        self.assertFalse(self.daemon.wait_for_children.called)
+        self.assertEqual(self.daemon.ongoing_processes.keys(), [1])
+
+    def test_exited_child_left_inprogress_is_failed(self):
+        self.start(1, timedelta(minutes=1))
+        self.waitpid.return_value = (10, 0)
+        self.get_statuses.return_value = {1: 'inprogress'}
+
+        self.daemon.clean_up_processes()
+
+        self.get_statuses.assert_called_once_with([1])
+        self.update_statuses.assert_called_once_with([1], 'failed')
+        self.daemon.release_deployment_lock.assert_called_once_with(1)
+        self.assertEqual(self.daemon.ongoing_processes, {})
+        self.assertIsNone(self.daemon.next_deadline)
+
+    def test_exited_child_complete(self):
+        self.start(1, timedelta(minutes=1))
+        self.waitpid.return_value = (10, 0)
+        self.get_statuses.return_value = {1: 'complete'}
+
+        self.daemon.clean_up_processes()
+
+        self.assertFalse(self.update_statuses.called)
+        self.assertEqual(self.daemon.ongoing_processes, {})
+
+    def test_timed_out_process_terminated_then_killed(self):
+        self.start(1, timedelta(minutes=31))
+        self.daemon.deploy_exit_timeout = timedelta(0)
+        self.waitpid.side_effect = [(0, 0), (0, 0), (10, 9)]
+        self.get_statuses.return_value = {1: 'inprogress'}
+
+        self.daemon.clean_up_processes()
+
+        self.proc.terminate.assert_called_once_with()
+        self.proc.kill.assert_called_once_with()
+        self.assertEqual(self.daemon.wait_for_children.call_count, 2)
+        self.update_statuses.assert_called_once_with([1], 'failed')
+        self.assertEqual(self.daemon.ongoing_processes, {})
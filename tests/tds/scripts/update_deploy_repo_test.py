@@ -0,0 +1,44 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock, patch
+import unittest
+
+from tds.scripts.update_deploy_repo import UpdateDeployRepoDaemon
+
+
+class TestUpdateDeployRepoWait(unittest.TestCase):
+    def setUp(self):
+        self.daemon = UpdateDeployRepoDaemon.__new__(UpdateDeployRepoDaemon)
+        self.daemon.app = Mock()
+        self.daemon.wakeup = Mock(interval=30)
+        self.daemon.wakeup.fileno.return_value = 5
+
+    def test_waits_for_wakeup(self):
+        self.daemon.app.publish_deadline = None
+        self.daemon.wait_for_packages()
+        self.assertEqual(self.daemon.wakeup.wait.call_args[0], (30,))
+
+    def test_wakes_up_for_publish(self):
+        self.daemon.app.publish_deadline = 105
+        with patch('time.time', return_value=100):
+            self.daemon.wait_for_packages()
+        self.assertEqual(self.daemon.wakeup.wait.call_args[0], (5,))
+
+    def test_polls_without_channel(self):
+        self.daemon.wakeup.fileno.return_value = None
+        with patch('time.sleep') as sleep:
+            self.daemon.wait_for_packages()
+        sleep.assert_called_once_with(1.0)
+        self.assertFalse(self.daemon.wakeup.wait.called)
@@ -0,0 +1,137 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from os.path import exists, join
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+import tds.utils.artifact_store as artifact_store
+from tds.utils.artifact_store import ArtifactStore
+
+
+class TestArtifactStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ArtifactStore(join(self.tmpdir, 'store'), 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, name, data):
+        path = join(self.tmpdir, name)
+        with open(path, 'w') as new_file:
+            new_file.write(data)
+        return path
+
+    def test_fetch_missing(self):
+        self.assertFalse(self.store.fetch('ab12', join(self.tmpdir, 'out')))
+        self.assertFalse(exists(join(self.tmpdir, 'out')))
+
+    def test_add_and_fetch(self):
+        path = self.write_file('foo.rpm', 'abcd')
+        self.store.add('AB12', path)
+        os.unlink(path)
+
+        dest = self.write_file('bar.rpm', 'old')
+        self.assertTrue(self.store.fetch('ab12', dest))
+        self.assertEqual(open(dest).read(), 'abcd')
+        self.assertEqual(os.stat(dest).st_ino,
+                         os.stat(self.store.blob_path('ab12')).st_ino)
+
+    def test_fetch_keeps_blob_mtime(self):
+        self.store.add('ab12', self.write_file('foo.rpm', 'abcd'))
+        blob = self.store.blob_path('ab12')
+        os.utime(blob, (100, 100))
+
+        self.assertTrue(self.store.fetch('ab12', join(self.tmpdir, 'out')))
+        self.assertEqual(os.stat(blob).st_mtime, 100)
+        self.assertGreater(os.stat(blob + '.used').st_mtime, 100)
+
+    def test_evicts_least_recently_used(self):
+        big_store = ArtifactStore(self.store.path, 100)
+        for digest, used in (('aa01', 100), ('bb02', 300), ('cc03', 200)):
+            big_store.add(digest, self.write_file(digest, 'abcd'))
+            os.unlink(join(self.tmpdir, digest))
+            os.utime(big_store.blob_path(digest) + '.used', (used, used))
+
+        # A new store reads the recorded use times
+        store = ArtifactStore(self.store.path, 10)
+        store.evict()
+        self.assertFalse(exists(store.blob_path('aa01')))
+        self.assertFalse(exists(store.blob_path('aa01') + '.used'))
+        self.assertTrue(exists(store.blob_path('bb02')))
+        self.assertTrue(exists(store.blob_path('cc03')))
+        self.assertEqual(store.total, 8)
+
+    def test_linked_blobs_not_evicted(self):
+        # Still linked from the directory they were added from
+        self.store.add('aa01', self.write_file('aa01', 'abcd'))
+        for digest in ('bb02', 'cc03'):
+            self.store.add(digest, self.write_file(digest, 'abcd'))
+            os.unlink(join(self.tmpdir, digest))
+
+        self.assertTrue(exists(self.store.blob_path('aa01')))
+        self.assertTrue(exists(self.store.blob_path('bb02')))
+        self.assertTrue(exists(self.store.blob_path('cc03')))
+
+        self.store.add('dd04', self.write_file('dd04', 'abcd'))
+        os.unlink(join(self.tmpdir, 'dd04'))
+        self.assertTrue(exists(self.store.blob_path('aa01')))
+        self.assertFalse(exists(self.store.blob_path('bb02')))
+
+    def test_linked_blobs_set_aside(self):
+        for digest in ('aa01', 'bb02', 'cc03'):
+            self.store.add(digest, self.write_file(digest, 'abcd'))
+
+        # All are linked from tmpdir: set aside and not counted
+        self.assertEqual(sorted(self.store.linked), ['aa01'])
+        self.assertEqual(self.store.total, 8)
+
+        with patch('os.stat', wraps=os.stat) as stat:
+            self.store.add('dd04', self.write_file('dd04', 'abcd'))
+
+        stat_paths = [call[0][0] for call in stat.call_args_list]
+        self.assertNotIn(self.store.blob_path('aa01'), stat_paths)
+        self.assertEqual(sorted(self.store.linked), ['aa01', 'bb02'])
+        self.assertEqual(self.store.total, 8)
+
+    def test_released_blobs_counted_again(self):
+        self.store.add('aa01', self.write_file('aa01', 'abcd'))
+        for digest in ('bb02', 'cc03'):
+            self.store.add(digest, self.write_file(digest, 'abcd'))
+            os.unlink(join(self.tmpdir, digest))
+        self.assertEqual(sorted(self.store.linked), ['aa01'])
+
+        os.unlink(join(self.tmpdir, 'aa01'))
+        self.store.add('dd04', self.write_file('dd04', 'abcd'))
+        # Not checked again yet, so bb02 goes
+        self.assertTrue(exists(self.store.blob_path('aa01')))
+        self.assertFalse(exists(self.store.blob_path('bb02')))
+
+        self.store.linked_checked -= artifact_store.LINKED_CHECK_INTERVAL
+        self.store.add('ee05', self.write_file('ee05', 'abcd'))
+        self.assertFalse(exists(self.store.blob_path('aa01')))
+        self.assertEqual(self.store.linked, {})
+
+    def test_store_walked_once(self):
+        with patch('os.walk', wraps=os.walk) as walk:
+            for digest in ('aa01', 'bb02', 'cc03'):
+                self.store.add(digest, self.write_file(digest, 'abcd'))
+                self.store.fetch(digest, join(self.tmpdir, 'out'))
+
+        self.assertEqual(walk.call_count, 1)
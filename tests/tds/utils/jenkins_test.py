@@ -0,0 +1,159 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock
+import threading
+import unittest
+
+import requests.exceptions
+
+import tds.exceptions
+from tds.utils.jenkins import JenkinsClient
+
+
+class TestJenkinsClient(unittest.TestCase):
+    def setUp(self):
+        self.client = JenkinsClient('http://jenkins', max_entries=2)
+        self.client._local.session = Mock()
+        self.pages = dict()
+        self.client.session.get.side_effect = self.get
+
+    def get(self, url, params=None, timeout=None):
+        data = self.pages.get(url)
+        return Mock(
+            status_code=404 if data is None else 200,
+            json=Mock(return_value=dict(data or {})),
+        )
+
+    def add_build(self, job, number, **data):
+        data.setdefault('building', False)
+        self.pages['http://jenkins/job/%s/%s/api/json' % (job, number)] = \
+            dict(number=number, **data)
+
+    def test_get_build_cached(self):
+        self.add_build('myjob', 3)
+
+        build = self.client.get_build('myjob', '3')
+        self.assertEqual(build['url'], 'http://jenkins/job/myjob/3/')
+        self.assertIs(self.client.get_build('myjob', 3), build)
+        self.assertEqual(self.client.session.get.call_count, 1)
+
+    def test_get_build_running_not_cached(self):
+        self.add_build('myjob', 3, building=True)
+
+        self.client.get_build('myjob', 3)
+        self.client.get_build('myjob', 3)
+        self.assertEqual(self.client.session.get.call_count, 2)
+
+    def test_cache_evicts_least_recently_used(self):
+        for number in (1, 2, 3):
+            self.add_build('myjob', number)
+
+        self.client.get_build('myjob', 1)
+        self.client.get_build('myjob', 2)
+        self.client.get_build('myjob', 1)
+        self.client.get_build('myjob', 3)
+        self.assertEqual(self.client.cache.keys(),
+                         [('myjob', 1), ('myjob', 3)])
+
+    def test_missing_job_and_build(self):
+        self.pages['http://jenkins/job/myjob/api/json'] = dict(name='myjob')
+
+        with self.assertRaisesRegexp(tds.exceptions.JenkinsJobNotFoundError,
+                                     '^Build does not exist'):
+            self.client.get_build('myjob', 3)
+
+        with self.assertRaisesRegexp(tds.exceptions.JenkinsJobNotFoundError,
+                                     '^Job does not exist'):
+            self.client.get_build('otherjob', 3)
+
+    def test_matrix_run(self):
+        run_url = 'http://jenkins/job/myjob/label=el6/3/'
+        self.add_build('myjob', 3, runs=[
+            dict(number=2, url='http://jenkins/job/myjob/label=el6/2/'),
+            dict(number=3, url=run_url),
+        ])
+        self.pages[run_url + 'api/json'] = dict(
+            number=3, url=run_url, building=False,
+            artifacts=[dict(fileName='foo.rpm', relativePath='out/foo.rpm')],
+        )
+
+        self.assertEqual(
+            self.client.get_artifact_url('myjob/el6', 3, 'foo.rpm'),
+            run_url + 'artifact/out/foo.rpm'
+        )
+        self.assertRaises(tds.exceptions.JenkinsJobNotFoundError,
+                          self.client.get_build, 'myjob/el7', 3)
+
+    def test_missing_artifact(self):
+        self.add_build('myjob', 3, artifacts=[])
+
+        with self.assertRaisesRegexp(tds.exceptions.JenkinsJobNotFoundError,
+                                     '^Artifact does not exist'):
+            self.client.get_artifact_url('myjob', 3, 'foo.rpm')
+
+    def test_get_fingerprint_md5(self):
+        self.add_build('myjob', 3, fingerprint=[
+            dict(fileName='foo.rpm', hash='abc'),
+            dict(fileName='out/bar.rpm', hash='def'),
+        ])
+        self.add_build('myjob', 4)
+
+        self.assertEqual(
+            self.client.get_fingerprint_md5('myjob', 3, 'foo.rpm'), 'abc'
+        )
+        self.assertEqual(
+            self.client.get_fingerprint_md5('myjob', 3, 'bar.rpm'), 'def'
+        )
+        self.assertIsNone(
+            self.client.get_fingerprint_md5('myjob', 3, 'baz.rpm')
+        )
+        self.assertIsNone(
+            self.client.get_fingerprint_md5('myjob', 4, 'foo.rpm')
+        )
+        self.assertEqual(self.client.session.get.call_count, 2)
+
+    def test_get_revision(self):
+        self.add_build('gitjob', 1, actions=[
+            {}, dict(lastBuiltRevision=dict(SHA1='abc123')),
+        ])
+        self.add_build('svnjob', 1, changeSet=dict(
+            kind='svn', revisions=[dict(revision=5), dict(revision=9)],
+        ))
+        self.add_build('nojob', 1)
+
+        self.assertEqual(self.client.get_revision('gitjob', 1), 'abc123')
+        self.assertEqual(self.client.get_revision('svnjob', 1), 9)
+        self.assertIsNone(self.client.get_revision('nojob', 1))
+
+    def test_connection_error(self):
+        self.client.session.get.side_effect = \
+            requests.exceptions.ConnectionError()
+
+        with self.assertRaisesRegexp(tds.exceptions.FailedConnectionError,
+                                     'Unable to contact Jenkins server'):
+            self.client.check_connection()
+
+    def test_session_per_thread(self):
+        client = JenkinsClient('http://jenkins')
+        sessions = []
+        thread = threading.Thread(
+            target=lambda: sessions.extend([client.session, client.session])
+        )
+        thread.start()
+        thread.join()
+
+        self.assertIs(sessions[0], sessions[1])
+        self.assertIs(client.session, client.session)
+        self.assertIsNot(client.session, sessions[0])
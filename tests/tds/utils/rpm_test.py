@@ -0,0 +1,76 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from os.path import join
+import shutil
+import tempfile
+import unittest
+
+from tests import FIXTURES_PATH
+from tds.utils.rpm import RPMDescriptor, RPMHeaderProvider
+
+RPM_PATH = join(FIXTURES_PATH, 'rpms', 'tds-test-pkg-1.2.3-4.el6.x86_64.rpm')
+
+
+class TestRPMHeaderProvider(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_file(self, data):
+        path = join(self.tmpdir, 'bad.rpm')
+        with open(path, 'wb') as bad_file:
+            bad_file.write(data)
+        return path
+
+    def test_query(self):
+        self.assertEqual(
+            RPMHeaderProvider.query(
+                RPM_PATH, ('arch', 'name', 'version', 'release', 'summary')
+            ),
+            [('arch', 'x86_64'), ('name', 'tds-test-pkg'),
+             ('version', '1.2.3'), ('release', '4.el6'),
+             ('summary', 'TDS test fixture')]
+        )
+
+    def test_query_missing_tag(self):
+        self.assertEqual(RPMHeaderProvider.query(RPM_PATH, ('epoch',)),
+                         [('epoch', '(none)')])
+
+    def test_query_unknown_field(self):
+        self.assertIsNone(RPMHeaderProvider.query(RPM_PATH, ('color',)))
+
+    def test_query_invalid_files(self):
+        with open(RPM_PATH, 'rb') as rpm_file:
+            data = rpm_file.read()
+
+        for bad_data in ('', 'name: foo\n', data[:150]):
+            self.assertIsNone(
+                RPMHeaderProvider.query(self.write_file(bad_data), ('name',))
+            )
+
+        self.assertIsNone(
+            RPMHeaderProvider.query(join(self.tmpdir, 'missing.rpm'),
+                                    ('name',))
+        )
+
+    def test_descriptor_from_path(self):
+        rpm = RPMDescriptor.from_path(RPM_PATH, RPMHeaderProvider)
+        self.assertEqual(
+            rpm.info,
+            dict(name='tds-test-pkg', version='1.2.3', revision='4.el6')
+        )
+        self.assertEqual(rpm.arch, 'x86_64')
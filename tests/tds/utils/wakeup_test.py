@@ -0,0 +1,143 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock, patch
+import unittest
+
+import tds.exceptions
+import tds.utils.wakeup as wakeup
+
+
+class TestWakeupChannels(unittest.TestCase):
+    def test_default_is_polling(self):
+        channel = wakeup.get_channel({})
+        self.assertIsInstance(channel, wakeup.PollingChannel)
+        self.assertEqual(channel.interval, 0.1)
+
+    def test_unknown_channel(self):
+        self.assertRaises(
+            tds.exceptions.ConfigurationError,
+            wakeup.get_channel, dict(queue_wakeup=dict(channel='carrier'))
+        )
+
+    def test_zookeeper_requires_hosts(self):
+        self.assertRaises(
+            tds.exceptions.ConfigurationError,
+            wakeup.get_channel, dict(queue_wakeup=dict(channel='zookeeper'))
+        )
+
+    def test_zookeeper_shares_client(self):
+        zoo = Mock()
+        channel = wakeup.get_channel(
+            dict(queue_wakeup=dict(channel='zookeeper', poll_interval=5)),
+            zoo=zoo
+        )
+
+        channel.publish()
+        zoo.ensure_path.assert_called_once_with(wakeup.INSTALLER_PATH)
+        self.assertEqual(zoo.set.call_args[0][0], wakeup.INSTALLER_PATH)
+        self.assertEqual(channel.interval, 5)
+
+        channel.close()
+        self.assertFalse(zoo.stop.called)
+
+    def test_zookeeper_wait(self):
+        zoo = Mock()
+        channel = wakeup.ZooKeeperChannel(zoo)
+
+        # Registering the watch fires it once
+        zoo.DataWatch.side_effect = lambda path, func: func(None, None)
+        self.assertTrue(channel.wait(1))
+        self.assertFalse(channel.wait(0.1))
+        self.assertFalse(channel.wait(10, interrupt=lambda: True))
+
+    def test_publish_is_best_effort(self):
+        with patch.object(wakeup, 'get_channel', side_effect=Exception):
+            wakeup.publish({})
+
+
+class TestWakeupPublish(unittest.TestCase):
+    config = dict(queue_wakeup=dict(channel='zookeeper'),
+                  zookeeper=['zk1:2181', 'zk2:2181'])
+
+    def setUp(self):
+        wakeup._publish_clients.clear()
+        self.client_cls = patch.object(wakeup, 'KazooClient').start()
+
+    def tearDown(self):
+        patch.stopall()
+        wakeup._publish_clients.clear()
+
+    def test_client_shared(self):
+        wakeup.publish(self.config)
+        wakeup.publish(self.config, path=wakeup.REPO_PATH)
+
+        self.assertEqual(self.client_cls.call_count, 1)
+        client = self.client_cls.return_value
+        client.start.assert_called_once_with(timeout=0.5)
+        self.assertEqual(
+            [call[0][0] for call in client.ensure_path_async.call_args_list],
+            [wakeup.INSTALLER_PATH, wakeup.REPO_PATH]
+        )
+        self.assertFalse(client.ensure_path.called)
+        self.assertFalse(client.stop.called)
+
+    def test_publish_does_not_wait(self):
+        client = self.client_cls.return_value
+        wakeup.publish(self.config)
+
+        rawlink = client.ensure_path_async.return_value.rawlink
+        set_data = rawlink.call_args[0][0]
+        self.assertFalse(client.set_async.called)
+        set_data(Mock())
+        self.assertEqual(client.set_async.call_args[0][0],
+                         wakeup.INSTALLER_PATH)
+
+    def test_blocking_publish_waits_for_write(self):
+        client = self.client_cls.return_value
+        client.ensure_path_async.return_value.rawlink.side_effect = \
+            lambda callback: callback(Mock())
+        client.set_async.return_value.rawlink.side_effect = \
+            lambda callback: callback(Mock())
+
+        with patch.object(wakeup.log, 'warning') as warning:
+            wakeup.publish(self.config, block=True)
+
+        self.assertEqual(client.set_async.call_args[0][0],
+                         wakeup.INSTALLER_PATH)
+        self.assertFalse(warning.called)
+
+    def test_blocking_publish_times_out(self):
+        config = dict(self.config,
+                      queue_wakeup=dict(channel='zookeeper',
+                                        publish_timeout=0.01))
+
+        with patch.object(wakeup.log, 'warning') as warning:
+            wakeup.publish(config, block=True)
+
+        self.assertFalse(self.client_cls.return_value.set_async.called)
+        self.assertIn('Timed out', warning.call_args[0][0])
+
+    def test_unreachable_zookeeper_not_retried_at_once(self):
+        self.client_cls.return_value.start.side_effect = Exception('timeout')
+
+        with patch('time.time', return_value=1000):
+            wakeup.publish(self.config)
+            wakeup.publish(self.config)
+        self.assertEqual(self.client_cls.call_count, 1)
+
+        with patch('time.time',
+                   return_value=1000 + wakeup.PUBLISH_RETRY_INTERVAL):
+            wakeup.publish(self.config)
+        self.assertEqual(self.client_cls.call_count, 2)
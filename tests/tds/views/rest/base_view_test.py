@@ -0,0 +1,223 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+import json
+from mock import Mock, patch
+import unittest
+import urlparse
+
+import tds.views.rest.base as base
+
+
+class TestToJsonObj(unittest.TestCase):
+    def setUp(self):
+        self.view = base.BaseView.__new__(base.BaseView)
+        self.view.param_routes = dict(name='pkg_name')
+        self.view.request = Mock(validated=dict())
+        self.obj = Mock()
+        self.obj.to_dict.side_effect = lambda: dict(
+            id=1, pkg_name='app', created='2016-01-01 00:00:00',
+            status='completed',
+        )
+
+    def test_select_matches_full_output(self):
+        full = self.view.to_json_obj(self.obj)
+        self.view.request.validated['select'] = ['name', 'created', 'id']
+
+        selected = self.view.to_json_obj(self.obj)
+
+        self.assertEqual(
+            selected,
+            dict((key, full[key]) for key in ('name', 'created', 'id'))
+        )
+
+    def test_select_unknown_attribute(self):
+        self.view.request.validated['select'] = ['id', 'nonexistent']
+
+        self.assertEqual(self.view.to_json_obj(self.obj), dict(id=1))
+
+
+class TestSelectColumns(unittest.TestCase):
+    def setUp(self):
+        self.view = base.BaseView.__new__(base.BaseView)
+        self.view.param_routes = dict(name='pkg_name')
+        self.view.request = Mock(validated=dict(), GET=dict(),
+                                 path_url='http://tds/packages')
+
+        self.entity = Mock()
+        self.query = Mock(column_descriptions=[dict(entity=self.entity)])
+        synonym = Mock()
+        synonym.name = 'status'
+        mapper = Mock(column_attrs=set(['id', 'pkg_name', 'status']),
+                      synonyms=dict(state=synonym))
+
+        patcher = patch.object(base, 'inspect', return_value=mapper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for name in ('Response', 'tagopsdb'):
+            patcher = patch.object(base, name)
+            setattr(self, name.lower(), patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_no_select(self):
+        self.assertIsNone(self.view.select_columns(self.query))
+
+    def test_selected_columns_and_id(self):
+        self.view.request.validated['select'] = ['name', 'state']
+
+        self.assertIs(self.view.select_columns(self.query),
+                      self.query.with_entities.return_value)
+        self.query.with_entities.assert_called_once_with(
+            self.entity.pkg_name, self.entity.status, self.entity.id
+        )
+
+    def test_relationship_not_pushed_down(self):
+        self.view.request.validated['select'] = ['name', 'application']
+
+        self.assertIsNone(self.view.select_columns(self.query))
+        self.assertFalse(self.query.with_entities.called)
+
+    def test_select_matches_full_output(self):
+        created = datetime(2016, 1, 2, 3, 4, 5)
+        obj = Mock(id=7)
+        obj.to_dict.side_effect = lambda: dict(
+            id=7, pkg_name='app', status='completed', created=created,
+        )
+        self.view.request.validated['select'] = ['name', 'created', 'id']
+        self.view.make_collection_response([obj], limit=1)
+        full = self.response.call_args[1]
+
+        self.query.with_entities.return_value = [('app', created, 7, 7)]
+        with patch.object(base.inspect.return_value, 'column_attrs',
+                          set(['id', 'pkg_name', 'created'])):
+            self.view.make_collection_response(self.query, limit=1)
+        selected = self.response.call_args[1]
+
+        self.assertTrue(self.query.with_entities.called)
+        self.assertEqual(json.loads(selected['body']),
+                         json.loads(full['body']))
+        self.assertEqual(selected['headers'], full['headers'])
+
+
+class TestCollectionResponse(unittest.TestCase):
+    def setUp(self):
+        self.view = base.BaseView.__new__(base.BaseView)
+        self.view.param_routes = dict()
+        self.view.request = Mock(validated=dict())
+        self.view.request.GET = dict(limit='2')
+        self.view.request.path_url = 'http://tds/packages'
+
+        for name in ('Response', 'tagopsdb'):
+            patcher = patch.object(base, name)
+            setattr(self, name.lower(), patcher.start())
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def objs(*ids):
+        objs = [Mock(id=obj_id) for obj_id in ids]
+        for obj in objs:
+            obj.to_dict.return_value = dict(id=obj.id)
+        return objs
+
+    def page(self, *ids):
+        self.view.make_collection_response(self.objs(*ids), limit=2)
+        kwargs = self.response.call_args[1]
+        return json.loads(kwargs['body']), kwargs['headers']
+
+    def test_full_page_links_next(self):
+        body, headers = self.page(3, 5)
+
+        self.assertEqual(body, [dict(id=3), dict(id=5)])
+        url, rel = headers['Link'].split('; ')
+        self.assertEqual(rel, 'rel="next"')
+        url = urlparse.urlparse(url.strip('<>'))
+        self.assertEqual(url.path, '/packages')
+        self.assertEqual(urlparse.parse_qs(url.query),
+                         dict(start=['6'], limit=['2']))
+
+    def test_last_page_has_no_link(self):
+        body, headers = self.page(7)
+
+        self.assertEqual(body, [dict(id=7)])
+        self.assertNotIn('Link', headers)
+
+    def test_empty_page_has_no_link(self):
+        body, headers = self.page()
+
+        self.assertEqual(body, [])
+        self.assertNotIn('Link', headers)
+
+    def test_streamed_body(self):
+        query = Mock()
+        query.yield_per.return_value = iter(self.objs(1, 2, 3))
+
+        self.view.make_collection_response(query)
+
+        query.yield_per.assert_called_once_with(
+            base.BaseView.STREAM_BATCH_SIZE
+        )
+        app_iter = self.response.call_args[1]['app_iter']
+        self.assertFalse(self.tagopsdb.Session.remove.called)
+        self.assertEqual(json.loads(''.join(app_iter)),
+                         [dict(id=1), dict(id=2), dict(id=3)])
+        self.tagopsdb.Session.remove.assert_called_once_with()
+
+    def test_streamed_empty_body(self):
+        self.view.make_collection_response([])
+
+        app_iter = self.response.call_args[1]['app_iter']
+        self.assertEqual(json.loads(''.join(app_iter)), [])
+
+
+class TestRepoUpdaterNotifyMixin(unittest.TestCase):
+    def setUp(self):
+        self.view = base.RepoUpdaterNotifyMixin()
+        self.view.name = 'package'
+        self.view.settings = dict()
+        self.view.request = Mock(validated_params=dict())
+        self.view.request.validated = dict(package=Mock(status='pending'))
+
+        publish_patcher = patch('tds.utils.wakeup.publish')
+        self.publish = publish_patcher.start()
+        self.addCleanup(publish_patcher.stop)
+
+    def test_post_pending(self):
+        self.view.request.method = 'POST'
+        self.view._after_commit()
+
+        self.publish.assert_called_once_with(
+            self.view.settings, path=base.tds.utils.wakeup.REPO_PATH
+        )
+
+    def test_post_not_pending(self):
+        self.view.request.method = 'POST'
+        self.view.request.validated['package'].status = 'completed'
+        self.view._after_commit()
+
+        self.assertFalse(self.publish.called)
+
+    def test_put_status_pending(self):
+        self.view.request.method = 'PUT'
+        self.view.request.validated_params['status'] = 'pending'
+        self.view._after_commit()
+
+        self.assertEqual(self.publish.call_count, 1)
+
+    def test_put_without_status(self):
+        self.view.request.method = 'PUT'
+        self.view._after_commit()
+
+        self.assertFalse(self.publish.called)
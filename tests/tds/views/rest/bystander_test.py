@@ -0,0 +1,77 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock
+import unittest
+
+import tds.views.rest.bystander as bystander
+
+
+class TestBystanderResults(unittest.TestCase):
+    def setUp(self):
+        self.tiers = dict(
+            (tier_id, Mock(id=tier_id, status='ok'))
+            for tier_id in (1, 2)
+        )
+        for tier in self.tiers.values():
+            tier.name = 'tier%d' % tier.id
+
+        self.envs = dict(
+            (env_id, Mock(id=env_id, env=env))
+            for env_id, env in ((1, 'dev'), (2, 'stage'), (3, 'prod'))
+        )
+
+    def deployment(self, tier_id, env_id, app_id, version, package_id=None):
+        app = Mock(id=app_id)
+        app.name = 'app%d' % app_id
+        return (
+            Mock(app_id=tier_id, environment_id=env_id,
+                 package_id=package_id or version),
+            Mock(version=str(version), revision='1', commit_hash='abc'),
+            app,
+        )
+
+    def test_grouped_by_tier_and_application(self):
+        result = bystander.get_results(self.tiers, self.envs, [
+            self.deployment(1, 1, 10, 3),
+            self.deployment(1, 2, 10, 2),
+            self.deployment(1, 3, 10, 1),
+            self.deployment(2, 3, 20, 5),
+            self.deployment(2, 2, 20, 4),
+        ])
+
+        self.assertEqual(sorted(result), [1, 2])
+        self.assertEqual(result[1]['name'], 'tier1')
+        self.assertEqual(sorted(result[1]), [10, 'name', 'status'])
+        self.assertEqual(result[1][10][2], dict(
+            name='stage', package_id=2, package_version='2',
+            package_revision='1', package_commit_hash='abc',
+        ))
+        self.assertFalse(result[1][10]['prod_ahead'])
+        self.assertFalse(result[1][10]['stage_ahead'])
+        self.assertTrue(result[2][20]['prod_ahead'])
+        # No dev deployment to compare with
+        self.assertFalse(result[2][20]['stage_ahead'])
+
+    def test_later_deployment_wins(self):
+        result = bystander.get_results(self.tiers, self.envs, [
+            self.deployment(1, 1, 10, 1, package_id=7),
+            self.deployment(1, 1, 10, 1, package_id=8),
+        ])
+
+        self.assertEqual(result[1][10][1]['package_id'], 8)
+
+    def test_no_deployments(self):
+        self.assertEqual(bystander.get_results(self.tiers, self.envs, []),
+                         dict())
@@ -0,0 +1,95 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime
+
+from mock import MagicMock, patch
+import unittest
+
+import tds.views.rest.performance as performance
+
+JAN = datetime(2016, 1, 1)
+FEB = datetime(2016, 2, 1)
+MAR = datetime(2016, 3, 1)
+
+
+class TestMonthlyCounts(unittest.TestCase):
+    def get_session(self, *results):
+        session = MagicMock()
+        session.query.return_value.filter.return_value.group_by.side_effect = \
+            [iter(rows) for rows in results]
+        return session
+
+    def test_get_monthly_counts(self):
+        session = self.get_session([
+            (2016, 1, 'complete', 3),
+            (2016, 1, 'failed', 1),
+            (2016, 2, 'complete', 2),
+        ])
+
+        counts = performance.get_monthly_counts(
+            session, MagicMock(), 'realized', JAN, MAR
+        )
+
+        self.assertEqual(counts, {
+            JAN: {'complete': 3, 'failed': 1},
+            FEB: {'complete': 2},
+        })
+        self.assertEqual(session.query.call_count, 1)
+
+    def test_months_without_objects(self):
+        session = self.get_session([(2016, 2, 'complete', 2)])
+
+        counts = performance.get_counts_for_months(
+            session, 'tier_deployments', MagicMock(), 'realized',
+            [JAN, FEB], MAR,
+        )
+
+        self.assertEqual(counts, {JAN: {}, FEB: {'complete': 2}})
+
+    def test_rollup_keeps_ended_months(self):
+        rollup = performance.MonthlyRollup()
+        session = self.get_session(
+            [(2016, 1, 'complete', 3), (2016, 2, 'complete', 1)],
+            [(2016, 2, 'complete', 2)],
+        )
+
+        with patch.object(performance, 'get_monthly_counts',
+                          wraps=performance.get_monthly_counts) as query:
+            for _request in range(2):
+                counts = performance.get_counts_for_months(
+                    session, 'tier_deployments', MagicMock(), 'realized',
+                    [JAN, FEB], datetime(2016, 2, 15), rollup, 60,
+                )
+
+        # The current month is queried again; the ended one is not
+        self.assertEqual([call[0][3:] for call in query.call_args_list],
+                         [(JAN, MAR), (FEB, MAR)])
+        self.assertEqual(counts, {JAN: {'complete': 3}, FEB: {'complete': 2}})
+
+    def test_rollup_entries_expire(self):
+        rollup = performance.MonthlyRollup()
+
+        with patch('time.time', return_value=1000):
+            rollup.put('tier_deployments', {JAN: {'complete': 3}}, 60)
+
+        with patch('time.time', return_value=1059):
+            self.assertEqual(rollup.get('tier_deployments', [JAN, FEB]),
+                             {JAN: {'complete': 3}})
+
+        with patch('time.time', return_value=1060):
+            self.assertEqual(rollup.get('tier_deployments', [JAN, FEB]), {})
+            rollup.put('tier_deployments', {}, 60)
+
+        self.assertEqual(rollup.entries, {})
@@ -0,0 +1,72 @@
+# Copyright 2016 Ifwe Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from mock import Mock, patch
+
+import tds.views.rest.utils as utils
+
+
+class TestValidateCookie(unittest.TestCase):
+    def setUp(self):
+        self.settings = dict(secret_key='secret', cookie_life=3600)
+        self.response = Mock()
+        utils.set_cookie(self.response, 'fake', '127.0.0.1', self.settings,
+                         True)
+        utils._verified_cookies.clear()
+
+    def make_request(self, addr='127.0.0.1'):
+        request = Mock(headers=dict(), remote_addr=addr)
+        request.cookies = dict(
+            session=self.response.set_cookie.call_args[1]['value']
+        )
+        return request
+
+    def test_digests_computed_once(self):
+        with patch.object(utils, '_create_digest',
+                          wraps=utils._create_digest) as create_digest:
+            for _i in range(3):
+                self.assertEqual(
+                    utils.validate_cookie(self.make_request(), self.settings),
+                    (True, 'fake', True, dict())
+                )
+
+        self.assertEqual(create_digest.call_count, 4)
+
+    def test_other_address_not_cached(self):
+        utils.validate_cookie(self.make_request(), self.settings)
+
+        self.assertEqual(
+            utils.validate_cookie(self.make_request('10.0.0.1'),
+                                  self.settings),
+            (True, False, False, dict())
+        )
+
+    def test_expired_cookie(self):
+        utils.validate_cookie(self.make_request(), self.settings)
+        self.settings['cookie_life'] = 0
+
+        self.assertEqual(
+            utils.validate_cookie(self.make_request(), self.settings),
+            (True, False, False, dict())
+        )
+        self.assertEqual(len(utils._verified_cookies), 0)
+
+    def test_cache_is_bounded(self):
+        self.settings['verified_cookie_cache_size'] = 1
+        utils.validate_cookie(self.make_request(), self.settings)
+        utils._put_verified_cookie(('other',), False, self.settings)
+
+        self.assertEqual(list(utils._verified_cookies), [('other',)])